@@ -0,0 +1,88 @@
+"""
+Job de preguntas por lotes: responde una lista de (RUT, pregunta) y escribe
+los resultados en un archivo JSONL, una línea por pregunta.
+
+La entrada puede ser un JSONL con objetos {"rut": ..., "pregunta": ...}, o un
+archivo de preguntas (una por línea) que se hace para cada RUT de un archivo
+de RUTs o de todo el registro de negocios. Si el archivo de salida ya existe,
+las preguntas que ya tienen respuesta se saltan (el job se retoma).
+
+Uso:
+    python -m app.batch_preguntas --input preguntas.jsonl --output respuestas.jsonl
+    python -m app.batch_preguntas --preguntas preguntas.txt --ruts ruts.txt --output respuestas.jsonl
+    python -m app.batch_preguntas --preguntas preguntas.txt --registry --output respuestas.jsonl
+"""
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from typing import AsyncIterator, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+# --- Cargar .env antes de importar módulos que leen configuración ---
+BASE_DIR = Path(__file__).resolve().parent.parent
+load_dotenv(dotenv_path=BASE_DIR / '.env')
+
+from app.core.batch_questions import BatchQuestionRunner
+from app.core.business_registry import iter_stale_businesses
+from app.core.http_client import close_http_clients
+from app.core.redis_client import close_redis_clients
+
+def _leer_lineas(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def _items_jsonl(path: str) -> Iterator[Tuple[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                yield item["rut"], item["pregunta"]
+
+def _items_ruts(ruts: List[str], preguntas: List[str]) -> Iterator[Tuple[str, str]]:
+    for rut in ruts:
+        for pregunta in preguntas:
+            yield rut, pregunta
+
+async def _items_registry(preguntas: List[str]) -> AsyncIterator[Tuple[str, str]]:
+    # Todos los negocios del registro, sin importar cuándo se refrescaron
+    async for rut in iter_stale_businesses(refreshed_before=float("inf")):
+        for pregunta in preguntas:
+            yield rut, pregunta
+
+async def _run(args) -> dict:
+    if args.input:
+        items = _items_jsonl(args.input)
+    elif args.registry:
+        items = _items_registry(_leer_lineas(args.preguntas))
+    else:
+        items = _items_ruts(_leer_lineas(args.ruts), _leer_lineas(args.preguntas))
+
+    runner = BatchQuestionRunner(args.output, prefetch_size=args.prefetch_size, concurrency=args.concurrency)
+    try:
+        return await runner.run(items)
+    finally:
+        await close_http_clients()
+        await close_redis_clients()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    entrada = parser.add_mutually_exclusive_group(required=True)
+    entrada.add_argument("--input", help="JSONL con objetos {rut, pregunta}")
+    entrada.add_argument("--ruts", help="archivo con un RUT por línea (requiere --preguntas)")
+    entrada.add_argument("--registry", action="store_true", help="todos los RUTs del registro (requiere --preguntas)")
+    parser.add_argument("--preguntas", help="archivo con una pregunta por línea")
+    parser.add_argument("--output", required=True, help="JSONL de resultados (si existe, se retoma)")
+    parser.add_argument("--prefetch-size", type=int, default=200, help="RUTs precargados por bloque")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="generaciones simultáneas (por defecto, el máximo del backend)")
+    args = parser.parse_args()
+    if not args.input and not args.preguntas:
+        parser.error("--ruts y --registry requieren --preguntas")
+
+    resultado = asyncio.run(_run(args))
+    print(f"[Batch Preguntas] Terminado: {resultado}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Punto de entrada del consumidor de Kafka, separado de la aplicación web.
+
+Levanta N consumidores del mismo grupo (procesos o threads); Kafka reparte las
+particiones de businesses.fct.update.0 entre ellos, así que el throughput de
+refresco de caché escala con la cantidad de particiones del tópico. Cada
+consumidor procesa su ventana en curso y confirma offsets antes de ceder
+particiones en un rebalanceo o al apagarse (SIGTERM / Ctrl+C).
+
+Al correrlo, conviene desactivar el consumidor embebido de la API con
+KAFKA_CONSUMER_ENABLED=false para que cada worker de uvicorn no compita en el grupo.
+
+Uso:
+    python -m app.consumer_main --workers 4
+    python -m app.consumer_main --workers 4 --mode thread
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# --- Cargar .env antes de importar módulos que leen configuración ---
+BASE_DIR = Path(__file__).resolve().parent.parent
+load_dotenv(dotenv_path=BASE_DIR / '.env')
+
+KAFKA_CONSUMER_WORKERS = int(os.getenv("KAFKA_CONSUMER_WORKERS", "1"))
+KAFKA_CONSUMER_MODE = os.getenv("KAFKA_CONSUMER_MODE", "process")
+# Tiempo máximo para que cada consumidor termine su ventana al apagarse
+KAFKA_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("KAFKA_SHUTDOWN_TIMEOUT_SECONDS", "30"))
+# Espera antes de relanzar un proceso consumidor que terminó inesperadamente
+KAFKA_RESTART_DELAY_SECONDS = float(os.getenv("KAFKA_RESTART_DELAY_SECONDS", "5"))
+
+def _run_consumer_process(name: str) -> None:
+    """Cuerpo de un proceso consumidor: consume hasta recibir SIGTERM/SIGINT."""
+    # El consumidor se crea dentro del proceso hijo: las conexiones de librdkafka no sobreviven a un fork
+    from app.core.kafka_consumer import KafkaBusinessConsumer
+
+    consumer = KafkaBusinessConsumer(name=name)
+
+    def _detener(signum, frame):
+        print(f"[Consumer {name}] Señal {signum} recibida, terminando la ventana en curso...")
+        consumer.running = False
+
+    signal.signal(signal.SIGTERM, _detener)
+    signal.signal(signal.SIGINT, _detener)
+    consumer.run()
+    print(f"[Consumer {name}] Métricas finales: {consumer.get_metrics()}")
+
+def run_processes(workers: int) -> None:
+    """Supervisa `workers` procesos consumidores y los relanza si terminan inesperadamente."""
+    detener = threading.Event()
+
+    def _detener(signum, frame):
+        print(f"[Consumer] Señal {signum} recibida, deteniendo {workers} procesos...")
+        detener.set()
+
+    signal.signal(signal.SIGTERM, _detener)
+    signal.signal(signal.SIGINT, _detener)
+
+    def _lanzar(i: int) -> multiprocessing.Process:
+        proc = multiprocessing.Process(target=_run_consumer_process, args=(str(i),), name=f"kafka-consumer-{i}")
+        proc.start()
+        print(f"[Consumer] Proceso {i} iniciado (pid {proc.pid})")
+        return proc
+
+    procesos = {i: _lanzar(i) for i in range(workers)}
+    while not detener.wait(1.0):
+        for i, proc in list(procesos.items()):
+            if not proc.is_alive():
+                print(f"[Consumer] Proceso {i} terminó con código {proc.exitcode}, relanzando en {KAFKA_RESTART_DELAY_SECONDS}s")
+                if detener.wait(KAFKA_RESTART_DELAY_SECONDS):
+                    break
+                procesos[i] = _lanzar(i)
+
+    for proc in procesos.values():
+        if proc.is_alive():
+            proc.terminate()  # SIGTERM: el hijo procesa su ventana y confirma offsets
+    deadline = time.monotonic() + KAFKA_SHUTDOWN_TIMEOUT_SECONDS
+    for i, proc in procesos.items():
+        proc.join(timeout=max(deadline - time.monotonic(), 0.0))
+        if proc.is_alive():
+            print(f"[Consumer] Proceso {i} no terminó a tiempo, forzando cierre")
+            proc.kill()
+    print("[Consumer] Todos los procesos detenidos")
+
+def run_threads(workers: int) -> None:
+    """Corre `workers` consumidores como threads de este proceso (útil si el trabajo es sobre todo I/O)."""
+    from app.core.kafka_consumer import KafkaBusinessConsumer
+
+    detener = threading.Event()
+
+    def _detener(signum, frame):
+        print(f"[Consumer] Señal {signum} recibida, deteniendo {workers} consumidores...")
+        detener.set()
+
+    signal.signal(signal.SIGTERM, _detener)
+    signal.signal(signal.SIGINT, _detener)
+
+    consumers = [KafkaBusinessConsumer(name=str(i)) for i in range(workers)]
+    for consumer in consumers:
+        consumer.start()
+    detener.wait()
+
+    # Primero se les pide a todos que paren, para que los rebalanceos sean uno solo
+    for consumer in consumers:
+        consumer.running = False
+    for consumer in consumers:
+        consumer.stop(timeout=KAFKA_SHUTDOWN_TIMEOUT_SECONDS)
+        print(f"[Consumer {consumer.name}] Métricas finales: {consumer.get_metrics()}")
+    print("[Consumer] Todos los consumidores detenidos")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=KAFKA_CONSUMER_WORKERS,
+                        help="consumidores del grupo (no sirve tener más que particiones)")
+    parser.add_argument("--mode", choices=["process", "thread"], default=KAFKA_CONSUMER_MODE)
+    args = parser.parse_args()
+
+    print(f"[Consumer] Iniciando {args.workers} consumidores en modo {args.mode}")
+    if args.mode == "thread":
+        run_threads(args.workers)
+    else:
+        run_processes(args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# Caché de respuestas del LLM para /preguntar.
+# Una respuesta se reutiliza si coinciden el RUT, los datos mensuales con los que
+# se armó el prompt (hash), el modelo y la pregunta normalizada. Opcionalmente, en
+# modo semántico, también se reutiliza para preguntas parafraseadas cuyo embedding
+# (calculado con Ollama local) es suficientemente parecido.
+#
+# Todas las respuestas de un RUT viven en un hash de Redis, así el consumidor de
+# Kafka las invalida con un solo DEL cuando refresca los datos de ese RUT.
+import os
+import json
+import math
+import hashlib
+from typing import Dict, List, NamedTuple, Optional
+
+import httpx
+
+from .metrics import Counters
+from .local_cache import LocalTTLCache
+from .http_client import get_async_http_client
+from .llm_router import get_llm_router
+from .redis_client import get_redis_client, get_async_redis_client
+from .text import normalize_question
+
+# --- Configuración ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_PREFIX = "answer:"
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(60 * 60 * 6)))
+# Modo semántico: reutiliza respuestas de preguntas parecidas (requiere un modelo de embeddings en Ollama)
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_EMBED_MODEL = os.getenv("ANSWER_CACHE_EMBED_MODEL", "nomic-embed-text")
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+# Máximo de respuestas por RUT (y de preguntas indexadas en modo semántico, lo que acota
+# el costo de la búsqueda); al llenarse se descarta una respuesta al azar
+ANSWER_CACHE_MAX_PER_RUT = int(os.getenv("ANSWER_CACHE_MAX_PER_RUT", "200"))
+# ---
+
+_stats = Counters(
+    "exact_hits", "semantic_hits", "misses", "writes", "evictions", "invalidations", "errors", "embedding_errors",
+    "embedding_skipped"
+)
+# Embeddings recientes por pregunta normalizada: un miss los calcula y el set que le sigue los reutiliza
+_embeddings = LocalTTLCache(1024, 300)
+
+# Respuestas de error de los clientes LLM: nunca se cachean
+_ERROR_PREFIXES = ("Error:", "Hubo un error")
+
+class AnswerKey(NamedTuple):
+    """Lo que identifica una respuesta cacheada."""
+    rut: str
+    data_hash: str
+    model: str
+    question: str  # pregunta normalizada
+
+    @property
+    def field(self) -> str:
+        """Campo dentro del hash del RUT."""
+        question_hash = hashlib.sha1(self.question.encode()).hexdigest()
+        return f"{self.data_hash}:{self.model}:{question_hash}"
+
+    @property
+    def scope(self) -> str:
+        """Prefijo de campo compartido por las preguntas comparables (mismos datos y modelo)."""
+        return f"{self.data_hash}:{self.model}:"
+
+def data_fingerprint(compras: Optional[List[Dict]], ventas: Optional[List[Dict]]) -> str:
+    """Hash de los datos mensuales con los que se arma el prompt."""
+    payload = json.dumps([compras, ventas], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+def build_answer_key(rut: str, compras, ventas, model: str, pregunta: str) -> AnswerKey:
+    return AnswerKey(rut, data_fingerprint(compras, ventas), model, normalize_question(pregunta))
+
+def get_answer_cache_key(rut: str) -> str:
+    """Hash de Redis con las respuestas de un RUT (campo -> respuesta)."""
+    return f"{ANSWER_CACHE_PREFIX}{rut}"
+
+def get_answer_index_key(rut: str) -> str:
+    """Hash de Redis con los embeddings de las preguntas de un RUT (campo -> embedding)."""
+    return f"{ANSWER_CACHE_PREFIX}emb:{rut}"
+
+def is_cacheable(respuesta: Optional[str]) -> bool:
+    return bool(respuesta) and not respuesta.startswith(_ERROR_PREFIXES)
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+async def _embed(texto: str) -> Optional[List[float]]:
+    """
+    Embedding de la pregunta con el modelo local de Ollama, en el host que elige el router
+    (None si falla, o sin llamar si ningún host está sano).
+    """
+    cached = _embeddings.get(texto)
+    if cached is not None:
+        return cached
+    ollama_host = get_llm_router().pick_host()
+    if ollama_host is None:
+        _stats.incr("embedding_skipped")
+        return None
+    try:
+        response = await get_async_http_client().post(
+            f"{ollama_host}/api/embeddings",
+            json={"model": ANSWER_CACHE_EMBED_MODEL, "prompt": texto},
+            timeout=10,
+        )
+        response.raise_for_status()
+        embedding = response.json().get("embedding") or None
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"[Answer Cache] Error al calcular embedding: {e}")
+        _stats.incr("embedding_errors")
+        return None
+    if embedding:
+        _embeddings.set(texto, embedding)
+    return embedding
+
+async def _buscar_similar(client, key: AnswerKey, embedding: List[float]) -> Optional[str]:
+    """Campo de la pregunta indexada más parecida (mismos datos y modelo) si supera el umbral."""
+    mejor_campo, mejor_similitud = None, ANSWER_CACHE_SIMILARITY
+    for campo, raw in (await client.hgetall(get_answer_index_key(key.rut))).items():
+        if not campo.startswith(key.scope):
+            continue
+        similitud = _cosine(embedding, json.loads(raw))
+        if similitud >= mejor_similitud:
+            mejor_campo, mejor_similitud = campo, similitud
+    return mejor_campo
+
+async def get_cached_answer(key: AnswerKey) -> Optional[str]:
+    """
+    Busca una respuesta cacheada: primero por coincidencia exacta de la pregunta
+    normalizada y, en modo semántico, por similitud de embeddings.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    try:
+        client = get_async_redis_client()
+        respuesta = await client.hget(get_answer_cache_key(key.rut), key.field)
+        if respuesta is not None:
+            _stats.incr("exact_hits")
+            return respuesta
+        if ANSWER_CACHE_SEMANTIC:
+            embedding = await _embed(key.question)
+            campo = await _buscar_similar(client, key, embedding) if embedding else None
+            if campo is not None:
+                respuesta = await client.hget(get_answer_cache_key(key.rut), campo)
+                if respuesta is not None:
+                    _stats.incr("semantic_hits")
+                    return respuesta
+    except Exception as e:
+        print(f"[Answer Cache] Error al leer respuestas de RUT {key.rut}: {e}")
+        _stats.incr("errors")
+        return None
+    _stats.incr("misses")
+    return None
+
+async def set_cached_answer(key: AnswerKey, respuesta: str) -> bool:
+    """
+    Guarda una respuesta (las respuestas de error no se cachean). Si el RUT ya tiene
+    ANSWER_CACHE_MAX_PER_RUT respuestas, se descarta una al azar para hacerle lugar.
+    """
+    if not ANSWER_CACHE_ENABLED or not is_cacheable(respuesta):
+        return False
+    cache_key, index_key = get_answer_cache_key(key.rut), get_answer_index_key(key.rut)
+    try:
+        client = get_async_redis_client()
+        lecturas = client.pipeline(transaction=False)
+        lecturas.hlen(cache_key)
+        lecturas.hexists(cache_key, key.field)
+        lecturas.hlen(index_key)
+        respuestas, existe, indexadas = await lecturas.execute()
+
+        embedding = None
+        if ANSWER_CACHE_SEMANTIC and indexadas < ANSWER_CACHE_MAX_PER_RUT:
+            embedding = await _embed(key.question)
+        desalojada = None
+        if respuestas >= ANSWER_CACHE_MAX_PER_RUT and not existe:
+            desalojada = next(iter(await client.hrandfield(cache_key, 1)), None)
+
+        pipe = client.pipeline(transaction=False)
+        if desalojada:
+            pipe.hdel(cache_key, desalojada)
+            pipe.hdel(index_key, desalojada)
+        pipe.hset(cache_key, key.field, respuesta)
+        pipe.expire(cache_key, ANSWER_CACHE_TTL_SECONDS)
+        if embedding:
+            pipe.hset(index_key, key.field, json.dumps(embedding))
+            pipe.expire(index_key, ANSWER_CACHE_TTL_SECONDS)
+        await pipe.execute()
+        if desalojada:
+            _stats.incr("evictions")
+    except Exception as e:
+        print(f"[Answer Cache] Error al guardar respuesta de RUT {key.rut}: {e}")
+        _stats.incr("errors")
+        return False
+    _stats.incr("writes")
+    return True
+
+def invalidate_answers(rut: str) -> None:
+    """Descarta todas las respuestas cacheadas de un RUT (se llama al refrescar sus datos)."""
+    try:
+        get_redis_client().delete(get_answer_cache_key(rut), get_answer_index_key(rut))
+        _stats.incr("invalidations")
+    except Exception as e:
+        print(f"[Answer Cache] Error al invalidar respuestas de RUT {rut}: {e}")
+        _stats.incr("errors")
+
+def get_answer_cache_stats() -> Dict:
+    """Contadores de la caché de respuestas y su hit ratio."""
+    stats = _stats.snapshot()
+    hits = stats["exact_hits"] + stats["semantic_hits"]
+    lookups = hits + stats["misses"]
+    stats["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+    stats["enabled"] = ANSWER_CACHE_ENABLED
+    stats["semantic"] = ANSWER_CACHE_SEMANTIC
+    return stats
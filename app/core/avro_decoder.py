@@ -0,0 +1,113 @@
+import io
+import json
+import struct
+from typing import Any, Dict, Optional
+
+from fastavro import parse_schema, schemaless_reader
+
+from .metrics import Counters
+
+# Campos del evento que pueden afectar los totales mensuales del negocio. Con ellos se
+# arma la huella del evento (kafka_consumer.event_fingerprint), y son los mismos que
+# entrega la proyección Avro: un evento da la misma huella llegue en JSON o en Avro.
+# Lista explícita: users (con messagePreferences), settings, subscriptions y los datos
+# de contacto no cuentan, y un campo nuevo en el evento tampoco hasta agregarlo aquí.
+FINGERPRINT_FIELDS = ("businessId", "rut", "status", "deletedAt")
+
+# Proyección del evento businesses.fct.Update: los campos de la huella más actionType
+# (altas y bajas). Al leer con este esquema, fastavro salta el resto de los campos,
+# los arrays anidados (users con sus messagePreferences, settings, subscriptions) y el
+# registro adminUser sin construir sus diccionarios.
+_TIPOS = {
+    "businessId": "int",
+    "actionType": "string",
+    "rut": "string",
+    "status": ["int", "null"],
+    "deletedAt": ["long", "null"],
+}
+PROJECTION_SCHEMA = {
+    "type": "record",
+    "name": "Update",
+    "namespace": "businesses.fct",
+    "fields": [{"name": campo, "type": _TIPOS[campo]} for campo in ("actionType",) + FINGERPRINT_FIELDS]
+}
+
+# Formato "wire" de Confluent: byte mágico 0 + id de esquema (4 bytes big-endian) + cuerpo Avro
+MAGIC_BYTE = 0
+WIRE_HEADER = struct.Struct(">bI")
+
+class BusinessEventDecoder:
+    """
+    Decodificador de eventos de negocio en modo proyección.
+
+    - El formato (Avro de Confluent o JSON) se detecta una sola vez por tópico,
+      con el primer mensaje reconocible, en lugar de probar estrategias en cada mensaje.
+    - Los esquemas de escritura se piden al Schema Registry una vez por id y se cachean;
+      si el registry no responde se usa el esquema embebido `fallback_writer_schema`.
+    - Se lee con PROJECTION_SCHEMA, que descarta los arrays anidados.
+    """
+
+    def __init__(self, schema_registry_client=None, fallback_writer_schema: Optional[str] = None):
+        self.schema_registry_client = schema_registry_client
+        self._fallback_writer = parse_schema(json.loads(fallback_writer_schema)) if fallback_writer_schema else None
+        self._reader = parse_schema(PROJECTION_SCHEMA)
+        self._writers: Dict[int, Any] = {}
+        self._formats: Dict[str, str] = {}
+        self.stats = Counters("avro", "json", "errors", "schema_fetches")
+
+    def _detect_format(self, value: bytes) -> Optional[str]:
+        if len(value) > WIRE_HEADER.size and value[0] == MAGIC_BYTE:
+            return "avro"
+        if value.lstrip()[:1] in (b"{", b"["):
+            return "json"
+        return None
+
+    def _writer_schema(self, schema_id: int):
+        writer = self._writers.get(schema_id)
+        if writer is not None:
+            return writer
+        if self.schema_registry_client is not None:
+            try:
+                schema = self.schema_registry_client.get_schema(schema_id)
+                writer = parse_schema(json.loads(schema.schema_str))
+                self.stats.incr("schema_fetches")
+            except Exception as e:
+                print(f"[Kafka Decoder] No se pudo obtener el esquema {schema_id} del registry: {e}. Usando esquema embebido.")
+        writer = writer or self._fallback_writer
+        if writer is None:
+            raise ValueError(f"Esquema Avro {schema_id} no disponible")
+        self._writers[schema_id] = writer
+        return writer
+
+    def _decode_avro(self, value: bytes) -> Dict[str, Any]:
+        magic, schema_id = WIRE_HEADER.unpack_from(value)
+        if magic != MAGIC_BYTE:
+            raise ValueError(f"Byte mágico inesperado: {magic}")
+        payload = io.BytesIO(value)
+        payload.seek(WIRE_HEADER.size)
+        return schemaless_reader(payload, self._writer_schema(schema_id), self._reader)
+
+    def decode(self, topic: str, value: Optional[bytes]) -> Optional[Dict[str, Any]]:
+        """Decodifica el valor de un mensaje. Devuelve None si no se puede."""
+        if not value:
+            return None
+        fmt = self._formats.get(topic)
+        if fmt is None:
+            fmt = self._detect_format(value)
+            if fmt is None:
+                print(f"[Kafka Decoder] Formato no reconocido en {topic} (primeros bytes: {value[:10].hex()})")
+                self.stats.incr("errors")
+                return None
+            self._formats[topic] = fmt
+            print(f"[Kafka Decoder] Tópico {topic} detectado como {fmt}")
+        try:
+            if fmt == "avro":
+                data = self._decode_avro(value)
+            else:
+                data = json.loads(value)
+            self.stats.incr(fmt)
+            return data
+        except Exception as e:
+            print(f"[Kafka Decoder] Error al decodificar mensaje {fmt} de {topic}: {e} (primeros bytes: {value[:10].hex()})")
+            self.stats.incr("errors")
+            return None
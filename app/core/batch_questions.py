@@ -0,0 +1,261 @@
+# Motor de preguntas por lotes (jobs nocturnos): muchas combinaciones (RUT, pregunta)
+# con los datos mensuales precargados en bloque, generaciones concurrentes según la
+# capacidad del backend y resultados en un archivo JSONL que permite retomar el job.
+import os
+import json
+import time
+import asyncio
+import hashlib
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from app.services.monthly_data import MonthlyData, get_monthly_data_clientes_async
+from .prompts import generar_prompt_iva
+from .ollama import MODEL_NAME as OLLAMA_MODEL_NAME
+from .openai_client import consultar_openai_async
+from .llm_router import get_llm_router
+from .llm_scheduler import LLMSaturatedError, PRIORITY_BATCH, get_llm_scheduler
+from .answer_cache import build_answer_key, get_cached_answer, set_cached_answer, is_cacheable
+from .fast_answers import try_fast_answer
+
+# --- Configuración ---
+# RUTs cuyos datos mensuales se precargan juntos (un MGET + llamadas concurrentes a la API)
+BATCH_PREFETCH_SIZE = int(os.getenv("BATCH_PREFETCH_SIZE", "200"))
+BATCH_API_CONCURRENCY = int(os.getenv("BATCH_API_CONCURRENCY", "16"))
+BATCH_PROGRESS_SECONDS = float(os.getenv("BATCH_PROGRESS_SECONDS", "10"))
+BATCH_OUTPUT_DIR = os.getenv("BATCH_OUTPUT_DIR", "batch_output")
+# ---
+
+Item = Tuple[str, str]  # (rut, pregunta)
+
+def item_id(rut: str, pregunta: str) -> str:
+    """Identificador estable de una combinación (RUT, pregunta), para poder retomar el job."""
+    return hashlib.sha1(f"{rut}\n{pregunta}".encode()).hexdigest()[:16]
+
+def load_completed(output_path: str) -> Set[str]:
+    """Ids ya respondidos con éxito en un archivo de salida previo (las líneas truncadas se ignoran)."""
+    completados: Set[str] = set()
+    if not os.path.exists(output_path):
+        return completados
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not record.get("error"):
+                completados.add(record["id"])
+    return completados
+
+class BatchQuestionRunner:
+    """
+    Responde una secuencia de (RUT, pregunta) y agrega cada resultado como una línea
+    del JSONL `output_path`. Al volver a correr con el mismo archivo se saltan las
+    combinaciones que ya tienen respuesta, así un job que se cayó se retoma donde quedó.
+
+    Las generaciones usan el scheduler del backend con prioridad batch (las preguntas
+    interactivas pasan primero) y corren tantas a la vez como el backend admite.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        prefetch_size: int = BATCH_PREFETCH_SIZE,
+        api_concurrency: int = BATCH_API_CONCURRENCY,
+        concurrency: Optional[int] = None,
+        progress_seconds: float = BATCH_PROGRESS_SECONDS,
+    ):
+        self.output_path = output_path
+        self.prefetch_size = prefetch_size
+        self.api_concurrency = api_concurrency
+        self.backend = os.getenv("LLM_SERVICE", "ollama").lower()
+        self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo") if self.backend == "openai" else OLLAMA_MODEL_NAME
+        self.concurrency = concurrency or get_llm_scheduler(self.backend).max_in_flight
+        self.progress_seconds = progress_seconds
+
+        self.total = 0
+        self.skipped = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.cached = 0
+        self.fast_path = 0
+        self.running = False
+        self._started_at = 0.0
+        self._last_progress = 0.0
+        self._write_lock = asyncio.Lock()
+
+    def snapshot(self) -> Dict:
+        elapsed = (time.monotonic() - self._started_at) if self._started_at else 0.0
+        procesados = self.succeeded + self.failed
+        return {
+            "output_path": self.output_path,
+            "running": self.running,
+            "total": self.total,
+            "skipped": self.skipped,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "cached": self.cached,
+            "fast_path": self.fast_path,
+            "elapsed_seconds": round(elapsed, 3),
+            "questions_per_second": round(procesados / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+    def _report_progress(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_seconds:
+            return
+        self._last_progress = now
+        stats = self.snapshot()
+        print(f"[Batch Preguntas] Leídas: {stats['total']}, Saltadas: {stats['skipped']}, "
+              f"Éxitos: {stats['succeeded']}, Fallos: {stats['failed']}, {stats['questions_per_second']} preguntas/s")
+
+    async def _generar(self, prompt: str) -> Tuple[str, str]:
+        """
+        Genera con el backend configurado, esperando lugar en el scheduler si está saturado.
+        Devuelve (respuesta, backend que la generó): Ollama puede desbordar a OpenAI.
+        """
+        while True:
+            try:
+                if self.backend == "openai":
+                    async with get_llm_scheduler("openai").slot(PRIORITY_BATCH):
+                        return await consultar_openai_async(prompt), "openai"
+                # El router toma el cupo de Ollama (y el de OpenAI si se desborda)
+                return await get_llm_router().generate(prompt, PRIORITY_BATCH)
+            except LLMSaturatedError as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def _responder(self, rut: str, pregunta: str, datos: MonthlyData) -> Dict:
+        start = time.monotonic()
+        record = {"id": item_id(rut, pregunta), "rut": rut, "pregunta": pregunta}
+        if datos.frame is None:
+            record["error"] = "No se pudieron obtener los datos mensuales"
+            return record
+
+        respuesta = try_fast_answer(datos.frame, pregunta)
+        if respuesta is not None:
+            record.update({"respuesta": respuesta, "fast_path": True,
+                           "elapsed_seconds": round(time.monotonic() - start, 3)})
+            return record
+
+        answer_key = build_answer_key(rut, datos.compras, datos.ventas, f"{self.backend}:{self.model}", pregunta)
+        respuesta = await get_cached_answer(answer_key)
+        record["cached"] = respuesta is not None
+        if respuesta is None:
+            prompt = generar_prompt_iva(rut, datos.compras, datos.ventas, pregunta, datos.frame)
+            respuesta, backend = await self._generar(prompt)
+            # Las respuestas de desborde vienen de otro modelo: no se guardan bajo la clave del configurado
+            if backend == self.backend:
+                await set_cached_answer(answer_key, respuesta)
+        if not is_cacheable(respuesta):
+            record["error"] = respuesta
+        else:
+            record["respuesta"] = respuesta
+        record["elapsed_seconds"] = round(time.monotonic() - start, 3)
+        return record
+
+    async def _write(self, f, record: Dict) -> None:
+        async with self._write_lock:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            # Cada línea queda en disco apenas se escribe: si el proceso muere se pierde a lo sumo la última
+            f.flush()
+            if record.get("error"):
+                self.failed += 1
+            else:
+                self.succeeded += 1
+                self.cached += bool(record.get("cached"))
+                self.fast_path += bool(record.get("fast_path"))
+
+    async def _worker(self, f, queue: asyncio.Queue) -> None:
+        while True:
+            job = await queue.get()
+            try:
+                if job is None:
+                    return
+                try:
+                    record = await self._responder(*job)
+                except Exception as e:
+                    rut, pregunta = job[0], job[1]
+                    print(f"[Batch Preguntas] Error inesperado para RUT {rut}: {e}")
+                    record = {"id": item_id(rut, pregunta), "rut": rut, "pregunta": pregunta, "error": str(e)}
+                await self._write(f, record)
+                self._report_progress()
+            finally:
+                queue.task_done()
+
+    async def _encolar_bloque(self, bloque: List[Item], queue: asyncio.Queue) -> None:
+        """Precarga los datos mensuales de los RUTs del bloque y encola sus preguntas."""
+        datos = await get_monthly_data_clientes_async([rut for rut, _ in bloque], self.api_concurrency)
+        for rut, pregunta in bloque:
+            await queue.put((rut, pregunta, datos.get(rut, MonthlyData(None))))
+
+    async def run(self, items: Union[Iterable[Item], AsyncIterable[Item]]) -> Dict:
+        """
+        Responde todas las combinaciones (RUT, pregunta) de la secuencia.
+
+        Returns:
+            Dict con totales, éxitos, fallos y throughput
+        """
+        self.running = True
+        try:
+            return await self._run(items)
+        finally:
+            self.running = False
+
+    async def _run(self, items: Union[Iterable[Item], AsyncIterable[Item]]) -> Dict:
+        completados = load_completed(self.output_path)
+        if completados:
+            print(f"[Batch Preguntas] Retomando {self.output_path}: {len(completados)} respuestas ya generadas")
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+
+        self._started_at = self._last_progress = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        with open(self.output_path, "a", encoding="utf-8") as f:
+            workers = [asyncio.create_task(self._worker(f, queue)) for _ in range(self.concurrency)]
+            try:
+                bloque: List[Item] = []
+
+                async def agregar(item: Item) -> None:
+                    nonlocal bloque
+                    self.total += 1
+                    if item_id(*item) in completados:
+                        self.skipped += 1
+                        return
+                    bloque.append(item)
+                    if len(bloque) >= self.prefetch_size:
+                        await self._encolar_bloque(bloque, queue)
+                        bloque = []
+
+                if hasattr(items, "__aiter__"):
+                    async for item in items:
+                        await agregar(item)
+                else:
+                    for item in items:
+                        await agregar(item)
+                if bloque:
+                    await self._encolar_bloque(bloque, queue)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+
+        self._report_progress(force=True)
+        return self.snapshot()
+
+# Jobs lanzados desde la API en este proceso (id -> runner), para consultar su avance
+_jobs: Dict[str, BatchQuestionRunner] = {}
+
+def create_batch_job(job_id: str) -> BatchQuestionRunner:
+    """
+    Crea el runner de un job con salida en BATCH_OUTPUT_DIR/<job_id>.jsonl (mismo id = se retoma).
+    Queda marcado como corriendo desde ya, antes de que la tarea en background llame a run():
+    así un segundo POST con el mismo id recibe 409 aunque llegue antes de que arranque.
+    """
+    runner = BatchQuestionRunner(os.path.join(BATCH_OUTPUT_DIR, f"{job_id}.jsonl"))
+    runner.running = True
+    _jobs[job_id] = runner
+    return runner
+
+def get_batch_job(job_id: str) -> Optional[BatchQuestionRunner]:
+    return _jobs.get(job_id)
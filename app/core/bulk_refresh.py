@@ -0,0 +1,176 @@
+# Motor de refresco masivo de la caché mensual: muchos RUTs en paralelo,
+# con límite de tasa hacia la API de monthly_sales, reintentos con backoff
+# y escrituras a Redis agrupadas en pipelines.
+import os
+import time
+import random
+import asyncio
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Union
+
+import httpx
+
+from app.services.monthly_data import API_TOKEN, fetch_monthly_sales_async
+from .monthly_cache import set_monthly_cache_many_async
+from .business_registry import mark_refreshed_many_async
+from .rate_limit import AsyncTokenBucket
+
+# --- Configuración ---
+BULK_REFRESH_CONCURRENCY = int(os.getenv("BULK_REFRESH_CONCURRENCY", "16"))
+# Llamadas por segundo a la API de monthly_sales (0 = sin límite)
+BULK_REFRESH_RATE = float(os.getenv("BULK_REFRESH_RATE", "50"))
+BULK_REFRESH_MAX_RETRIES = int(os.getenv("BULK_REFRESH_MAX_RETRIES", "3"))
+BULK_REFRESH_BACKOFF_SECONDS = float(os.getenv("BULK_REFRESH_BACKOFF_SECONDS", "0.5"))
+BULK_REFRESH_WRITE_BATCH = int(os.getenv("BULK_REFRESH_WRITE_BATCH", "100"))
+BULK_REFRESH_PROGRESS_SECONDS = float(os.getenv("BULK_REFRESH_PROGRESS_SECONDS", "10"))
+# ---
+
+class RetryableError(Exception):
+    """Error transitorio de la API (red, 429 o 5xx): vale la pena reintentar."""
+
+class BulkRefresher:
+    """
+    Refresca la caché mensual de una secuencia de RUTs (lista o iterable asíncrono)
+    con `concurrency` workers. Los RUTs se consumen a medida que se procesan, por lo
+    que la secuencia puede ser arbitrariamente larga sin cargarla en memoria.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = BULK_REFRESH_CONCURRENCY,
+        rate: float = BULK_REFRESH_RATE,
+        max_retries: int = BULK_REFRESH_MAX_RETRIES,
+        backoff_seconds: float = BULK_REFRESH_BACKOFF_SECONDS,
+        write_batch: int = BULK_REFRESH_WRITE_BATCH,
+        progress_seconds: float = BULK_REFRESH_PROGRESS_SECONDS,
+    ):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.write_batch = write_batch
+        self.progress_seconds = progress_seconds
+        self.bucket = AsyncTokenBucket(rate)
+
+        self.succeeded = 0
+        self.failed: List[str] = []
+        self.retries = 0
+        self._pending_writes: Dict[str, List[Dict]] = {}
+        self._write_lock = asyncio.Lock()
+        self._started_at = 0.0
+        self._last_progress = 0.0
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + len(self.failed) + len(self._pending_writes)
+
+    def _throughput(self) -> float:
+        elapsed = time.monotonic() - self._started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    async def _fetch(self, rut: str) -> Optional[List[Dict]]:
+        """Pide los datos de un RUT. Lanza RetryableError para errores transitorios."""
+        try:
+            data = await fetch_monthly_sales_async(rut)
+        except httpx.TransportError as e:
+            raise RetryableError(str(e)) from e
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            if status == 429 or status >= 500:
+                raise RetryableError(f"HTTP {status}") from e
+            print(f"[Bulk Refresh] RUT {rut}: HTTP {status}, no se reintenta")
+            return None
+        return data
+
+    async def _fetch_with_retries(self, rut: str) -> Optional[List[Dict]]:
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                return await self._fetch(rut)
+            except RetryableError as e:
+                if attempt == self.max_retries:
+                    print(f"[Bulk Refresh] RUT {rut}: agotados los reintentos ({e})")
+                    return None
+                self.retries += 1
+                # Backoff exponencial con jitter
+                delay = self.backoff_seconds * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay))
+            except Exception as e:
+                print(f"[Bulk Refresh] RUT {rut}: error inesperado: {e}")
+                return None
+        return None
+
+    async def _flush(self, force: bool = False) -> None:
+        """Escribe en un pipeline los resultados acumulados."""
+        async with self._write_lock:
+            if not self._pending_writes or (not force and len(self._pending_writes) < self.write_batch):
+                return
+            batch, self._pending_writes = self._pending_writes, {}
+            if await set_monthly_cache_many_async(batch):
+                await mark_refreshed_many_async(batch)
+                self.succeeded += len(batch)
+            else:
+                self.failed.extend(batch)
+
+    def _report_progress(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_seconds:
+            return
+        self._last_progress = now
+        print(f"[Bulk Refresh] Procesados: {self.processed}, Éxitos: {self.succeeded}, "
+              f"Fallos: {len(self.failed)}, Reintentos: {self.retries}, {self._throughput():.1f} RUTs/s")
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            rut = await queue.get()
+            try:
+                if rut is None:
+                    return
+                data = await self._fetch_with_retries(rut)
+                if data is None:
+                    self.failed.append(rut)
+                else:
+                    self._pending_writes[rut] = data
+                    await self._flush()
+                self._report_progress()
+            finally:
+                queue.task_done()
+
+    async def run(self, ruts: Union[Iterable[str], AsyncIterable[str]]) -> dict:
+        """
+        Refresca todos los RUTs de la secuencia.
+
+        Returns:
+            Dict con éxitos, RUTs fallidos, tiempo total y throughput (RUTs/s)
+        """
+        if not API_TOKEN:
+            print("[Bulk Refresh] Error: La variable de entorno BUSINESS_INVOICES_TOKEN no está definida.")
+            return {"succeeded": 0, "failed": [], "retries": 0, "elapsed_seconds": 0.0, "ruts_per_second": 0.0}
+
+        self._started_at = self._last_progress = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        # Las llamadas usan el cliente httpx compartido; la concurrencia la acotan los workers
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            if hasattr(ruts, "__aiter__"):
+                async for rut in ruts:
+                    await queue.put(rut)
+            else:
+                for rut in ruts:
+                    await queue.put(rut)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+        await self._flush(force=True)
+
+        elapsed = time.monotonic() - self._started_at
+        self._report_progress(force=True)
+        return {
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "elapsed_seconds": round(elapsed, 3),
+            "ruts_per_second": round(self.processed / elapsed, 2) if elapsed > 0 else 0.0,
+        }
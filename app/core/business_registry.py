@@ -0,0 +1,135 @@
+# Registro persistente de negocios en Redis.
+# Un sorted set RUT -> epoch del último refresco exitoso de su caché mensual
+# (0 = nunca refrescado). Se alimenta de los eventos de businesses.fct.update.0
+# y permite recorrer todos los negocios, del más desactualizado al más reciente,
+# en lotes y sin cargar la lista completa en memoria.
+import os
+import time
+import uuid
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from .redis_client import get_redis_client, get_async_redis_client
+from .monthly_cache import delete_monthly_cache
+
+REGISTRY_KEY = "business:registry"
+# Hash RUT -> fingerprint del último evento de Kafka que disparó un refresco
+FINGERPRINT_KEY = "business:fingerprint"
+REGISTRY_BATCH_SIZE = int(os.getenv("BUSINESS_REGISTRY_BATCH_SIZE", "500"))
+# Vida de la foto del registro que toma iter_stale_businesses (se renueva en cada lote)
+REGISTRY_SCAN_TTL_SECONDS = int(os.getenv("BUSINESS_REGISTRY_SCAN_TTL_SECONDS", "3600"))
+# Valores de actionType que indican que el negocio fue eliminado
+DELETE_ACTION_TYPES = {"delete", "deleted", "destroy", "remove"}
+
+def is_deleted_event(data: Dict) -> bool:
+    """True si el evento de Kafka indica que el negocio fue eliminado."""
+    action_type = (data.get("actionType") or "").lower()
+    return data.get("deletedAt") is not None or action_type in DELETE_ACTION_TYPES
+
+def register_business(rut: str) -> bool:
+    """Agrega un RUT al registro (si ya existe se mantiene su fecha de refresco)."""
+    try:
+        get_redis_client().zadd(REGISTRY_KEY, {rut: 0}, nx=True)
+        return True
+    except Exception as e:
+        print(f"[Registry] Error al registrar RUT {rut}: {e}")
+        return False
+
+async def register_business_async(rut: str) -> bool:
+    """Versión asíncrona de register_business."""
+    try:
+        await get_async_redis_client().zadd(REGISTRY_KEY, {rut: 0}, nx=True)
+        return True
+    except Exception as e:
+        print(f"[Registry] Error al registrar RUT {rut}: {e}")
+        return False
+
+def unregister_business(rut: str) -> None:
+    """Quita un RUT del registro y descarta su caché mensual."""
+    try:
+        client = get_redis_client()
+        client.zrem(REGISTRY_KEY, rut)
+        client.hdel(FINGERPRINT_KEY, rut)
+    except Exception as e:
+        print(f"[Registry] Error al eliminar RUT {rut}: {e}")
+    delete_monthly_cache(rut)
+
+def mark_refreshed(rut: str, refreshed_at: Optional[float] = None) -> None:
+    """Registra el refresco exitoso de un RUT (sólo si sigue en el registro)."""
+    try:
+        get_redis_client().zadd(REGISTRY_KEY, {rut: refreshed_at or time.time()}, xx=True)
+    except Exception as e:
+        print(f"[Registry] Error al marcar refresco de RUT {rut}: {e}")
+
+async def mark_refreshed_many_async(ruts: Iterable[str], refreshed_at: Optional[float] = None) -> None:
+    """Versión asíncrona y por lotes de mark_refreshed."""
+    score = refreshed_at or time.time()
+    mapping = {rut: score for rut in ruts}
+    if not mapping:
+        return
+    try:
+        await get_async_redis_client().zadd(REGISTRY_KEY, mapping, xx=True)
+    except Exception as e:
+        print(f"[Registry] Error al marcar refresco de {len(mapping)} RUTs: {e}")
+
+def get_fingerprints(ruts: List[str]) -> Dict[str, Optional[str]]:
+    """Fingerprints guardados para varios RUTs (None si no hay) en un solo HMGET."""
+    if not ruts:
+        return {}
+    try:
+        return dict(zip(ruts, get_redis_client().hmget(FINGERPRINT_KEY, ruts)))
+    except Exception as e:
+        print(f"[Registry] Error al leer fingerprints: {e}")
+        return {}
+
+def set_fingerprint(rut: str, fingerprint: str) -> None:
+    """Guarda el fingerprint del evento con el que se refrescó un RUT."""
+    try:
+        get_redis_client().hset(FINGERPRINT_KEY, rut, fingerprint)
+    except Exception as e:
+        print(f"[Registry] Error al guardar fingerprint de RUT {rut}: {e}")
+
+async def get_registry_size_async() -> int:
+    """Cantidad de negocios registrados."""
+    try:
+        return await get_async_redis_client().zcard(REGISTRY_KEY)
+    except Exception as e:
+        print(f"[Registry] Error al leer el tamaño del registro: {e}")
+        return 0
+
+async def iter_stale_businesses(
+    batch_size: int = REGISTRY_BATCH_SIZE,
+    refreshed_before: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    Recorre los RUTs cuyo último refresco es anterior a `refreshed_before`
+    (por defecto, el inicio del recorrido), del más desactualizado al más reciente.
+
+    Al empezar copia el rango pendiente a una clave temporal (ZRANGESTORE) y la lee
+    en lotes de `batch_size` por posición: el cursor sólo avanza, así que el recorrido
+    es O(N) aunque muchos RUTs compartan score o fallen una y otra vez. Antes de
+    entregar cada lote se descartan los RUTs que se refrescaron o salieron del
+    registro durante el recorrido; ninguno se entrega dos veces.
+    """
+    cutoff = refreshed_before or time.time()
+    client = get_async_redis_client()
+    snapshot_key = f"{REGISTRY_KEY}:scan:{uuid.uuid4().hex}"
+
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.zrangestore(snapshot_key, REGISTRY_KEY, "-inf", f"({cutoff}", byscore=True)
+        pipe.expire(snapshot_key, REGISTRY_SCAN_TTL_SECONDS)
+        total, _ = await pipe.execute()
+
+    try:
+        for start in range(0, total, batch_size):
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zrange(snapshot_key, start, start + batch_size - 1)
+                pipe.expire(snapshot_key, REGISTRY_SCAN_TTL_SECONDS)
+                ruts, _ = await pipe.execute()
+            if not ruts:
+                return
+            scores = await client.zmscore(REGISTRY_KEY, ruts)
+            for rut, score in zip(ruts, scores):
+                if score is not None and score < cutoff:
+                    yield rut
+    finally:
+        await client.delete(snapshot_key)
@@ -0,0 +1,91 @@
+# Agregados diarios de montos (cantidad, suma, mínimo y máximo por día) para responder
+# resúmenes de cualquier rango de fechas localmente, con sumas acumuladas, en lugar de
+# pedir a la API un resumen por cada combinación de fechas.
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+class DailyAggregates:
+    """
+    Agregados por día ('YYYY-MM-DD'). Se arman con add() a medida que se leen los
+    documentos y se serializan como hash de Redis (un campo por día).
+    Las consultas por rango usan sumas acumuladas de cantidad y monto: los totales
+    salen en O(log días) y el mínimo, máximo y el desglose mensual en O(días del rango).
+    """
+
+    def __init__(self):
+        self._por_dia: Dict[str, List[float]] = {}  # dia -> [cantidad, suma, min, max]
+        self._dias: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self._por_dia)
+
+    def add(self, dia: str, monto: float) -> None:
+        dia = dia[:10]
+        actual = self._por_dia.get(dia)
+        if actual is None:
+            self._por_dia[dia] = [1, monto, monto, monto]
+        else:
+            actual[0] += 1
+            actual[1] += monto
+            actual[2] = min(actual[2], monto)
+            actual[3] = max(actual[3], monto)
+        self._dias = None
+
+    def to_hash(self) -> Dict[str, str]:
+        return {dia: f"{c:.0f},{s!r},{mn!r},{mx!r}" for dia, (c, s, mn, mx) in self._por_dia.items()}
+
+    @classmethod
+    def from_hash(cls, data: Dict[str, str]) -> "DailyAggregates":
+        """Reconstruye los agregados desde el hash de Redis (los campos que empiezan con '_' son metadata)."""
+        agg = cls()
+        for dia, valor in data.items():
+            if dia.startswith("_"):
+                continue
+            c, s, mn, mx = valor.split(",")
+            agg._por_dia[dia] = [int(c), float(s), float(mn), float(mx)]
+        return agg
+
+    def _indexar(self) -> None:
+        """Ordena los días y calcula las sumas acumuladas (una vez por cada cambio)."""
+        self._dias = sorted(self._por_dia)
+        self._cantidad_acum = array("q", [0])
+        self._suma_acum = array("d", [0.0])
+        for dia in self._dias:
+            c, s, _, _ = self._por_dia[dia]
+            self._cantidad_acum.append(self._cantidad_acum[-1] + int(c))
+            self._suma_acum.append(self._suma_acum[-1] + s)
+
+    def summary(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+        """
+        Resumen del rango [start, end] (días 'YYYY-MM-DD', ambos inclusive), con la misma
+        forma que /api/facturas/resumen. facturas_por_mes: [{mes, cantidad, monto}].
+        """
+        if self._dias is None:
+            self._indexar()
+        i = bisect_left(self._dias, start[:10]) if start else 0
+        j = bisect_right(self._dias, end[:10]) if end else len(self._dias)
+        j = max(i, j)
+
+        total = self._cantidad_acum[j] - self._cantidad_acum[i]
+        monto = self._suma_acum[j] - self._suma_acum[i]
+        minimo = maximo = 0
+        por_mes: Dict[str, List[float]] = {}
+        for dia in self._dias[i:j]:
+            c, s, mn, mx = self._por_dia[dia]
+            minimo = mn if not por_mes else min(minimo, mn)
+            maximo = mx if not por_mes else max(maximo, mx)
+            mes = por_mes.setdefault(dia[:7], [0, 0.0])
+            mes[0] += c
+            mes[1] += s
+
+        return {
+            "total_facturas": total,
+            "monto_total": monto,
+            "promedio_monto": monto / total if total else 0,
+            "max_monto": maximo,
+            "min_monto": minimo,
+            "facturas_por_mes": [
+                {"mes": mes, "cantidad": int(c), "monto": s} for mes, (c, s) in sorted(por_mes.items())
+            ],
+        }
@@ -0,0 +1,253 @@
+# Respuestas directas (sin LLM) para preguntas que se calculan con los datos mensuales:
+# "¿cuánto IVA pagué en marzo?", "total ventas último trimestre", "promedio de compras
+# en 2024". Un clasificador por reglas detecta la métrica, la agregación y el periodo;
+# si algo no calza (o la pregunta pide un consejo) se devuelve None y responde el LLM.
+import os
+import re
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .metrics import Counters
+from .text import normalize_question
+from .monthly_frame import MonthlyFrame
+
+# --- Configuración ---
+FAST_ANSWERS_ENABLED = os.getenv("FAST_ANSWERS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Rangos de hasta esta cantidad de meses se responden con el desglose mensual
+FAST_ANSWERS_DETAIL_MONTHS = int(os.getenv("FAST_ANSWERS_DETAIL_MONTHS", "6"))
+# ---
+
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+         "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+# Preguntas abiertas o de consejo: siempre al LLM
+_CONSEJO = re.compile(
+    r"\b(deberia|debiera|conviene|convendria|recomienda\w*|consejo\w*|por que|como puedo|como hago|"
+    r"que hago|estrategia\w*|es mejor|puedo rebajar|explica\w*|significa|riesgo\w*|optimiz\w*)\b"
+)
+# Comparaciones, variaciones y tendencias: el camino rápido sólo entrega una cifra
+_COMPARACION = re.compile(
+    r"\b(compar\w*|crec\w*|variacion\w*|vario|varia|vs|versus|anterior\w*|diferencia\w*|respecto|frente a|"
+    r"contra|evolucion\w*|tendencia\w*|aument\w*|disminu\w*|subio|subieron|bajaron|cayo|cayeron|cambi\w*|"
+    r"mas que|menos que)\b"
+)
+# Modificadores que cambian la cifra pedida y que el camino rápido no calcula
+_NO_SOPORTADO = re.compile(
+    r"\b(maxim\w*|minim\w*|mayor|menor|mejor|peor|mediana|porcentaje|porcentual|tasa|proyec\w*|estim\w*|"
+    r"esper\w*|proxim\w*|siguiente|futur\w*|netos?|netas?|brutos?|brutas?|exent\w*|afect\w*|sin iva|con iva|"
+    r"cliente\w*|proveedor\w*|semana\w*|quincena\w*|diari\w*|dias?|hoy|ayer)\b"
+    r"|\b\d{1,2} de (" + "|".join(MESES) + r")\b"
+)
+# "por mes" / "mensual" sólo se entiende junto a "promedio"
+_POR_MES = re.compile(r"\b(por mes|cada mes|mensual\w*)\b")
+# La pregunta tiene que pedir un número
+_PIDE_CIFRA = re.compile(r"\b(cuanto|cuanta|cuantos|total|monto|suma|promedio|cual fue|cual es|cuales fueron)\b")
+
+# Métricas: (nombre, patrón), de la más específica a la más general. Cada calce se
+# saca del texto antes de probar la siguiente: "iva de compras" es sólo crédito fiscal.
+_METRICAS = [
+    ("iva_credito", re.compile(r"\bcredito fiscal\b|\biva( \w+)? (de|por|en) (mis |las |nuestras )?compras\b")),
+    ("iva_debito", re.compile(r"\bdebito fiscal\b|\biva( \w+)? (de|por|en) (mis |las |nuestras )?ventas\b")),
+    ("iva_neto", re.compile(r"\biva\b")),
+    ("total_sales", re.compile(r"\bventas?\b|\bvend\w*\b|\bfacture\b|\bfacturamos\b")),
+    ("total_purchases", re.compile(r"\bcompras?\b|\bcompre\b|\bcompramos\b|\bgast\w*\b")),
+]
+_ETIQUETAS = {
+    "iva_credito": "crédito fiscal (IVA de compras)",
+    "iva_debito": "débito fiscal (IVA de ventas)",
+    "iva_neto": "IVA a pagar (débito fiscal - crédito fiscal)",
+    "total_sales": "total de ventas",
+    "total_purchases": "total de compras",
+}
+
+_PERIODO = re.compile(r"\d{4}-\d{2}")
+_ANIO = re.compile(r"\b(20\d{2})\b")
+_MES = re.compile(r"\b(" + "|".join(MESES) + r")\b")
+_ULTIMOS_MESES = re.compile(r"\bultimos (\d{1,2}|dos|tres|cuatro|cinco|seis|doce) meses\b")
+_NUMEROS = {"dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6, "doce": 12}
+_TRIMESTRE = re.compile(r"\b(primer|segundo|tercer|cuarto|1er|2do|3er|4to|t[1-4])\s*(trimestre)?\b")
+_SEMESTRE = re.compile(r"\b(primer|segundo|1er|2do)\s+semestre\b")
+_ORDINALES = {"primer": 1, "1er": 1, "segundo": 2, "2do": 2, "tercer": 3, "3er": 3, "cuarto": 4, "4to": 4}
+# Periodos relativos a la fecha o a los últimos datos; junto a un año explícito son ambiguos
+_RELATIVO = re.compile(
+    r"\b(ultimo|este|el) (trimestre|semestre)\b|\b(ultimo|este) (ano|mes)\b|\bultimos \w+ meses\b|\bmes pasado\b"
+)
+
+_stats = Counters("answered", "llm_fallback", "advice", "comparison", "no_match", "no_data")
+
+class FastIntent(NamedTuple):
+    """Pregunta calculable: métrica, agregación ('suma' | 'promedio') y periodos pedidos."""
+    metric: str
+    aggregation: str
+    periods: List[str]
+    description: str
+
+def _ultimos(disponibles: List[str], n: int, descripcion: str) -> Optional[tuple]:
+    """Los últimos `n` meses con datos; None si la historia es más corta que lo pedido."""
+    if n <= 0 or n > len(disponibles):
+        return None
+    return disponibles[-n:], descripcion
+
+def _mes_calendario(periodo: str, disponibles: List[str], descripcion: str) -> tuple:
+    return ([periodo] if periodo in disponibles else []), f"{descripcion} ({periodo})"
+
+def _periodos(texto: str, disponibles: List[str], hoy: date) -> Optional[tuple]:
+    """(periodos 'YYYY-MM' pedidos, descripción) según el texto; None si no se reconoce el periodo."""
+    if not disponibles:
+        return None
+    anios = set(_ANIO.findall(texto))
+    meses = set(_MES.findall(texto))
+    if len(anios) > 1 or len(meses) > 1:
+        return None
+    anio = next(iter(anios), None)
+
+    if meses:
+        mes = meses.pop()
+        sufijo = f"-{MESES.index(mes) + 1:02d}"
+        candidatos = [p for p in disponibles if p.endswith(sufijo) and (anio is None or p.startswith(anio))]
+        if not candidatos:
+            return [], f"{mes} {anio or ''}".strip()
+        # Sin año: el mes más reciente con ese nombre
+        return [candidatos[-1]], f"{mes} {candidatos[-1][:4]}"
+
+    if "trimestre" in texto and _TRIMESTRE.search(texto):
+        trimestres = _TRIMESTRE.findall(texto)
+        if len(trimestres) > 1:
+            return None
+        clave = trimestres[0][0]
+        q = int(clave[1]) if clave.startswith("t") else _ORDINALES[clave]
+        anio = anio or disponibles[-1][:4]
+        meses_q = {f"{anio}-{m:02d}" for m in range(3 * q - 2, 3 * q + 1)}
+        return [p for p in disponibles if p in meses_q], f"el trimestre {q} de {anio}"
+
+    semestres = _SEMESTRE.findall(texto)
+    if len(semestres) > 1:
+        return None
+    if semestres:
+        s = _ORDINALES[semestres[0]]
+        anio = anio or disponibles[-1][:4]
+        meses_s = {f"{anio}-{m:02d}" for m in range(6 * s - 5, 6 * s + 1)}
+        return [p for p in disponibles if p in meses_s], f"el semestre {s} de {anio}"
+
+    if anio:
+        # Un año explícito manda sobre "el año" ("en el año 2023" es 2023), pero junto a
+        # un periodo relativo ("último trimestre de 2023") la pregunta es ambigua
+        if _RELATIVO.search(texto):
+            return None
+        return [p for p in disponibles if p.startswith(anio)], f"{anio}"
+
+    if re.search(r"\b(ultimo|este|el) trimestre\b", texto):
+        return _ultimos(disponibles, 3, "el último trimestre")
+    if re.search(r"\b(ultimo|este|el) semestre\b", texto):
+        return _ultimos(disponibles, 6, "el último semestre")
+    ultimos = _ULTIMOS_MESES.search(texto)
+    if ultimos:
+        n = int(ultimos.group(1)) if ultimos.group(1).isdigit() else _NUMEROS[ultimos.group(1)]
+        return _ultimos(disponibles, n, f"los últimos {n} meses")
+    if re.search(r"\b(ultimo|este|el) ano\b", texto):
+        return _ultimos(disponibles, 12, "los últimos 12 meses")
+    if re.search(r"\bmes pasado\b", texto):
+        # Mes calendario anterior al actual, aunque todavía no tenga datos
+        anterior = (hoy.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+        return _mes_calendario(anterior, disponibles, "el mes pasado")
+    if re.search(r"\beste mes\b", texto):
+        return _mes_calendario(hoy.strftime("%Y-%m"), disponibles, "este mes")
+    if re.search(r"\b(ultimo mes|el mes)\b", texto):
+        return disponibles[-1:], f"el último mes disponible ({disponibles[-1]})"
+    return None
+
+def _metrica(texto: str) -> Optional[str]:
+    """La única métrica que nombra el texto; None si no nombra ninguna o nombra varias."""
+    encontradas = []
+    for nombre, patron in _METRICAS:
+        texto, calces = patron.subn(" ", texto)
+        if calces:
+            encontradas.append(nombre)
+    return encontradas[0] if len(encontradas) == 1 else None
+
+def classify_question(pregunta: str, disponibles: List[str], hoy: Optional[date] = None) -> Optional[FastIntent]:
+    """
+    Detecta si la pregunta se responde con una cifra de los datos mensuales.
+    `disponibles`: periodos 'YYYY-MM' con datos, ordenados. `hoy` es la fecha de
+    referencia de "este mes" y "mes pasado" (por defecto, la fecha actual).
+    Devuelve None si la pregunta es abierta, pide consejo o una comparación, nombra
+    más de una métrica, mes o año, o trae algo que no se reconoce.
+    """
+    texto = normalize_question(pregunta)
+    if _CONSEJO.search(texto):
+        _stats.incr("advice")
+        return None
+    if _COMPARACION.search(texto):
+        _stats.incr("comparison")
+        return None
+    if not _PIDE_CIFRA.search(texto) and not re.search(r"\b(pague|pagamos|vendi|compre)\b", texto):
+        _stats.incr("no_match")
+        return None
+    promedio = re.search(r"\bpromedio\b", texto) is not None
+    if _NO_SOPORTADO.search(texto) or (_POR_MES.search(texto) and not promedio):
+        _stats.incr("no_match")
+        return None
+    metrica = _metrica(texto)
+    periodo = _periodos(texto, disponibles, hoy or date.today()) if metrica else None
+    if periodo is None:
+        _stats.incr("no_match")
+        return None
+    return FastIntent(metrica, "promedio" if promedio else "suma", periodo[0], periodo[1])
+
+def _serie(frame: MonthlyFrame, metrica: str) -> np.ndarray:
+    indicadores = frame.indicators()
+    return indicadores[metrica] if metrica in indicadores else frame.column(metrica)
+
+def _monto(valor: float) -> str:
+    return f"${valor:,.0f}"
+
+def answer_question(frame: MonthlyFrame, intent: FastIntent) -> Optional[str]:
+    """Arma la respuesta con las cifras del periodo; None si no hay datos para calcularla."""
+    filas = [frame.periods.index(p) for p in intent.periods]
+    serie = _serie(frame, intent.metric)
+    valores = serie[filas] if filas else np.array([])
+    presentes = valores[~np.isnan(valores)]
+    if len(presentes) == 0:
+        _stats.incr("no_data")
+        return None
+
+    etiqueta = _ETIQUETAS[intent.metric]
+    if intent.aggregation == "promedio":
+        texto = f"El promedio mensual ({etiqueta}) en {intent.description} fue de {_monto(presentes.mean())}"
+    else:
+        texto = f"El {etiqueta} en {intent.description} fue de {_monto(presentes.sum())}"
+    if intent.metric == "iva_neto" and intent.aggregation == "suma" and presentes.sum() < 0:
+        texto = (f"En {intent.description} no hubo IVA a pagar: el crédito fiscal superó al débito "
+                 f"y quedó un remanente de {_monto(-presentes.sum())}")
+    if 1 < len(filas) <= FAST_ANSWERS_DETAIL_MONTHS:
+        detalle = ", ".join(
+            f"{frame.periods[i]}: {_monto(serie[i])}" for i in filas if not np.isnan(serie[i])
+        )
+        texto += f" (detalle: {detalle})"
+    if len(presentes) < len(intent.periods):
+        texto += f". Faltan datos de {len(intent.periods) - len(presentes)} de los {len(intent.periods)} meses"
+    return texto + "."
+
+def try_fast_answer(frame: Optional[MonthlyFrame], pregunta: str) -> Optional[str]:
+    """
+    Respuesta directa si la pregunta es calculable con los datos mensuales del RUT
+    (el MonthlyFrame que arma la capa de datos); None si debe responder el LLM
+    (se cuenta como llm_fallback). Una pregunta que no es texto (el body puede traer
+    un número, una lista o null) también va al LLM.
+    """
+    if not FAST_ANSWERS_ENABLED or not isinstance(pregunta, str) or not pregunta or frame is None or not len(frame):
+        return None
+    intent = classify_question(pregunta, [p for p in frame.periods if _PERIODO.fullmatch(p)])
+    respuesta = answer_question(frame, intent) if intent else None
+    _stats.incr("answered" if respuesta is not None else "llm_fallback")
+    return respuesta
+
+def get_fast_answer_stats() -> Dict:
+    """Contadores del camino rápido y la fracción de preguntas que absorbe."""
+    stats = _stats.snapshot()
+    total = stats["answered"] + stats["llm_fallback"]
+    stats["absorption_ratio"] = round(stats["answered"] / total, 4) if total else 0.0
+    stats["enabled"] = FAST_ANSWERS_ENABLED
+    return stats
@@ -0,0 +1,78 @@
+import os
+import threading
+from typing import Optional
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configuración del pool HTTP compartido
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "50"))
+# Conexiones keep-alive por host de la sesión síncrona (la usan los threads del consumidor de Kafka)
+HTTP_SYNC_POOL_MAXSIZE = int(os.getenv("HTTP_SYNC_POOL_MAXSIZE", "32"))
+
+# Cliente asíncrono compartido por todo el proceso (se crea de forma perezosa)
+_async_client: Optional[httpx.AsyncClient] = None
+# Sesión síncrona compartida (requests) para el código que corre fuera del event loop
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente httpx.AsyncClient compartido del proceso.
+    Reutiliza conexiones (keep-alive) entre requests en lugar de abrir una nueva cada vez.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+            )
+        )
+    return _async_client
+
+async def close_async_http_client() -> None:
+    """Cierra el cliente asíncrono compartido (llamar al detener la aplicación)."""
+    global _async_client
+    if _async_client is not None and not _async_client.is_closed:
+        await _async_client.aclose()
+    _async_client = None
+
+def get_http_session() -> requests.Session:
+    """
+    Devuelve la sesión requests compartida del proceso (thread-safe).
+    Mantiene un pool de conexiones keep-alive por host en lugar de abrir
+    una conexión TCP nueva en cada requests.get/post. Las llamadas deben
+    pasar su propio timeout (requests no tiene timeout por sesión).
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=HTTP_SYNC_POOL_MAXSIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def close_http_session() -> None:
+    """Cierra la sesión síncrona compartida y sus conexiones."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+def init_http_clients() -> None:
+    """Crea los clientes HTTP compartidos (llamar al iniciar la aplicación)."""
+    get_async_http_client()
+    get_http_session()
+
+async def close_http_clients() -> None:
+    """Cierra los clientes HTTP compartidos (llamar al detener la aplicación)."""
+    await close_async_http_client()
+    close_http_session()
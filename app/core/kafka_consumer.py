@@ -2,14 +2,20 @@ import os
 import threading
 import json
 import time
-import io
-from typing import Callable, Dict, Any
-from confluent_kafka import Consumer, KafkaError, KafkaException
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from confluent_kafka import Consumer, KafkaError, KafkaException, TopicPartition
 from confluent_kafka.schema_registry import SchemaRegistryClient
-from confluent_kafka.schema_registry.avro import AvroDeserializer
-from confluent_kafka.serialization import MessageField, SerializationContext
 
+from .avro_decoder import BusinessEventDecoder, FINGERPRINT_FIELDS
 from .cache_updater import update_business_data
+from .business_registry import (
+    is_deleted_event, register_business, unregister_business,
+    get_fingerprints, set_fingerprint
+)
+from .answer_cache import invalidate_answers
+from .metrics import Counters
 
 # --- Configuración desde variables de entorno ---
 BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9094")
@@ -17,10 +23,25 @@ SCHEMA_REGISTRY_URL = os.getenv("KAFKA_SCHEMA_REGISTRY_URL", "http://localhost:8
 CLIENT_ID = os.getenv("KAFKA_CLIENT_ID", "orquestador-app-development")
 TOPIC = os.getenv("KAFKA_TOPIC", "businesses.fct.update.0")
 GROUP_ID = os.getenv("KAFKA_GROUP_ID", "orquestador-llm-consumer-group")
+# Consumo por lotes: hasta KAFKA_BATCH_SIZE mensajes por llamada a consume()
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", "100"))
+KAFKA_BATCH_TIMEOUT_SECONDS = float(os.getenv("KAFKA_BATCH_TIMEOUT_SECONDS", "1.0"))
+# Threads que procesan los mensajes de un lote (cada uno hace HTTP + Redis bloqueantes)
+KAFKA_WORKERS = int(os.getenv("KAFKA_WORKERS", "8"))
+# Veces que se vuelve a entregar un mensaje fallido antes de descartarlo
+KAFKA_MAX_REDELIVERIES = int(os.getenv("KAFKA_MAX_REDELIVERIES", "3"))
+KAFKA_LAG_REFRESH_SECONDS = float(os.getenv("KAFKA_LAG_REFRESH_SECONDS", "5"))
+# Espera máxima al broker al medir el lag de particiones recién asignadas
+KAFKA_LAG_QUERY_TIMEOUT_SECONDS = float(os.getenv("KAFKA_LAG_QUERY_TIMEOUT_SECONDS", "2"))
+# Ventana de compactación: los eventos se agrupan por RUT durante este tiempo
+# o hasta juntar esta cantidad de mensajes, y sólo se procesa el último de cada RUT
+KAFKA_COMPACTION_WINDOW_SECONDS = float(os.getenv("KAFKA_COMPACTION_WINDOW_SECONDS", "1.0"))
+KAFKA_COMPACTION_MAX_MESSAGES = int(os.getenv("KAFKA_COMPACTION_MAX_MESSAGES", "1000"))
 # ---
 
-# Definimos el esquema de AVRO directamente aquí para no depender del registro de esquemas
-# Esto es una versión simplificada, solo necesitamos el RUT
+# Definimos el esquema de AVRO directamente aquí para no depender del registro de esquemas.
+# Se usa como esquema de escritura de respaldo; la lectura se hace con la proyección
+# de avro_decoder.PROJECTION_SCHEMA
 VALUE_SCHEMA = """
 {
     "type": "record",
@@ -117,22 +138,39 @@ VALUE_SCHEMA = """
 }
 """
 
-KEY_SCHEMA = """
-{
-    "type": "record",
-    "name": "UpdateKey",
-    "namespace": "businesses.fct",
-    "fields": [
-        {"name": "businessId", "type": "int"}
-    ]
-}
-"""
+def event_fingerprint(data: Dict[str, Any]) -> str:
+    """
+    Hash de los campos del evento que pueden afectar los datos mensuales del negocio
+    (avro_decoder.FINGERPRINT_FIELDS); los faltantes cuentan como None.
+    """
+    relevantes = {campo: data.get(campo) for campo in FINGERPRINT_FIELDS}
+    return hashlib.sha1(json.dumps(relevantes, sort_keys=True, default=str).encode()).hexdigest()
 
 class KafkaBusinessConsumer:
-    def __init__(self):
-        """Inicializa el consumidor de Kafka para actualizaciones de negocios."""
+    def __init__(self, name: Optional[str] = None):
+        """
+        Inicializa el consumidor de Kafka para actualizaciones de negocios.
+
+        Args:
+            name: Identificador del consumidor dentro del grupo (se agrega al client.id);
+                  útil cuando corren varios consumidores en paralelo
+        """
+        self.name = name
         self.running = False
         self.consumer_thread = None
+        self.executor = None
+        self.stats = Counters(
+            "batches", "messages", "compacted", "unchanged_skipped", "refreshes",
+            "processed", "failed", "redelivered", "skipped", "commits", "commit_errors",
+            "assignments", "revocations", "lost"
+        )
+        self.lag: Dict[int, int] = {}
+        self.assigned: List[Tuple[str, int]] = []
+        self._redeliveries: Dict[Tuple[str, int, int], int] = {}
+        self._last_lag_refresh = 0.0
+        # Mensajes acumulados en la ventana de compactación actual
+        self._ventana: List = []
+        self._inicio_ventana = time.monotonic()
         self._init_consumer()
         
     def _init_consumer(self):
@@ -141,9 +179,10 @@ class KafkaBusinessConsumer:
         self.consumer_config = {
             'bootstrap.servers': BOOTSTRAP_SERVERS,
             'group.id': GROUP_ID,
-            'client.id': CLIENT_ID,
+            'client.id': f"{CLIENT_ID}-{self.name}" if self.name else CLIENT_ID,
             'auto.offset.reset': 'earliest',  # Configurable: 'earliest' o 'latest'
-            'enable.auto.commit': True  # Commit automático de offsets
+            # Los offsets se confirman a mano, sólo cuando el lote quedó escrito en caché
+            'enable.auto.commit': False
         }
         
         # Configuración para Schema Registry
@@ -154,23 +193,14 @@ class KafkaBusinessConsumer:
         try:
             # Inicializar conexión a Schema Registry para consultas
             self.schema_registry_client = SchemaRegistryClient(self.schema_registry_conf)
-            
-            # Inicializar deserializadores Avro con esquemas embebidos
-            self.value_deserializer = AvroDeserializer(
-                schema_str=VALUE_SCHEMA,
-                schema_registry_client=self.schema_registry_client
-            )
-            self.key_deserializer = AvroDeserializer(
-                schema_str=KEY_SCHEMA,
-                schema_registry_client=self.schema_registry_client
-            )
-            
-            print(f"[Kafka] Deserializadores Avro inicializados con esquemas embebidos")
         except Exception as e:
-            print(f"[Kafka] Error al inicializar schema registry o deserializadores Avro: {e}")
+            print(f"[Kafka] Error al inicializar schema registry: {e}")
             self.schema_registry_client = None
-            self.value_deserializer = None
-            self.key_deserializer = None
+        
+        # Decodificador de valores en modo proyección (esquemas de escritura cacheados por id,
+        # VALUE_SCHEMA como respaldo si el registry no está disponible)
+        self.value_decoder = BusinessEventDecoder(self.schema_registry_client, fallback_writer_schema=VALUE_SCHEMA)
+        print("[Kafka] Decodificador de eventos inicializado (modo proyección)")
         
         # Inicializar consumidor
         try:
@@ -182,139 +212,310 @@ class KafkaBusinessConsumer:
 
     def _extract_message_data(self, msg):
         """
-        Extrae datos de un mensaje de Kafka usando varias estrategias.
+        Extrae los datos de un mensaje de Kafka (Avro o JSON, según el formato detectado para el tópico).
+        """
+        return self.value_decoder.decode(msg.topic(), msg.value())
+
+    def _handle_event(self, rut: str, data: Dict[str, Any], fingerprint: str) -> bool:
+        """
+        Procesa el último evento de un RUT dentro de la ventana (corre en el pool de workers).
+        Devuelve False sólo si la actualización de caché falló y vale la pena reintentar.
         """
-        value_bytes = msg.value()
-        
-        # Imprimir primeros bytes para debug
-        if value_bytes and len(value_bytes) > 10:
-            print(f"[Kafka] Primeros bytes del mensaje: {value_bytes[:10].hex()}")
-        
-        # Estrategia 1: Usar el deserializador Avro con Schema Registry
-        if self.value_deserializer and value_bytes:
-            try:
-                # Crear el contexto de deserialización
-                ctx = SerializationContext(msg.topic(), MessageField.VALUE)
-                
-                # Intentar deserializar con Avro
-                value = self.value_deserializer(value_bytes, ctx)
-                print(f"[Kafka] Mensaje deserializado con Avro")
-                return value
-            except Exception as e:
-                print(f"[Kafka] Error en deserialización Avro: {e}")
-                # Caer a la siguiente estrategia
-        
-        # Estrategia 2: Intentar como JSON
         try:
-            # Decodificar bytes a string y parsear como JSON
-            if isinstance(value_bytes, bytes):
-                value_str = value_bytes.decode('utf-8')
-            else:
-                value_str = str(value_bytes)
-            
-            value = json.loads(value_str)
-            print(f"[Kafka] Mensaje deserializado como JSON")
-            return value
+            # Mantener el registro de negocios y actualizar la caché para este RUT
+            if is_deleted_event(data):
+                print(f"[Kafka] Negocio eliminado, quitando RUT {rut} del registro")
+                unregister_business(rut)
+                invalidate_answers(rut)
+                return True
+            register_business(rut)
+            print(f"[Kafka] Actualizando caché para RUT: {rut}")
+            if update_business_data(rut):
+                set_fingerprint(rut, fingerprint)
+                # Las respuestas del LLM se armaron con los datos anteriores
+                invalidate_answers(rut)
+                return True
+            return False
         except Exception as e:
-            print(f"[Kafka] Error al deserializar como JSON: {e}")
-        
-        # Estrategia 3: Devolver None si todo falla
-        print(f"[Kafka] No se pudo extraer datos del mensaje, devolviendo None")
-        return None
+            print(f"[Kafka] Error al procesar evento de RUT {rut}: {e}")
+            return False
 
-    def _handle_message(self, msg):
-        """Procesa un mensaje recibido de Kafka."""
-        try:
-            # Extraer datos usando las estrategias de deserialización
+    def _compact(self, msgs: List) -> Dict[str, Tuple[Any, Dict[str, Any]]]:
+        """
+        Decodifica los mensajes de la ventana y se queda con el último evento por RUT.
+        Devuelve RUT -> (mensaje, datos).
+        """
+        latest: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+        for msg in msgs:
             data = self._extract_message_data(msg)
-            
-            # Si tenemos datos, procesarlos
-            if data:
-                # Extraer el RUT del negocio
-                rut = data.get('rut')
-                business_id = data.get('businessId')
-                action_type = data.get('actionType')
-                
-                print(f"[Kafka] Recibido: Business ID: {business_id}, RUT: {rut}, Action: {action_type}")
-                
-                # Actualizar la caché para este RUT
-                if rut:
-                    print(f"[Kafka] Actualizando caché para RUT: {rut}")
-                    update_business_data(rut)
+            if not data:
+                print(f"[Kafka] No se pudo extraer datos del mensaje {msg.partition()}:{msg.offset()}")
+                continue
+            rut = data.get('rut')
+            if not rut:
+                print(f"[Kafka] Mensaje recibido sin RUT válido: {data.get('businessId')}")
+                continue
+            if rut in latest:
+                self.stats.incr("compacted")
+            # Dentro de una partición los mensajes llegan en orden: el último gana
+            latest[rut] = (msg, data)
+        return latest
+
+    def _process_batch(self, msgs: List) -> None:
+        """
+        Procesa una ventana de mensajes y confirma los offsets cuando terminó.
+
+        Los eventos se compactan por RUT (sólo cuenta el último) y se descartan los
+        que no cambian nada relevante para los totales mensuales (comparando su
+        fingerprint con el del último refresco). El resto se refresca en el pool de
+        workers. Si un refresco falló, se confirma hasta justo antes de ese mensaje
+        y se hace seek para que se vuelva a entregar (junto con los posteriores).
+        """
+        validos = []
+        for msg in msgs:
+            if msg.error():
+                if msg.error().code() == KafkaError._PARTITION_EOF:
+                    print(f"[Kafka] Reached end of partition {msg.partition()}")
                 else:
-                    print(f"[Kafka] Mensaje recibido sin RUT válido: {data}")
+                    print(f"[Kafka] Error: {msg.error()}")
+                continue
+            validos.append(msg)
+        if not validos:
+            return
+
+        self.stats.incr("batches")
+        self.stats.incr("messages", len(validos))
+
+        latest = self._compact(validos)
+        fingerprints = {rut: event_fingerprint(data) for rut, (_, data) in latest.items()}
+        stored = get_fingerprints(list(latest))
+
+        futures = []
+        for rut, (msg, data) in latest.items():
+            if not is_deleted_event(data) and stored.get(rut) == fingerprints[rut]:
+                self.stats.incr("unchanged_skipped")
+                continue
+            self.stats.incr("refreshes")
+            futures.append((self.executor.submit(self._handle_event, rut, data, fingerprints[rut]), msg))
+
+        last_offsets: Dict[Tuple[str, int], int] = {}
+        for msg in validos:
+            tp = (msg.topic(), msg.partition())
+            last_offsets[tp] = max(last_offsets.get(tp, -1), msg.offset())
+
+        failed_offsets: Dict[Tuple[str, int], int] = {}
+        for future, msg in futures:
+            tp = (msg.topic(), msg.partition())
+            key = (msg.topic(), msg.partition(), msg.offset())
+            if future.result():
+                self.stats.incr("processed")
+                self._redeliveries.pop(key, None)
+                continue
+            self.stats.incr("failed")
+            attempts = self._redeliveries.get(key, 0) + 1
+            if attempts > KAFKA_MAX_REDELIVERIES:
+                print(f"[Kafka] Descartando mensaje {key} tras {KAFKA_MAX_REDELIVERIES} reintentos")
+                self.stats.incr("skipped")
+                self._redeliveries.pop(key, None)
+                continue
+            self._redeliveries[key] = attempts
+            failed_offsets[tp] = min(failed_offsets.get(tp, msg.offset()), msg.offset())
+
+        offsets = []
+        for (topic, partition), last_offset in last_offsets.items():
+            if (topic, partition) in failed_offsets:
+                retry_offset = failed_offsets[(topic, partition)]
+                self.stats.incr("redelivered")
+                self.consumer.seek(TopicPartition(topic, partition, retry_offset))
+                offsets.append(TopicPartition(topic, partition, retry_offset))
             else:
-                print(f"[Kafka] No se pudo extraer datos del mensaje")
-        
-        except Exception as e:
-            print(f"[Kafka] Error al procesar mensaje: {e}")
-            # Imprimir el mensaje raw para debug si hay error
-            value_bytes = msg.value()
-            if value_bytes:
-                print(f"[Kafka] Mensaje raw (hex): {value_bytes[:50].hex() if len(value_bytes) > 50 else value_bytes.hex()}")
+                offsets.append(TopicPartition(topic, partition, last_offset + 1))
+
+        try:
+            self.consumer.commit(offsets=offsets, asynchronous=False)
+            self.stats.incr("commits")
+        except KafkaException as e:
+            print(f"[Kafka] Error al confirmar offsets: {e}")
+            self.stats.incr("commit_errors")
+
+    def _flush_window(self) -> None:
+        """Procesa la ventana acumulada (si hay) y empieza una nueva."""
+        ventana, self._ventana = self._ventana, []
+        self._inicio_ventana = time.monotonic()
+        if ventana:
+            self._process_batch(ventana)
+
+    def _on_assign(self, consumer, partitions) -> None:
+        """Callback de rebalanceo: el grupo le asignó particiones a este consumidor."""
+        self.stats.incr("assignments")
+        self.assigned = sorted(set(self.assigned) | {(tp.topic, tp.partition) for tp in partitions})
+        print(f"[Kafka] {self.name or 'consumidor'}: particiones asignadas {[tp.partition for tp in partitions]}")
+        # Durante el callback consumer.assignment() todavía no incluye las particiones nuevas
+        self._refresh_lag(partitions=partitions)
+
+    def _forget_partitions(self, partitions) -> None:
+        """Olvida el estado local (reintentos, lag, asignación) de particiones que ya no son nuestras."""
+        perdidas = {(tp.topic, tp.partition) for tp in partitions}
+        self._redeliveries = {k: v for k, v in self._redeliveries.items() if (k[0], k[1]) not in perdidas}
+        self.lag = {p: l for p, l in self.lag.items() if (TOPIC, p) not in perdidas}
+        self.assigned = [tp for tp in self.assigned if tp not in perdidas]
+
+    def _on_revoke(self, consumer, partitions) -> None:
+        """
+        Callback de rebalanceo: el grupo va a quitarle particiones a este consumidor.
+
+        Mientras dura el callback las particiones siguen siendo nuestras, así que se
+        termina de procesar la ventana en curso y se confirman sus offsets; el nuevo
+        dueño retoma justo después, sin volver a refrescar lo que ya se hizo.
+        """
+        self.stats.incr("revocations")
+        print(f"[Kafka] {self.name or 'consumidor'}: revocando particiones {[tp.partition for tp in partitions]}, "
+              f"procesando {len(self._ventana)} mensajes en curso")
+        self._flush_window()
+        self._forget_partitions(partitions)
+
+    def _on_lost(self, consumer, partitions) -> None:
+        """
+        Callback de rebalanceo: las particiones se perdieron (p. ej. sesión expirada) y
+        ya no se pueden confirmar offsets. Se descartan sus mensajes de la ventana;
+        el nuevo dueño los volverá a procesar.
+        """
+        self.stats.incr("lost")
+        perdidas = {(tp.topic, tp.partition) for tp in partitions}
+        print(f"[Kafka] {self.name or 'consumidor'}: particiones perdidas {[tp.partition for tp in partitions]}")
+        self._ventana = [m for m in self._ventana if (m.topic(), m.partition()) not in perdidas]
+        self._forget_partitions(partitions)
+
+    def _refresh_lag(self, partitions: Optional[List[TopicPartition]] = None) -> None:
+        """
+        Actualiza el lag por partición (high watermark - posición del consumidor).
+        Con `partitions` (recién asignadas, todavía sin posición ni watermarks en caché)
+        se mide sólo esas contra el offset confirmado del grupo, consultando al broker.
+        """
+        now = time.monotonic()
+        if partitions is None and now - self._last_lag_refresh < KAFKA_LAG_REFRESH_SECONDS:
+            return
+        self._last_lag_refresh = now
+        try:
+            if partitions is None:
+                lag = {}
+                offsets = self.consumer.position(self.consumer.assignment())
+            else:
+                lag = dict(self.lag)
+                offsets = self.consumer.committed(partitions, timeout=KAFKA_LAG_QUERY_TIMEOUT_SECONDS)
+            for tp in offsets:
+                if partitions is None:
+                    _, high = self.consumer.get_watermark_offsets(tp, cached=True)
+                else:
+                    _, high = self.consumer.get_watermark_offsets(tp, timeout=KAFKA_LAG_QUERY_TIMEOUT_SECONDS)
+                if tp.offset >= 0 and high >= 0:
+                    lag[tp.partition] = max(high - tp.offset, 0)
+            self.lag = lag
+        except KafkaException as e:
+            print(f"[Kafka] Error al calcular el lag: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Contadores del consumidor y lag por partición."""
+        metrics = self.stats.snapshot()
+        metrics["lag"] = dict(self.lag)
+        metrics["total_lag"] = sum(self.lag.values())
+        metrics["decoder"] = self.value_decoder.stats.snapshot()
+        metrics["assigned_partitions"] = [partition for _, partition in self.assigned]
+        return metrics
 
     def _consume_loop(self):
-        """Loop principal del consumidor que corre en un thread separado."""
+        """Loop principal del consumidor (corre en un thread separado o, con run(), en el actual)."""
         if not self.consumer:
             print("[Kafka] No se puede iniciar el consumo: consumidor no inicializado")
             return
             
         try:
-            # Suscribirse al tópico
-            self.consumer.subscribe([TOPIC])
+            # Suscribirse al tópico; los callbacks procesan la ventana en curso antes
+            # de ceder particiones en un rebalanceo
+            self.consumer.subscribe(
+                [TOPIC], on_assign=self._on_assign, on_revoke=self._on_revoke, on_lost=self._on_lost
+            )
             
-            print(f"[Kafka] Consumidor iniciado y suscrito a {TOPIC}")
+            print(f"[Kafka] Consumidor {self.name or ''} iniciado y suscrito a {TOPIC}")
             
-            # Loop principal de consumo
+            # Loop principal de consumo: se acumulan mensajes durante una ventana de
+            # tiempo/tamaño y se procesan juntos para compactar los eventos por RUT
+            self._ventana = []
+            self._inicio_ventana = time.monotonic()
             while self.running:
-                # Poll para nuevos mensajes
-                msg = self.consumer.poll(timeout=1.0)
-                
-                # No hay mensaje nuevo
-                if msg is None:
-                    continue
-                
-                # Error en Kafka
-                if msg.error():
-                    if msg.error().code() == KafkaError._PARTITION_EOF:
-                        print(f"[Kafka] Reached end of partition {msg.partition()}")
-                    else:
-                        print(f"[Kafka] Error: {msg.error()}")
-                    continue
+                restante = KAFKA_COMPACTION_WINDOW_SECONDS - (time.monotonic() - self._inicio_ventana)
+                msgs = self.consumer.consume(
+                    num_messages=KAFKA_BATCH_SIZE,
+                    timeout=max(min(restante, KAFKA_BATCH_TIMEOUT_SECONDS), 0.0)
+                )
+                if msgs:
+                    self._ventana.extend(msgs)
                 
-                # Procesar el mensaje válido
-                self._handle_message(msg)
+                # Procesar la ventana y confirmar sus offsets
+                if (len(self._ventana) >= KAFKA_COMPACTION_MAX_MESSAGES or
+                        time.monotonic() - self._inicio_ventana >= KAFKA_COMPACTION_WINDOW_SECONDS):
+                    self._flush_window()
+                self._refresh_lag()
+
+            # Apagado ordenado: terminar la ventana en curso antes de dejar el grupo
+            if self._ventana:
+                print(f"[Kafka] Procesando {len(self._ventana)} mensajes pendientes antes de cerrar")
+                self._flush_window()
                 
         except KafkaException as e:
             print(f"[Kafka] Error en el consumidor: {e}")
         except Exception as e:
             print(f"[Kafka] Error inesperado en el loop del consumidor: {e}")
         finally:
-            # Cerrar el consumidor al salir del loop
+            # Cerrar el consumidor al salir del loop (deja el grupo y dispara el rebalanceo)
             try:
                 self.consumer.close()
                 print("[Kafka] Consumidor cerrado correctamente")
             except:
                 print("[Kafka] Error al cerrar el consumidor")
 
+    def _consume_then_shutdown(self):
+        """
+        Consume hasta que se llame a stop() y recién entonces apaga el pool de workers:
+        la última ventana (y la de un rebalanceo al cerrar) se procesa con el pool vivo.
+        """
+        try:
+            self._consume_loop()
+        finally:
+            self.running = False
+            self.executor.shutdown(wait=True)
+
+    def run(self):
+        """Consume en el thread actual hasta que se llame a stop() (para procesos dedicados)."""
+        if self.running:
+            return
+        self.running = True
+        self.executor = ThreadPoolExecutor(max_workers=KAFKA_WORKERS, thread_name_prefix="kafka-worker")
+        self._consume_then_shutdown()
+
     def start(self):
         """Inicia el consumidor de Kafka en un thread separado."""
         if not self.running:
             self.running = True
-            self.consumer_thread = threading.Thread(target=self._consume_loop)
+            self.executor = ThreadPoolExecutor(max_workers=KAFKA_WORKERS, thread_name_prefix="kafka-worker")
+            self.consumer_thread = threading.Thread(target=self._consume_then_shutdown, name=f"kafka-consumer-{self.name or 0}")
             self.consumer_thread.daemon = True  # El thread se cerrará cuando el programa principal termine
             self.consumer_thread.start()
             print("[Kafka] Thread del consumidor iniciado")
             return True
         return False
 
-    def stop(self):
-        """Detiene el consumidor de Kafka."""
-        if self.running:
+    def stop(self, timeout: float = 5.0):
+        """
+        Detiene el consumidor de Kafka (espera hasta `timeout` a que termine la ventana en curso).
+        El pool de workers lo apaga el propio thread después de procesar la última ventana.
+        """
+        thread_vivo = self.consumer_thread is not None and self.consumer_thread.is_alive()
+        if self.running or thread_vivo:
             self.running = False
             # Si hay un thread corriendo, esperar a que termine
             if self.consumer_thread and self.consumer_thread.is_alive():
-                self.consumer_thread.join(timeout=5.0)
+                self.consumer_thread.join(timeout=timeout)
             print("[Kafka] Consumidor detenido")
             return True
         return False
@@ -334,6 +535,12 @@ def start_kafka_consumer():
     consumer = get_kafka_consumer()
     return consumer.start()
 
+def get_kafka_consumer_metrics():
+    """Métricas del consumidor de Kafka (None si no está corriendo en este proceso)."""
+    if kafka_consumer:
+        return kafka_consumer.get_metrics()
+    return None
+
 def stop_kafka_consumer():
     """Detiene el consumidor de Kafka."""
     if kafka_consumer:
@@ -0,0 +1,292 @@
+# Router de generaciones entre varios hosts de Ollama (OLLAMA_HOSTS), con OpenAI
+# como nivel de desborde opcional. Reparte por menor cantidad de requests en curso,
+# saca de rotación a los hosts que fallan (circuit breaker) y los vuelve a probar
+# con health checks periódicos.
+import os
+import time
+import random
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+
+from .http_client import get_async_http_client
+from .llm_scheduler import PRIORITY_INTERACTIVE, get_llm_scheduler
+from .metrics import Counters
+from .ollama import get_ollama_hosts, generar_async, generar_con_contexto, generar_stream
+from .openai_client import consultar_openai_async, consultar_openai_stream
+
+# --- Configuración ---
+# Fallos consecutivos que abren el circuito de un host, y cuánto queda fuera de rotación
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+LLM_HEALTH_CHECK_SECONDS = float(os.getenv("LLM_HEALTH_CHECK_SECONDS", "10"))
+LLM_HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("LLM_HEALTH_CHECK_TIMEOUT_SECONDS", "2"))
+# Desborde a OpenAI cuando no hay hosts de Ollama sanos o la cola local es muy profunda
+LLM_OVERFLOW_OPENAI = os.getenv("LLM_OVERFLOW_OPENAI", "false").lower() in ("1", "true", "yes")
+LLM_OVERFLOW_QUEUE_DEPTH = int(os.getenv("LLM_OVERFLOW_QUEUE_DEPTH", "8"))
+# ---
+
+ERROR_SIN_HOSTS = "Error: No hay hosts de Ollama disponibles. Reintenta en unos segundos."
+
+T = TypeVar("T")
+
+class NoEndpointError(Exception):
+    """Ningún host de Ollama está disponible o todos fallaron."""
+
+class CircuitBreaker:
+    """
+    Circuit breaker por conteo de fallos consecutivos.
+    Abierto: el host no recibe tráfico hasta `reset_seconds` después del último fallo;
+    pasado ese tiempo queda medio abierto y el próximo resultado decide si se cierra.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allows_request(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+class OllamaEndpoint:
+    """Un host de Ollama con su cantidad de requests en curso y su circuit breaker."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.breaker = CircuitBreaker()
+        self.stats = Counters("requests", "failures", "health_checks_failed")
+
+    def snapshot(self) -> Dict:
+        stats = self.stats.snapshot()
+        stats.update({"outstanding": self.outstanding, "circuit": self.breaker.state})
+        return stats
+
+class LLMRouter:
+    """Elige host de Ollama por menor carga y reintenta en otro host si uno falla."""
+
+    def __init__(self, hosts: List[str], overflow_openai: bool = LLM_OVERFLOW_OPENAI):
+        self.endpoints = [OllamaEndpoint(url) for url in hosts]
+        self.overflow_openai = overflow_openai
+        self.stats = Counters("overflow_openai", "failovers", "no_endpoint")
+        self._health_task: Optional[asyncio.Task] = None
+
+    def available(self) -> List[OllamaEndpoint]:
+        return [e for e in self.endpoints if e.breaker.allows_request()]
+
+    def _pick(self, excluded: List[OllamaEndpoint]) -> Optional[OllamaEndpoint]:
+        """Host disponible con menos requests en curso (desempate aleatorio)."""
+        candidatos = [e for e in self.available() if e not in excluded]
+        if not candidatos:
+            return None
+        menor = min(e.outstanding for e in candidatos)
+        return random.choice([e for e in candidatos if e.outstanding == menor])
+
+    def pick_host(self) -> Optional[str]:
+        """
+        URL del host disponible menos cargado, para llamadas auxiliares que no pasan por
+        el failover ni afectan el circuit breaker (embeddings). None si no hay hosts sanos.
+        """
+        endpoint = self._pick([])
+        return endpoint.url if endpoint is not None else None
+
+    def should_overflow(self, queue_depth: int) -> bool:
+        """True si conviene mandar la generación a OpenAI en lugar de encolarla localmente."""
+        if not self.overflow_openai:
+            return False
+        return not self.available() or queue_depth >= LLM_OVERFLOW_QUEUE_DEPTH
+
+    def _record(self, endpoint: OllamaEndpoint, ok: bool) -> None:
+        if ok:
+            endpoint.breaker.record_success()
+            return
+        endpoint.stats.incr("failures")
+        endpoint.breaker.record_failure()
+        if not endpoint.breaker.allows_request():
+            print(f"[LLM Router] Circuito abierto para {endpoint.url} tras {endpoint.breaker.failures} fallos")
+
+    def _preferido(self, url: Optional[str]) -> Optional[OllamaEndpoint]:
+        for endpoint in self.endpoints:
+            if endpoint.url == url and endpoint.breaker.allows_request():
+                return endpoint
+        return None
+
+    async def _with_failover(self, call: Callable[[str], Awaitable[T]], preferred: Optional[str] = None) -> Tuple[T, str]:
+        """
+        Ejecuta `call(host)` en `preferred` (si está disponible) o en el host menos cargado;
+        si falla, prueba los demás. Devuelve (resultado, host). Lanza NoEndpointError
+        si ningún host respondió.
+        """
+        intentados: List[OllamaEndpoint] = []
+        while True:
+            endpoint = (self._preferido(preferred) if not intentados else None) or self._pick(intentados)
+            if endpoint is None:
+                self.stats.incr("no_endpoint")
+                raise NoEndpointError(ERROR_SIN_HOSTS)
+            if intentados:
+                self.stats.incr("failovers")
+            intentados.append(endpoint)
+            endpoint.outstanding += 1
+            endpoint.stats.incr("requests")
+            try:
+                result = await call(endpoint.url)
+                self._record(endpoint, True)
+                return result, endpoint.url
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"[LLM Router] Error en {endpoint.url}: {e}")
+                self._record(endpoint, False)
+            finally:
+                endpoint.outstanding -= 1
+
+    async def generate(self, prompt: str, priority: int = PRIORITY_INTERACTIVE) -> Tuple[str, str]:
+        """
+        Genera la respuesta en el host menos cargado, con un cupo del scheduler de Ollama;
+        si falla, prueba los demás. Si ninguno responde y el desborde está activo, el cupo
+        de Ollama se devuelve antes de tomar uno del scheduler de OpenAI: la cola de
+        Ollama no queda ocupada mientras responde OpenAI.
+        Devuelve (respuesta, backend): backend es "openai" si la generación se desbordó
+        a OpenAI, así quien llama no la guarda como respuesta de Ollama.
+        Lanza LLMSaturatedError si el scheduler que corresponde está saturado.
+        """
+        try:
+            async with get_llm_scheduler("ollama").slot(priority):
+                respuesta, _ = await self._with_failover(lambda host: generar_async(prompt, host))
+            return respuesta, "ollama"
+        except NoEndpointError:
+            if not self.overflow_openai:
+                return ERROR_SIN_HOSTS, "ollama"
+        self.stats.incr("overflow_openai")
+        async with get_llm_scheduler("openai").slot(priority):
+            return await consultar_openai_async(prompt), "openai"
+
+    async def generate_with_context(
+        self,
+        prompt: str,
+        context: Optional[List[int]] = None,
+        preferred_host: Optional[str] = None,
+        keep_alive: Optional[str] = None
+    ) -> Tuple[Dict, str]:
+        """
+        Genera continuando una conversación de Ollama (ver ollama.generar_con_contexto),
+        preferentemente en el host que ya tiene el prefijo en caché. Devuelve
+        (respuesta JSON de Ollama, host). Lanza NoEndpointError si no hay hosts.
+        """
+        return await self._with_failover(
+            lambda host: generar_con_contexto(prompt, host, context, keep_alive), preferred_host
+        )
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Variante en streaming de generate(). Sólo se cambia de host si el fallo ocurre
+        antes del primer token; después, el error se entrega como texto.
+        """
+        intentados: List[OllamaEndpoint] = []
+        while True:
+            endpoint = self._pick(intentados)
+            if endpoint is None:
+                break
+            if intentados:
+                self.stats.incr("failovers")
+            intentados.append(endpoint)
+            endpoint.outstanding += 1
+            endpoint.stats.incr("requests")
+            tokens = generar_stream(prompt, endpoint.url)
+            emitidos = 0
+            try:
+                async for token in tokens:
+                    emitidos += 1
+                    yield token
+                self._record(endpoint, True)
+                return
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"[LLM Router] Error en stream de {endpoint.url}: {e}")
+                self._record(endpoint, False)
+                if emitidos:
+                    yield "Hubo un error inesperado al comunicarse con Ollama."
+                    return
+            finally:
+                endpoint.outstanding -= 1
+                await tokens.aclose()
+
+        if self.overflow_openai:
+            self.stats.incr("overflow_openai")
+            tokens = consultar_openai_stream(prompt)
+            try:
+                async for token in tokens:
+                    yield token
+            finally:
+                await tokens.aclose()
+            return
+        self.stats.incr("no_endpoint")
+        yield ERROR_SIN_HOSTS
+
+    async def _check(self, endpoint: OllamaEndpoint) -> None:
+        try:
+            response = await get_async_http_client().get(
+                f"{endpoint.url}/api/tags", timeout=LLM_HEALTH_CHECK_TIMEOUT_SECONDS
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            endpoint.stats.incr("health_checks_failed")
+            if endpoint.breaker.allows_request():
+                print(f"[LLM Router] Health check fallido para {endpoint.url}: {e}")
+            self._record(endpoint, False)
+            return
+        # Sólo un circuito abierto o medio abierto se cierra por un health check: con el
+        # circuito cerrado, que /api/tags responda no borra los fallos de generación
+        if endpoint.breaker.state != "closed":
+            print(f"[LLM Router] {endpoint.url} volvió a responder, reincorporado")
+            self._record(endpoint, True)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self._check(e) for e in self.endpoints))
+            await asyncio.sleep(LLM_HEALTH_CHECK_SECONDS)
+
+    def start_health_checks(self) -> None:
+        """Inicia los health checks periódicos (llamar desde el event loop de la aplicación)."""
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def stop_health_checks(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def snapshot(self) -> Dict:
+        stats = self.stats.snapshot()
+        stats["endpoints"] = {e.url: e.snapshot() for e in self.endpoints}
+        stats["overflow_enabled"] = self.overflow_openai
+        return stats
+
+_router: Optional[LLMRouter] = None
+
+def get_llm_router() -> LLMRouter:
+    """Devuelve el router compartido del proceso (hosts según OLLAMA_HOSTS / OLLAMA_HOST)."""
+    global _router
+    if _router is None:
+        _router = LLMRouter(get_ollama_hosts())
+    return _router
@@ -0,0 +1,202 @@
+# Scheduler de generaciones LLM: limita cuántas generaciones corren a la vez contra
+# cada backend (Ollama, OpenAI), encola las demás en una cola acotada con prioridades
+# (interactivas antes que batch) y rechaza rápido cuando está saturado, en lugar de
+# dejar que el backend encole sin límite y los requests terminen en timeout.
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from .metrics import Counters
+from .ollama import get_ollama_hosts
+
+# --- Configuración ---
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+
+# Generaciones simultáneas por backend (Ollama suele atender pocas a la vez;
+# el límite de Ollama es por host y se multiplica por la cantidad de OLLAMA_HOSTS)
+LLM_MAX_IN_FLIGHT = {
+    "ollama": int(os.getenv("LLM_MAX_IN_FLIGHT_OLLAMA", "2")) * len(get_ollama_hosts()),
+    "openai": int(os.getenv("LLM_MAX_IN_FLIGHT_OPENAI", "16")),
+}
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+# Parte de la cola que pueden ocupar los requests batch (el resto queda para interactivos)
+LLM_BATCH_QUEUE_SHARE = float(os.getenv("LLM_BATCH_QUEUE_SHARE", "0.5"))
+# Espera máxima en cola antes de rechazar
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+# Duración estimada de una generación mientras no hay mediciones (para Retry-After)
+LLM_ESTIMATED_GENERATION_SECONDS = float(os.getenv("LLM_ESTIMATED_GENERATION_SECONDS", "10"))
+# ---
+
+class LLMSaturatedError(Exception):
+    """El scheduler no puede aceptar la generación: la cola está llena o la espera se agotó."""
+
+    def __init__(self, message: str, retry_after: int, status_code: int = 503):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+class LLMScheduler:
+    """
+    Limita a `max_in_flight` las generaciones simultáneas de un backend.
+
+    Las que no entran esperan en una cola de prioridad acotada a `max_queue`
+    (FIFO dentro de cada prioridad). Si la cola está llena se rechaza de inmediato
+    con un Retry-After estimado a partir de la duración media de las generaciones.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        max_queue: int = LLM_MAX_QUEUE,
+        batch_queue_share: float = LLM_BATCH_QUEUE_SHARE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.max_batch_queue = int(max_queue * batch_queue_share)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued = {priority: 0 for priority in PRIORITIES.values()}
+        self._seq = itertools.count()
+        self._avg_generation = LLM_ESTIMATED_GENERATION_SECONDS
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self.stats = Counters("admitted", "queued", "rejected", "timeouts", "completed")
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._queued.values())
+
+    def _retry_after(self) -> int:
+        """Segundos estimados hasta que se libere lugar para un request nuevo."""
+        rondas = (self.queue_depth + 1) / self.max_in_flight
+        return max(1, math.ceil(rondas * self._avg_generation))
+
+    def _reject(self, motivo: str, status_code: int) -> LLMSaturatedError:
+        self.stats.incr("rejected")
+        return LLMSaturatedError(f"[LLM Scheduler {self.name}] {motivo}", self._retry_after(), status_code)
+
+    async def _acquire(self, priority: int) -> None:
+        if self.in_flight < self.max_in_flight and not self._queue:
+            self.in_flight += 1
+            return
+        if self.queue_depth >= self.max_queue:
+            raise self._reject("cola llena", 503)
+        if priority == PRIORITY_BATCH and self._queued[PRIORITY_BATCH] >= self.max_batch_queue:
+            raise self._reject("cola batch llena", 429)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._queue, entry)
+        self._queued[priority] += 1
+        self.stats.incr("queued")
+        try:
+            # Al despertar, quien liberó el lugar ya nos transfirió su cupo en in_flight
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # El cupo llegó justo al mismo tiempo: devolverlo
+                self._handoff()
+            else:
+                future.cancel()
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._queued[priority] -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats.incr("timeouts")
+                raise self._reject(f"sin lugar tras {self.queue_timeout}s en cola", 503) from None
+            raise
+
+    def _handoff(self) -> None:
+        """Libera un cupo: se lo pasa directamente al siguiente de la cola, si hay."""
+        while self._queue:
+            priority, _, future = heapq.heappop(self._queue)
+            self._queued[priority] -= 1
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _record_wait(self, waited: float) -> None:
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def _record_generation(self, elapsed: float) -> None:
+        # Media móvil exponencial de la duración de las generaciones
+        self._avg_generation = 0.8 * self._avg_generation + 0.2 * elapsed
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """
+        Espera un cupo de generación. Lanza LLMSaturatedError si no se consigue.
+        Devuelve el instante en que empezó la generación, que se le pasa a release().
+        """
+        queued_at = time.monotonic()
+        await self._acquire(priority)
+        started_at = time.monotonic()
+        self._record_wait(started_at - queued_at)
+        self.stats.incr("admitted")
+        return started_at
+
+    def release(self, started_at: float) -> None:
+        """Devuelve el cupo tomado con acquire()."""
+        self._record_generation(time.monotonic() - started_at)
+        self.stats.incr("completed")
+        self._handoff()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        """Reserva un cupo de generación mientras dura el bloque."""
+        started_at = await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(started_at)
+
+    def snapshot(self) -> Dict:
+        stats = self.stats.snapshot()
+        admitted = stats["admitted"]
+        stats.update({
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queue_depth,
+            "queued_by_priority": {name: self._queued[p] for name, p in PRIORITIES.items()},
+            "max_queue": self.max_queue,
+            "avg_wait_ms": round(1000 * self._wait_total / admitted, 1) if admitted else 0.0,
+            "max_wait_ms": round(1000 * self._wait_max, 1),
+            "avg_generation_seconds": round(self._avg_generation, 2),
+        })
+        return stats
+
+# Un scheduler por backend; se crean de forma perezosa dentro del event loop de la aplicación
+_schedulers: Dict[str, LLMScheduler] = {}
+
+def get_llm_scheduler(backend: str) -> LLMScheduler:
+    """Devuelve el scheduler del backend ('ollama' u 'openai')."""
+    scheduler = _schedulers.get(backend)
+    if scheduler is None:
+        scheduler = LLMScheduler(backend, LLM_MAX_IN_FLIGHT.get(backend, 4))
+        _schedulers[backend] = scheduler
+    return scheduler
+
+def parse_priority(value: Any) -> int:
+    """
+    Convierte 'interactive' / 'batch' a la prioridad correspondiente. Cualquier otro
+    valor (incluidos números o listas en el body) usa la prioridad interactiva.
+    """
+    if not isinstance(value, str):
+        return PRIORITY_INTERACTIVE
+    return PRIORITIES.get(value.lower(), PRIORITY_INTERACTIVE)
+
+def get_llm_scheduler_stats() -> Dict:
+    """Métricas de todos los schedulers creados en este proceso."""
+    return {name: scheduler.snapshot() for name, scheduler in _schedulers.items()}
@@ -0,0 +1,275 @@
+# Caché de datos mensuales de negocios (payload `total_last_months` de monthly_sales).
+# Este módulo es el único dueño del esquema de claves, el TTL y la serialización:
+# lo usan tanto /preguntar (services.monthly_data) como los actualizadores
+# (cache_updater / Kafka), así lo que precalientan los actualizadores es lo que se sirve.
+import os
+import json
+import time
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from .metrics import Counters
+from .local_cache import LocalTTLCache
+from .monthly_frame import MonthlyFrame
+from .redis_client import get_redis_client, get_async_redis_client
+
+# --- Política de caché ---
+MONTHLY_CACHE_PREFIX = "business:monthly:"
+# Los actualizadores (Kafka y admin) refrescan la caché, por lo que el TTL
+# sólo acota cuánto puede vivir un dato que nadie refrescó.
+MONTHLY_CACHE_TTL_SECONDS = int(os.getenv("MONTHLY_CACHE_TTL_SECONDS", str(60 * 60 * 24)))
+# Pasada esta ventana el dato se considera vencido: se sigue sirviendo
+# (stale-while-revalidate) mientras un único refresco corre en background.
+MONTHLY_CACHE_FRESH_SECONDS = int(os.getenv("MONTHLY_CACHE_FRESH_SECONDS", str(60 * 15)))
+# L1 en memoria delante de Redis (0 en cualquiera de los dos lo desactiva).
+# El TTL del L1 es sólo una red de seguridad: la invalidación llega por pub/sub.
+MONTHLY_L1_MAX_ENTRIES = int(os.getenv("MONTHLY_L1_MAX_ENTRIES", "1024"))
+MONTHLY_L1_TTL_SECONDS = float(os.getenv("MONTHLY_L1_TTL_SECONDS", "300"))
+# Canal pub/sub por el que se avisa a todos los workers que un RUT cambió
+MONTHLY_INVALIDATION_CHANNEL = "business:monthly:invalidate"
+# ---
+
+_stats = Counters("hits", "misses", "writes", "errors", "l1_hits", "l1_misses", "invalidations")
+_l1 = LocalTTLCache(MONTHLY_L1_MAX_ENTRIES, MONTHLY_L1_TTL_SECONDS)
+
+class MonthlyCacheEntry(NamedTuple):
+    """
+    Entrada de la caché mensual: los meses, el momento (epoch) en que se obtuvieron de
+    la API y su MonthlyFrame, armado una vez al leer de Redis y reutilizado en los hits del L1.
+    """
+    data: List[Dict]
+    fetched_at: float
+    frame: MonthlyFrame
+
+    @property
+    def is_stale(self) -> bool:
+        """True si pasó la ventana de frescura; el dato aún se puede servir mientras se refresca."""
+        return time.time() - self.fetched_at > MONTHLY_CACHE_FRESH_SECONDS
+
+def get_monthly_cache_key(rut: str) -> str:
+    """Construye la clave estandarizada de la caché mensual para un RUT."""
+    return f"{MONTHLY_CACHE_PREFIX}{rut}"
+
+def get_monthly_lock_key(rut: str) -> str:
+    """Clave del lock distribuido que coordina el refresco de un RUT entre workers."""
+    return f"lock:{MONTHLY_CACHE_PREFIX}{rut}"
+
+def _serializar(data: List[Dict]) -> str:
+    return json.dumps({"fetched_at": time.time(), "data": data})
+
+def _deserializar(raw: str) -> MonthlyCacheEntry:
+    value = json.loads(raw)
+    if isinstance(value, list):
+        # Formato anterior (sólo la lista de meses): se trata como vencido
+        return MonthlyCacheEntry(value, 0.0, MonthlyFrame.from_api(value))
+    return MonthlyCacheEntry(value["data"], value.get("fetched_at", 0.0), MonthlyFrame.from_api(value["data"]))
+
+def _get_l1(rut: str) -> Optional[MonthlyCacheEntry]:
+    entry = _l1.get(rut)
+    _stats.incr("l1_hits" if entry is not None else "l1_misses")
+    return entry
+
+def _procesar_raw(rut: str, raw: Optional[str]) -> Optional[MonthlyCacheEntry]:
+    if raw is None:
+        _stats.incr("misses")
+        return None
+    _stats.incr("hits")
+    entry = _deserializar(raw)
+    _l1.set(rut, entry)
+    return entry
+
+def get_monthly_cache_entry(rut: str) -> Optional[MonthlyCacheEntry]:
+    """
+    Lee la entrada de la caché mensual de un RUT (primero L1, luego Redis).
+
+    Args:
+        rut: RUT del cliente
+
+    Returns:
+        MonthlyCacheEntry o None si no está en caché (o Redis falló).
+        Los datos y el frame pueden estar compartidos con el L1: no deben mutarse.
+    """
+    cached = _get_l1(rut)
+    if cached is not None:
+        return cached
+    try:
+        raw = get_redis_client().get(get_monthly_cache_key(rut))
+    except Exception as e:
+        print(f"[Monthly Cache] Error al leer RUT {rut}: {e}")
+        _stats.incr("errors")
+        return None
+    return _procesar_raw(rut, raw)
+
+def set_monthly_cache(rut: str, data: List[Dict]) -> bool:
+    """
+    Guarda los datos mensuales de un RUT en la caché con el TTL estándar
+    y avisa a los demás workers para que invaliden su L1.
+
+    Args:
+        rut: RUT del cliente
+        data: Lista de meses tal como la devuelve la API
+
+    Returns:
+        True si se guardó correctamente
+    """
+    try:
+        client = get_redis_client()
+        client.set(get_monthly_cache_key(rut), _serializar(data), ex=MONTHLY_CACHE_TTL_SECONDS)
+        client.publish(MONTHLY_INVALIDATION_CHANNEL, rut)
+    except Exception as e:
+        print(f"[Monthly Cache] Error al guardar RUT {rut}: {e}")
+        _stats.incr("errors")
+        return False
+    _l1.delete(rut)
+    _stats.incr("writes")
+    return True
+
+def delete_monthly_cache(rut: str) -> bool:
+    """Elimina la entrada de un RUT y avisa a los workers para que la quiten del L1."""
+    try:
+        client = get_redis_client()
+        client.delete(get_monthly_cache_key(rut))
+        client.publish(MONTHLY_INVALIDATION_CHANNEL, rut)
+    except Exception as e:
+        print(f"[Monthly Cache] Error al eliminar RUT {rut}: {e}")
+        _stats.incr("errors")
+        return False
+    _l1.delete(rut)
+    return True
+
+async def get_monthly_cache_entry_async(rut: str) -> Optional[MonthlyCacheEntry]:
+    """Versión asíncrona de get_monthly_cache_entry."""
+    cached = _get_l1(rut)
+    if cached is not None:
+        return cached
+    try:
+        raw = await get_async_redis_client().get(get_monthly_cache_key(rut))
+    except Exception as e:
+        print(f"[Monthly Cache] Error al leer RUT {rut}: {e}")
+        _stats.incr("errors")
+        return None
+    return _procesar_raw(rut, raw)
+
+async def get_monthly_cache_entries_async(ruts: List[str]) -> Dict[str, Optional[MonthlyCacheEntry]]:
+    """
+    Lee las entradas de varios RUTs: las que no están en el L1 se piden a Redis
+    en un solo MGET.
+
+    Returns:
+        Diccionario RUT -> MonthlyCacheEntry (None para los que no están en caché)
+    """
+    entries: Dict[str, Optional[MonthlyCacheEntry]] = {}
+    faltantes = []
+    for rut in dict.fromkeys(ruts):
+        entries[rut] = _get_l1(rut)
+        if entries[rut] is None:
+            faltantes.append(rut)
+    if not faltantes:
+        return entries
+    try:
+        raws = await get_async_redis_client().mget([get_monthly_cache_key(rut) for rut in faltantes])
+    except Exception as e:
+        print(f"[Monthly Cache] Error al leer {len(faltantes)} RUTs con MGET: {e}")
+        _stats.incr("errors")
+        return entries
+    for rut, raw in zip(faltantes, raws):
+        entries[rut] = _procesar_raw(rut, raw)
+    return entries
+
+async def set_monthly_cache_async(rut: str, data: List[Dict]) -> bool:
+    """Versión asíncrona de set_monthly_cache."""
+    try:
+        client = get_async_redis_client()
+        await client.set(get_monthly_cache_key(rut), _serializar(data), ex=MONTHLY_CACHE_TTL_SECONDS)
+        await client.publish(MONTHLY_INVALIDATION_CHANNEL, rut)
+    except Exception as e:
+        print(f"[Monthly Cache] Error al guardar RUT {rut}: {e}")
+        _stats.incr("errors")
+        return False
+    _l1.delete(rut)
+    _stats.incr("writes")
+    return True
+
+async def set_monthly_cache_many_async(items: Dict[str, List[Dict]]) -> bool:
+    """
+    Guarda los datos mensuales de varios RUTs en un solo pipeline de Redis
+    (un round trip en lugar de dos por RUT).
+
+    Args:
+        items: Diccionario RUT -> lista de meses
+
+    Returns:
+        True si se guardaron correctamente
+    """
+    if not items:
+        return True
+    try:
+        pipe = get_async_redis_client().pipeline(transaction=False)
+        for rut, data in items.items():
+            pipe.set(get_monthly_cache_key(rut), _serializar(data), ex=MONTHLY_CACHE_TTL_SECONDS)
+            pipe.publish(MONTHLY_INVALIDATION_CHANNEL, rut)
+        await pipe.execute()
+    except Exception as e:
+        print(f"[Monthly Cache] Error al guardar {len(items)} RUTs en pipeline: {e}")
+        _stats.incr("errors")
+        return False
+    for rut in items:
+        _l1.delete(rut)
+    _stats.incr("writes", len(items))
+    return True
+
+def get_monthly_cache_stats() -> Dict:
+    """Devuelve los contadores de la caché mensual (hits, misses, writes, errors) y el hit ratio."""
+    stats = _stats.snapshot()
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["ttl_seconds"] = MONTHLY_CACHE_TTL_SECONDS
+    stats["fresh_seconds"] = MONTHLY_CACHE_FRESH_SECONDS
+    stats["l1_entries"] = len(_l1)
+    return stats
+
+# --- Listener de invalidaciones (un thread por proceso) ---
+_listener_thread: Optional[threading.Thread] = None
+_listener_running = threading.Event()
+
+def _invalidation_loop() -> None:
+    while _listener_running.is_set():
+        pubsub = None
+        try:
+            pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(MONTHLY_INVALIDATION_CHANNEL)
+            # Mientras no estuvimos suscritos pudimos perder avisos: vaciar el L1
+            _l1.clear()
+            print(f"[Monthly Cache] Suscrito a {MONTHLY_INVALIDATION_CHANNEL}")
+            while _listener_running.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    _l1.delete(message["data"])
+                    _stats.incr("invalidations")
+        except Exception as e:
+            print(f"[Monthly Cache] Error en el listener de invalidaciones: {e}. Reintentando...")
+            _l1.clear()
+            time.sleep(1.0)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+def start_invalidation_listener() -> bool:
+    """Inicia el thread que escucha invalidaciones del L1 por Redis pub/sub."""
+    global _listener_thread
+    if not _l1.enabled or _listener_running.is_set():
+        return False
+    _listener_running.set()
+    _listener_thread = threading.Thread(target=_invalidation_loop, daemon=True)
+    _listener_thread.start()
+    return True
+
+def stop_invalidation_listener() -> None:
+    """Detiene el listener de invalidaciones."""
+    _listener_running.clear()
+    if _listener_thread and _listener_thread.is_alive():
+        _listener_thread.join(timeout=5.0)
+# ---
@@ -0,0 +1,135 @@
+# Representación columnar (NumPy) de los datos mensuales de un RUT: una matriz
+# meses x campos en lugar de un dict por mes, con los indicadores tributarios
+# derivados (IVA débito - crédito, variaciones, promedios móviles) calculados en
+# bloque para entregárselos al LLM ya hechos.
+from typing import Dict, List, Optional
+
+import numpy as np
+
+CAMPOS_COMPRAS = [
+    "total_purchases",
+    "total_purchases_discount_document",
+    "total_purchases_exempt",
+    "total_purchases_iva",
+    "total_purchases_net_with_exempt_purchases",
+    "total_purchases_neto",
+    "total_purchases_tax_common_use",
+    "total_purchases_tax_no_recoverable",
+    "total_purchases_tax_recoverable",
+]
+CAMPOS_VENTAS = [
+    "total_sales",
+    "total_sales_discount_document",
+    "total_sales_exempt",
+    "total_sales_iva",
+    "total_sales_net_with_exempt_sales",
+    "total_sales_neto",
+    "total_sales_tax_common_use",
+    "total_sales_tax_no_recoverable",
+    "total_sales_tax_recoverable",
+]
+CAMPOS = CAMPOS_COMPRAS + CAMPOS_VENTAS
+_INDICE = {campo: i for i, campo in enumerate(CAMPOS)}
+
+def _variacion(actual: np.ndarray, anterior: np.ndarray) -> np.ndarray:
+    """Variación porcentual elemento a elemento (NaN si el valor anterior es 0 o falta)."""
+    return np.divide(100.0 * (actual - anterior), anterior, out=np.full_like(actual, np.nan), where=anterior != 0)
+
+def _desplazar(valores: np.ndarray, meses: int) -> np.ndarray:
+    """valores[t - meses] alineado con t (NaN al inicio)."""
+    resultado = np.full_like(valores, np.nan)
+    if meses < len(valores):
+        resultado[meses:] = valores[:-meses]
+    return resultado
+
+def _media_movil(valores: np.ndarray, ventana: int) -> np.ndarray:
+    """Promedio de los últimos `ventana` meses con dato (NaN hasta completar la ventana)."""
+    presentes = ~np.isnan(valores)
+    suma = np.cumsum(np.where(presentes, valores, 0.0))
+    cantidad = np.cumsum(presentes).astype(float)
+    resultado = np.full(len(valores), np.nan)
+    if len(valores) >= ventana:
+        # Suma y cantidad por ventana: acumulado hasta t menos acumulado hasta t - ventana
+        suma_ventana = suma[ventana - 1:].copy()
+        cantidad_ventana = cantidad[ventana - 1:].copy()
+        suma_ventana[1:] -= suma[:-ventana]
+        cantidad_ventana[1:] -= cantidad[:-ventana]
+        np.divide(suma_ventana, cantidad_ventana, out=resultado[ventana - 1:], where=cantidad_ventana > 0)
+    return resultado
+
+class MonthlyFrame:
+    """
+    Meses de un RUT ordenados por periodo, con todos los campos de compras y ventas
+    en una sola matriz float64 (los valores faltantes quedan como NaN).
+    """
+
+    def __init__(self, periods: List[str], values: np.ndarray):
+        self.periods = periods
+        self.values = values
+        self._indicadores: Optional[Dict[str, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.periods)
+
+    @classmethod
+    def from_api(cls, meses: List[Dict]) -> "MonthlyFrame":
+        """Arma la matriz en una sola pasada sobre los meses tal como los devuelve la API."""
+        meses = sorted(meses, key=lambda m: str(m.get("period", "")))
+        periods = [str(m.get("period", "N/A")) for m in meses]
+        values = np.array([list(map(m.get, CAMPOS)) for m in meses], dtype=float).reshape(len(meses), len(CAMPOS))
+        return cls(periods, values)
+
+    def records(self, campos: List[str]) -> List[Dict]:
+        """
+        Meses como dicts {period, campo: valor} con sólo los campos pedidos (NaN -> None),
+        para quien necesita filas (tablas del prompt, huella de la caché de respuestas).
+        """
+        valores = self.values[:, [_INDICE[campo] for campo in campos]]
+        filas = np.where(np.isnan(valores), None, valores).tolist()
+        return [{"period": periodo, **dict(zip(campos, fila))} for periodo, fila in zip(self.periods, filas)]
+
+    def column(self, campo: str) -> np.ndarray:
+        """Vista (sin copia) de la columna de un campo de la API."""
+        return self.values[:, _INDICE[campo]]
+
+    def indicators(self) -> Dict[str, np.ndarray]:
+        """
+        Indicadores derivados por mes, calculados una vez para todos los meses:
+          iva_debito, iva_credito (recuperable + uso común, o el IVA de compras si no
+          vienen desglosados), iva_neto (débito - crédito; negativo = remanente),
+          variación mensual y anual de ventas y compras, y promedios móviles de 3 meses.
+        """
+        if self._indicadores is not None:
+            return self._indicadores
+        ventas = self.column("total_sales")
+        compras = self.column("total_purchases")
+        debito = self.column("total_sales_iva")
+        recuperable = self.column("total_purchases_tax_recoverable")
+        uso_comun = self.column("total_purchases_tax_common_use")
+        falta_recuperable, falta_uso_comun = np.isnan(recuperable), np.isnan(uso_comun)
+        desglosado = np.where(falta_recuperable, 0.0, recuperable) + np.where(falta_uso_comun, 0.0, uso_comun)
+        credito = np.where(falta_recuperable & falta_uso_comun, self.column("total_purchases_iva"), desglosado)
+
+        self._indicadores = {
+            "iva_debito": debito,
+            "iva_credito": credito,
+            "iva_neto": debito - credito,
+            "ventas_var_mensual": _variacion(ventas, _desplazar(ventas, 1)),
+            "compras_var_mensual": _variacion(compras, _desplazar(compras, 1)),
+            "ventas_var_anual": _variacion(ventas, _desplazar(ventas, 12)),
+            "ventas_media_3m": _media_movil(ventas, 3),
+            "compras_media_3m": _media_movil(compras, 3),
+        }
+        return self._indicadores
+
+    def recent_indicators(self, meses: int = 3) -> List[Dict]:
+        """Indicadores de los últimos `meses` periodos, como dicts (NaN -> None)."""
+        indicadores = self.indicators()
+        desde = max(len(self.periods) - meses, 0)
+        filas = []
+        for i in range(desde, len(self.periods)):
+            fila = {"period": self.periods[i]}
+            for nombre, valores in indicadores.items():
+                fila[nombre] = None if np.isnan(valores[i]) else float(valores[i])
+            filas.append(fila)
+        return filas
@@ -1,5 +1,9 @@
 import requests
 import os
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .http_client import get_async_http_client, get_http_session
 
 # Comentar o eliminar la URL definida a nivel de módulo
 # OLLAMA_URL = "http://ollama:11434/api/generate"
@@ -18,7 +22,7 @@ def consultar_llm(prompt: str):
 
     try:
         print(f"[Ollama Request] URL: {ollama_url}, Model: {MODEL_NAME}")
-        response = requests.post(ollama_url, json=body, timeout=180)
+        response = get_http_session().post(ollama_url, json=body, timeout=180)
         response.raise_for_status()
         return response.json().get("response", "")
     except requests.exceptions.RequestException as e:
@@ -26,4 +30,74 @@ def consultar_llm(prompt: str):
         return f"Error: No se pudo conectar al servicio de Ollama en {ollama_host}. Verifica que esté corriendo y accesible."
     except Exception as e:
         print(f"[Ollama General Error] {e}")
-        return "Hubo un error inesperado al comunicarse con Ollama."
\ No newline at end of file
+        return "Hubo un error inesperado al comunicarse con Ollama."
+
+def get_ollama_hosts() -> List[str]:
+    """
+    Hosts de Ollama configurados: OLLAMA_HOSTS (separados por coma) o, si no está
+    definida, el único OLLAMA_HOST.
+    """
+    hosts = [h.strip().rstrip("/") for h in os.getenv("OLLAMA_HOSTS", "").split(",") if h.strip()]
+    return hosts or [os.getenv("OLLAMA_HOST", "http://localhost:11434")]
+
+async def generar_async(prompt: str, ollama_host: str) -> str:
+    """Genera una respuesta completa en un host de Ollama. Lanza httpx.HTTPError si falla."""
+    body = {
+        "model": MODEL_NAME,
+        "prompt": prompt,
+        "stream": False
+    }
+    ollama_url = f"{ollama_host}/api/generate"
+    print(f"[Ollama Request] URL: {ollama_url}, Model: {MODEL_NAME}")
+    response = await get_async_http_client().post(ollama_url, json=body, timeout=180)
+    response.raise_for_status()
+    return response.json().get("response", "")
+
+async def generar_con_contexto(
+    prompt: str,
+    ollama_host: str,
+    context: Optional[List[int]] = None,
+    keep_alive: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Genera continuando una conversación: `context` son los tokens que Ollama devolvió
+    en la respuesta anterior, así no vuelve a procesar lo ya evaluado. Devuelve el JSON
+    completo de Ollama (response, context, prompt_eval_count, prompt_eval_duration...).
+    Lanza httpx.HTTPError si falla.
+    """
+    body = {
+        "model": MODEL_NAME,
+        "prompt": prompt,
+        "stream": False
+    }
+    if context:
+        body["context"] = context
+    if keep_alive:
+        # Mantiene el modelo (y su caché) cargado entre preguntas de la sesión
+        body["keep_alive"] = keep_alive
+    ollama_url = f"{ollama_host}/api/generate"
+    print(f"[Ollama Request] URL: {ollama_url}, Model: {MODEL_NAME}, contexto: {len(context or [])} tokens")
+    response = await get_async_http_client().post(ollama_url, json=body, timeout=180)
+    response.raise_for_status()
+    return response.json()
+
+async def generar_stream(prompt: str, ollama_host: str) -> AsyncIterator[str]:
+    """Genera en modo streaming en un host de Ollama. Lanza httpx.HTTPError si falla."""
+    body = {
+        "model": MODEL_NAME,
+        "prompt": prompt,
+        "stream": True
+    }
+    ollama_url = f"{ollama_host}/api/generate"
+    print(f"[Ollama Stream Request] URL: {ollama_url}, Model: {MODEL_NAME}")
+    async with get_async_http_client().stream("POST", ollama_url, json=body, timeout=180) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            token = chunk.get("response", "")
+            if token:
+                yield token
+            if chunk.get("done"):
+                break
@@ -1,10 +1,12 @@
 import os
-from openai import OpenAI, OpenAIError
+from typing import AsyncIterator, Dict, List
+from openai import OpenAI, AsyncOpenAI, OpenAIError
 
 # La inicialización del cliente puede leer la variable de entorno OPENAI_API_KEY automáticamente
 # o puedes pasarla explícitamente: client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 # Dejar que la biblioteca lo maneje es más simple si la variable está definida.
 client = OpenAI()
+async_client = AsyncOpenAI()
 
 def consultar_openai(prompt: str) -> str:
     """Consulta la API de OpenAI Chat Completions."""
@@ -40,3 +42,77 @@ def consultar_openai(prompt: str) -> str:
         # Manejar otros errores inesperados
         print(f"[OpenAI General Error] {e}")
         return "Hubo un error inesperado al procesar la solicitud con OpenAI."
+
+async def consultar_openai_async(prompt: str) -> str:
+    """Versión asíncrona de consultar_openai usando AsyncOpenAI."""
+    return await consultar_openai_mensajes_async([{"role": "user", "content": prompt}])
+
+async def consultar_openai_mensajes_async(messages: List[Dict[str, str]]) -> str:
+    """
+    Consulta OpenAI con una lista de mensajes ya armada (p. ej. system + historial).
+    Con un prefijo de mensajes idéntico entre llamadas, OpenAI reutiliza su caché de prompts.
+    """
+    openai_model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    if not api_key:
+        print("[OpenAI Error] La variable de entorno OPENAI_API_KEY no está definida.")
+        return "Error: Falta la configuración de la API de OpenAI."
+
+    print(f"[OpenAI Request] Model: {openai_model}") # Debug
+
+    try:
+        completion = await async_client.chat.completions.create(
+            model=openai_model,
+            messages=messages,
+        )
+        respuesta = completion.choices[0].message.content
+        return respuesta.strip() if respuesta else ""
+
+    except OpenAIError as e:
+        print(f"[OpenAI API Error] {e}")
+        return f"Hubo un error al comunicarse con la API de OpenAI: {e}"
+    except Exception as e:
+        print(f"[OpenAI General Error] {e}")
+        return "Hubo un error inesperado al procesar la solicitud con OpenAI."
+
+async def consultar_openai_stream(prompt: str) -> AsyncIterator[str]:
+    """
+    Consulta OpenAI en modo stream y entrega los fragmentos de texto a medida que llegan.
+    Al cerrar el generador se cierra el stream y OpenAI deja de generar.
+    """
+    openai_model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    if not api_key:
+        print("[OpenAI Error] La variable de entorno OPENAI_API_KEY no está definida.")
+        yield "Error: Falta la configuración de la API de OpenAI."
+        return
+
+    print(f"[OpenAI Stream Request] Model: {openai_model}") # Debug
+
+    stream = None
+    try:
+        stream = await async_client.chat.completions.create(
+            model=openai_model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                yield token
+
+    except OpenAIError as e:
+        print(f"[OpenAI API Error] {e}")
+        yield f"Hubo un error al comunicarse con la API de OpenAI: {e}"
+    except Exception as e:
+        print(f"[OpenAI General Error] {e}")
+        yield "Hubo un error inesperado al procesar la solicitud con OpenAI."
+    finally:
+        if stream is not None:
+            await stream.close()
@@ -1,6 +1,145 @@
-def generar_prompt_iva(rut, compras, ventas, pregunta_usuario):
+import os
+import re
+import math
+from typing import Dict, List, NamedTuple, Optional
+
+from .metrics import Counters
+from .text import normalize_question
+from .monthly_frame import MonthlyFrame
+
+# --- Configuración ---
+# Formato compacto con presupuesto de tokens (false = una línea por mes, formato anterior)
+PROMPT_COMPACT = os.getenv("PROMPT_COMPACT", "true").lower() in ("1", "true", "yes")
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "800"))
+# Meses recientes que se muestran detallados; los anteriores se agrupan por trimestre/año
+# (0 = ninguno detallado, todo agrupado)
+PROMPT_RECENT_MONTHS = max(int(os.getenv("PROMPT_RECENT_MONTHS", "3")), 0)
+# Estimación de tokens sin tokenizer: caracteres por token (texto en español con montos)
+PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "3.5"))
+# Meses con indicadores precalculados (IVA débito - crédito, variaciones, promedios)
+PROMPT_INDICATOR_MONTHS = int(os.getenv("PROMPT_INDICATOR_MONTHS", "3"))
+# ---
+
+# Columnas disponibles: nombre -> (etiqueta, campo de la API con {t} = purchases | sales)
+CAMPOS = {
+    "total": ("Total", "total_{t}"),
+    "neto": ("Neto", "total_{t}_neto"),
+    "exento": ("Exento", "total_{t}_exempt"),
+    "iva": ("IVA", "total_{t}_iva"),
+    "recuperable": ("IVA recuperable", "total_{t}_tax_recoverable"),
+    "no_recuperable": ("IVA no recuperable", "total_{t}_tax_no_recoverable"),
+    "uso_comun": ("IVA uso común", "total_{t}_tax_common_use"),
+    "descuentos": ("Descuentos", "total_{t}_discount_document"),
+}
+
+# Columnas relevantes según el tipo de pregunta
+CAMPOS_POR_TIPO = {
+    "iva": ["total", "neto", "iva", "recuperable", "no_recuperable", "uso_comun"],
+    "exento": ["total", "neto", "exento"],
+    "descuentos": ["total", "descuentos"],
+    "tendencia": ["total", "iva"],
+    "general": ["total", "iva"],
+}
+
+# Palabras clave (normalizadas, sin tildes) por tipo; gana el primer tipo que calce
+_PALABRAS_TIPO = [
+    ("exento", ("exent",)),
+    ("descuentos", ("descuento", "nota de credito", "notas de credito")),
+    ("iva", ("iva", "impuesto", "credito fiscal", "debito", "recuper", "f29", "pagar")),
+    ("tendencia", ("tendencia", "evolucion", "crec", "baj", "compar", "variacion", "promedio")),
+]
+
+# Niveles de compactación, del más detallado al más resumido:
+# (meses detallados, agrupación de los anteriores, máximo de grupos anteriores).
+# Ya el primero agrupa por trimestre lo anterior a los meses recientes: una fila por
+# mes para toda la historia sale más larga que el formato anterior.
+_DETALLE_MINIMO = min(PROMPT_RECENT_MONTHS, 3)
+_NIVELES = [
+    (PROMPT_RECENT_MONTHS, "trimestre", None),
+    (_DETALLE_MINIMO, "año", None),
+    (_DETALLE_MINIMO, "año", 2),
+    (_DETALLE_MINIMO, None, 0),
+]
+
+_stats = Counters("built", "compacted", "over_budget", "estimated_tokens")
+
+class PromptIVA(NamedTuple):
+    """Prompt armado con su estimación de tamaño."""
+    prompt: str
+    tipo: str
+    tokens_estimados: int
+    nivel: int
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación aproximada de tokens por largo de texto (sin depender del tokenizer del modelo)."""
+    return math.ceil(len(texto) / PROMPT_CHARS_PER_TOKEN)
+
+def clasificar_pregunta(pregunta: str) -> str:
+    """Tipo de pregunta (iva, exento, descuentos, tendencia o general) según palabras clave."""
+    texto = normalize_question(pregunta)
+    for tipo, palabras in _PALABRAS_TIPO:
+        if any(p in texto for p in palabras):
+            return tipo
+    return "general"
+
+def generar_prompt_iva(rut, compras, ventas, pregunta_usuario, frame: Optional[MonthlyFrame] = None):
+    if not PROMPT_COMPACT:
+        return generar_contexto_iva(rut, compras, ventas, frame) + generar_pregunta_iva(pregunta_usuario)
+    return construir_prompt_iva(rut, compras, ventas, pregunta_usuario, frame).prompt
+
+def construir_prompt_iva(
+    rut,
+    compras,
+    ventas,
+    pregunta_usuario,
+    frame: Optional[MonthlyFrame] = None,
+    token_budget: int = PROMPT_TOKEN_BUDGET
+) -> PromptIVA:
+    """
+    Arma el prompt en formato compacto dentro de `token_budget` tokens estimados:
+    sólo las columnas relevantes para el tipo de pregunta, y los meses más antiguos
+    agrupados por trimestre o por año hasta que el prompt entra en el presupuesto.
+    Los indicadores salen de `frame` (el MonthlyFrame de los mismos datos).
+    """
+    tipo = clasificar_pregunta(pregunta_usuario)
+    pregunta = generar_pregunta_iva(pregunta_usuario)
+    indicadores = formatear_indicadores(frame)
+    prompt, nivel = "", 0
+    for nivel in range(len(_NIVELES)):
+        prompt = _contexto_compacto(rut, compras, ventas, tipo, nivel, indicadores) + pregunta
+        if estimar_tokens(prompt) <= token_budget:
+            break
+    else:
+        _stats.incr("over_budget")
+
+    tokens = estimar_tokens(prompt)
+    _stats.incr("built")
+    _stats.incr("estimated_tokens", tokens)
+    if nivel > 0:
+        _stats.incr("compacted")
+    return PromptIVA(prompt, tipo, tokens, nivel)
+
+def generar_contexto_iva(rut, compras, ventas, frame: Optional[MonthlyFrame] = None, token_budget: int = PROMPT_TOKEN_BUDGET):
+    """
+    Parte fija del prompt para un RUT (datos e instrucciones). Se mantiene idéntica
+    entre preguntas para que el backend pueda reutilizar el prefijo ya procesado.
+    """
+    if PROMPT_COMPACT:
+        contexto = ""
+        indicadores = formatear_indicadores(frame)
+        for nivel in range(len(_NIVELES)):
+            contexto = _contexto_compacto(rut, compras, ventas, "general", nivel, indicadores)
+            if estimar_tokens(contexto) <= token_budget:
+                break
+        return contexto
+
     texto_compras = formatear(compras, "compras")
     texto_ventas = formatear(ventas, "ventas")
+    # Sin frame (llamadas que sólo tienen las filas) queda el formato anterior tal cual
+    texto_indicadores = f"""
+**Indicadores calculados:**
+{formatear_indicadores(frame)}
+""" if frame is not None else ""
 
     return f"""
 Contexto tributario para RUT {rut} (últimos meses disponibles):
@@ -10,12 +149,126 @@ Contexto tributario para RUT {rut} (últimos meses disponibles):
 
 **Resumen Ventas:**
 {texto_ventas}
-
+{texto_indicadores}
 Considerando la información anterior, responde la siguiente pregunta como un asesor tributario experto:
+"""
 
+def generar_pregunta_iva(pregunta_usuario):
+    """Parte variable del prompt: la pregunta del usuario."""
+    return f"""
 Pregunta: {pregunta_usuario}
 Respuesta:"""
 
+def _contexto_compacto(rut, compras, ventas, tipo: str, nivel: int, indicadores: str) -> str:
+    texto_compras = formatear_compacto(compras, "compras", tipo, nivel)
+    texto_ventas = formatear_compacto(ventas, "ventas", tipo, nivel)
+    return f"""
+Contexto tributario para RUT {rut} (montos en $, filas por periodo; T = trimestre):
+
+**Compras:**
+{texto_compras}
+
+**Ventas:**
+{texto_ventas}
+
+**Indicadores calculados:**
+{indicadores}
+
+Considerando la información anterior, responde la siguiente pregunta como un asesor tributario experto:
+"""
+
+def _grupo(periodo: str, agrupacion: str) -> str:
+    """Clave de agrupación de un periodo 'YYYY-MM' (los periodos con otro formato quedan solos)."""
+    match = re.fullmatch(r"(\d{4})-(\d{1,2})", periodo)
+    if not match:
+        return periodo
+    if agrupacion == "año":
+        return match.group(1)
+    return f"{match.group(1)}-T{(int(match.group(2)) - 1) // 3 + 1}"
+
+def _monto(valor) -> str:
+    return f"{valor:,.0f}" if isinstance(valor, (int, float)) else "-"
+
+def _fila(etiqueta: str, meses: List[Dict], columnas: List[str]) -> str:
+    valores = []
+    for campo in columnas:
+        numeros = [m.get(campo) for m in meses if isinstance(m.get(campo), (int, float))]
+        valores.append(_monto(sum(numeros)) if numeros else "-")
+    return f"{etiqueta} | " + " | ".join(valores)
+
+def _tendencia(meses: List[Dict], campo: str) -> Optional[str]:
+    """Variación del total de los últimos 3 meses contra los 3 anteriores."""
+    if len(meses) < 6:
+        return None
+    recientes = sum(m.get(campo) or 0 for m in meses[-3:])
+    anteriores = sum(m.get(campo) or 0 for m in meses[-6:-3])
+    if not anteriores:
+        return None
+    return f"Tendencia: últimos 3 meses {100 * (recientes - anteriores) / anteriores:+.1f}% vs 3 meses anteriores"
+
+def formatear_compacto(data, tipo, tipo_pregunta: str = "general", nivel: int = 0):
+    """
+    Formatea los datos mensuales como tabla con las columnas relevantes para
+    `tipo_pregunta`. Según `nivel` (ver _NIVELES), los meses más antiguos se
+    agrupan por trimestre o año, o se omiten.
+    """
+    if not data:
+        return f"No se encontraron datos de {tipo} recientes."
+
+    t = "purchases" if tipo == "compras" else "sales"
+    meses = sorted(data, key=lambda m: str(m.get("period", "")))
+    # Columnas relevantes que tienen algún valor distinto de cero
+    nombres = [c for c in CAMPOS_POR_TIPO.get(tipo_pregunta, CAMPOS_POR_TIPO["general"])
+               if any(m.get(CAMPOS[c][1].format(t=t)) for m in meses)] or ["total"]
+    columnas = [CAMPOS[c][1].format(t=t) for c in nombres]
+
+    detallados, agrupacion, max_grupos = _NIVELES[nivel]
+    # meses[-0:] serían todos: con 0 meses detallados no queda ninguno
+    recientes = meses[len(meses) - detallados:] if detallados else []
+    anteriores = meses[:len(meses) - len(recientes)]
+
+    lineas = ["Periodo | " + " | ".join(CAMPOS[c][0] for c in nombres)]
+    if anteriores and agrupacion:
+        grupos: Dict[str, List[Dict]] = {}
+        for m in anteriores:
+            grupos.setdefault(_grupo(str(m.get("period", "N/A")), agrupacion), []).append(m)
+        claves = list(grupos)
+        if max_grupos is not None:
+            claves = claves[-max_grupos:]
+        for clave in claves:
+            lineas.append(_fila(f"{clave} ({len(grupos[clave])}m)", grupos[clave], columnas))
+    elif anteriores:
+        lineas.append(f"({len(anteriores)} meses anteriores omitidos)")
+    for m in recientes:
+        lineas.append(_fila(str(m.get("period", "N/A")), [m], columnas))
+
+    tendencia = _tendencia(meses, columnas[0])
+    if tendencia:
+        lineas.append(tendencia)
+    return "\n".join(lineas)
+
+def _porcentaje(valor) -> str:
+    return f"{valor:+.1f}%" if valor is not None else "-"
+
+def formatear_indicadores(frame: Optional[MonthlyFrame], meses: int = PROMPT_INDICATOR_MONTHS):
+    """
+    Indicadores derivados de los últimos meses (ver MonthlyFrame.indicators), para que
+    el LLM no tenga que hacer la aritmética.
+    """
+    if frame is None or not len(frame):
+        return "Sin datos para calcular indicadores."
+    lineas = ["Periodo | IVA débito | IVA crédito | Débito - crédito | Var. ventas m/m | Ventas prom. 3m"]
+    for fila in frame.recent_indicators(meses):
+        lineas.append(
+            f"{fila['period']} | {_monto(fila['iva_debito'])} | {_monto(fila['iva_credito'])} | "
+            f"{_monto(fila['iva_neto'])} | {_porcentaje(fila['ventas_var_mensual'])} | {_monto(fila['ventas_media_3m'])}"
+        )
+    ultima = frame.recent_indicators(1)[0]
+    if ultima["ventas_var_anual"] is not None:
+        lineas.append(f"Ventas {ultima['period']} vs mismo mes del año anterior: {_porcentaje(ultima['ventas_var_anual'])}")
+    lineas.append("Débito - crédito: positivo = IVA a pagar, negativo = remanente.")
+    return "\n".join(lineas)
+
 def formatear(data, tipo):
     """
     Formatea la lista de datos mensuales (compras o ventas) para incluirla en el prompt.
@@ -38,6 +291,12 @@ def formatear(data, tipo):
 
     return "\n".join(lineas)
 
+def get_prompt_stats() -> Dict:
+    stats = _stats.snapshot()
+    stats["token_budget"] = PROMPT_TOKEN_BUDGET
+    stats["avg_estimated_tokens"] = round(stats["estimated_tokens"] / stats["built"], 1) if stats["built"] else 0.0
+    return stats
+
 # Código anterior comentado para referencia
 # def formatear(data, tipo):
 #     if not data or "periodos" not in data:
@@ -46,4 +305,4 @@ def formatear(data, tipo):
 #     linea = f"{tipo.capitalize()}:\n"
 #     for p in data["periodos"]:
 #         linea += f"- {p['periodo']}: ${p['monto']:,}\n"
-#     return linea
\ No newline at end of file
+#     return linea
@@ -0,0 +1,30 @@
+import time
+import asyncio
+
+class AsyncTokenBucket:
+    """
+    Token bucket para limitar la tasa de llamadas a un servicio externo.
+    `rate` tokens por segundo con ráfagas de hasta `burst` tokens; rate <= 0 desactiva el límite.
+    Los que esperan se atienden en orden de llegada.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Espera hasta que haya un token disponible y lo consume."""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -1,50 +1,198 @@
 import redis
+import redis.asyncio as aioredis
 import os
 import json
+import time
+import asyncio
+import threading
+from typing import Optional
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# --- Configuración ---
+# REDIS_URL tiene prioridad; si no está definida se arma desde REDIS_HOST/PORT/DB
+REDIS_URL = os.getenv("REDIS_URL") or "redis://{host}:{port}/{db}".format(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=os.getenv("REDIS_PORT", "6379"),
+    db=os.getenv("REDIS_DB", "0"),
+)
+# Tamaño máximo del pool por proceso (sync y async tienen un pool cada uno)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+# Segundos que se espera por una conexión libre antes de fallar
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+# ---
 
-# Crear una instancia del cliente Redis que se pueda reutilizar
-# decode_responses=True decodifica automáticamente las respuestas de bytes a strings
-try:
-    redis_client = redis.from_url(REDIS_URL, decode_responses=True)
-    redis_client.ping() # Verificar conexión al iniciar
-    print(f"Conectado exitosamente a Redis en {REDIS_URL}")
-except redis.exceptions.ConnectionError as e:
-    print(f"Error al conectar con Redis en {REDIS_URL}: {e}")
-    # Puedes decidir si lanzar una excepción aquí o manejarlo de otra forma
-    # Por ahora, la aplicación podría continuar pero las operaciones de caché fallarán.
-    redis_client = None
+class PoolMetrics:
+    """Métricas de uso de un pool: conexiones en uso y tiempo de espera por una conexión."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.max_in_use = 0
+        self.acquisitions = 0
+        self.acquire_errors = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def acquired(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.acquisitions += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def acquire_failed(self) -> None:
+        with self._lock:
+            self.acquire_errors += 1
+
+    def released(self) -> None:
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "acquisitions": self.acquisitions,
+                "acquire_errors": self.acquire_errors,
+                "avg_wait_ms": round(1000 * self.total_wait_seconds / self.acquisitions, 3) if self.acquisitions else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait_seconds, 3),
+            }
+
+class InstrumentedBlockingConnectionPool(redis.BlockingConnectionPool):
+    """BlockingConnectionPool que registra cuánto se espera por una conexión libre."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.exceptions.ConnectionError:
+            self.metrics.acquire_failed()
+            raise
+        self.metrics.acquired(time.perf_counter() - start)
+        return connection
+
+    def release(self, connection):
+        self.metrics.released()
+        return super().release(connection)
+
+class AsyncInstrumentedBlockingConnectionPool(aioredis.BlockingConnectionPool):
+    """Versión asíncrona de InstrumentedBlockingConnectionPool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except redis.exceptions.ConnectionError:
+            self.metrics.acquire_failed()
+            raise
+        self.metrics.acquired(time.perf_counter() - start)
+        return connection
+
+    async def release(self, connection):
+        self.metrics.released()
+        return await super().release(connection)
+
+# --- Clientes compartidos por el proceso (se crean de forma perezosa) ---
+_sync_lock = threading.Lock()
+_sync_pool: Optional[InstrumentedBlockingConnectionPool] = None
+_sync_client: Optional[redis.Redis] = None
+
+_async_pool: Optional[AsyncInstrumentedBlockingConnectionPool] = None
+_async_client: Optional[aioredis.Redis] = None
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_redis_client() -> redis.Redis:
+    """
+    Devuelve el cliente Redis síncrono compartido del proceso.
+    Todas las llamadas comparten el mismo pool de conexiones (thread-safe).
+    """
+    global _sync_pool, _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                _sync_pool = InstrumentedBlockingConnectionPool.from_url(
+                    REDIS_URL,
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                    timeout=REDIS_POOL_TIMEOUT,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    decode_responses=True
+                )
+                _sync_client = redis.Redis(connection_pool=_sync_pool)
+                print(f"[Redis] Pool síncrono creado para {REDIS_URL} (max {REDIS_MAX_CONNECTIONS} conexiones)")
+    return _sync_client
+
+def get_async_redis_client() -> aioredis.Redis:
+    """
+    Devuelve el cliente Redis asíncrono compartido del proceso.
+    Las conexiones asyncio quedan ligadas a su event loop, por lo que si se llama
+    desde otro loop (p.ej. un script con asyncio.run) se crea un pool nuevo.
+    """
+    global _async_pool, _async_client, _async_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_loop is not loop:
+        _async_pool = AsyncInstrumentedBlockingConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            decode_responses=True
+        )
+        _async_client = aioredis.Redis(connection_pool=_async_pool)
+        _async_loop = loop
+        print(f"[Redis] Pool asíncrono creado para {REDIS_URL} (max {REDIS_MAX_CONNECTIONS} conexiones)")
+    return _async_client
+
+async def close_redis_clients() -> None:
+    """Cierra los pools compartidos (llamar al detener la aplicación)."""
+    global _sync_pool, _sync_client, _async_pool, _async_client, _async_loop
+    if _async_pool is not None:
+        await _async_pool.disconnect()
+    if _sync_pool is not None:
+        _sync_pool.disconnect()
+    _sync_pool = _sync_client = None
+    _async_pool = _async_client = _async_loop = None
+
+def get_pool_stats() -> dict:
+    """Devuelve el tamaño configurado y las métricas de espera de ambos pools."""
+    return {
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "pool_timeout_seconds": REDIS_POOL_TIMEOUT,
+        "sync": _sync_pool.metrics.snapshot() if _sync_pool else None,
+        "async": _async_pool.metrics.snapshot() if _async_pool else None,
+    }
+# ---
 
 def set_cache(key: str, value: dict, expiration_seconds: int | None = None):
     """Almacena un diccionario en Redis como JSON string, con expiración opcional."""
-    if redis_client:
-        try:
-            json_value = json.dumps(value) # Convertir diccionario a JSON string
-            redis_client.set(key, json_value, ex=expiration_seconds)
-            print(f"[Cache SET] Key: {key}, Expiration: {expiration_seconds}s")
-            return True
-        except Exception as e:
-            print(f"[Cache SET Error] Key: {key}, Error: {e}")
-            return False
-    else:
-        print("[Cache SET Error] Cliente Redis no disponible.")
+    try:
+        json_value = json.dumps(value) # Convertir diccionario a JSON string
+        get_redis_client().set(key, json_value, ex=expiration_seconds)
+        print(f"[Cache SET] Key: {key}, Expiration: {expiration_seconds}s")
+        return True
+    except Exception as e:
+        print(f"[Cache SET Error] Key: {key}, Error: {e}")
         return False
 
 def get_cache(key: str) -> dict | None:
     """Obtiene un valor de Redis y lo parsea desde JSON string a diccionario."""
-    if redis_client:
-        try:
-            json_value = redis_client.get(key)
-            if json_value:
-                print(f"[Cache GET] Key: {key} - FOUND")
-                return json.loads(json_value) # Convertir JSON string a diccionario
-            else:
-                print(f"[Cache GET] Key: {key} - NOT FOUND")
-                return None
-        except Exception as e:
-            print(f"[Cache GET Error] Key: {key}, Error: {e}")
+    try:
+        json_value = get_redis_client().get(key)
+        if json_value:
+            print(f"[Cache GET] Key: {key} - FOUND")
+            return json.loads(json_value) # Convertir JSON string a diccionario
+        else:
+            print(f"[Cache GET] Key: {key} - NOT FOUND")
             return None
-    else:
-        print("[Cache GET Error] Cliente Redis no disponible.")
+    except Exception as e:
+        print(f"[Cache GET Error] Key: {key}, Error: {e}")
         return None
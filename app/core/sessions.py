@@ -0,0 +1,136 @@
+# Sesiones de conversación sobre un RUT: el contexto tributario (generar_contexto_iva)
+# se envía una sola vez y las preguntas siguientes reutilizan el prefijo ya procesado.
+#  - Ollama: se guarda el `context` que devuelve cada respuesta y se reenvía con la
+#    pregunta siguiente (sólo se evalúan los tokens nuevos); la sesión queda pegada al
+#    host que tiene el prefijo en caché y keep_alive mantiene el modelo cargado.
+#  - OpenAI: el contexto va en un mensaje system estable al inicio y el historial se
+#    agrega después, así el prefijo es idéntico entre turnos y aprovecha el prompt caching.
+# Las sesiones viven en Redis con TTL (se renueva en cada pregunta).
+import os
+import json
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app.services.monthly_data import get_monthly_data_cliente_async
+from .metrics import Counters
+from .prompts import generar_contexto_iva, generar_pregunta_iva
+from .answer_cache import data_fingerprint
+from .llm_router import get_llm_router, NoEndpointError, ERROR_SIN_HOSTS
+from .llm_scheduler import get_llm_scheduler
+from .openai_client import consultar_openai_mensajes_async
+from .redis_client import get_async_redis_client
+
+# --- Configuración ---
+SESSION_PREFIX = "session:"
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(60 * 30)))
+# Ollama descarga el modelo tras este tiempo sin uso (formato de duración de Ollama)
+SESSION_OLLAMA_KEEP_ALIVE = os.getenv("SESSION_OLLAMA_KEEP_ALIVE", "30m")
+# Pasado este tamaño de contexto (tokens) la conversación se reinicia desde el contexto base
+SESSION_MAX_CONTEXT_TOKENS = int(os.getenv("SESSION_MAX_CONTEXT_TOKENS", "6000"))
+# Turnos (pregunta + respuesta) de historial que se reenvían a OpenAI
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "10"))
+# ---
+
+_stats = Counters("created", "turns", "prefix_reused", "rebuilt", "not_found", "closed")
+
+def get_session_key(session_id: str) -> str:
+    return f"{SESSION_PREFIX}{session_id}"
+
+async def _guardar(session_id: str, session: Dict) -> None:
+    await get_async_redis_client().set(get_session_key(session_id), json.dumps(session), ex=SESSION_TTL_SECONDS)
+
+async def crear_sesion(rut: str, backend: str) -> Dict:
+    """Crea una sesión vacía para un RUT; el contexto se envía con la primera pregunta."""
+    session_id = uuid.uuid4().hex
+    await _guardar(session_id, {
+        "rut": rut,
+        "backend": backend,
+        "data_hash": None,
+        "host": None,
+        "context": [],
+        "messages": [],
+        "turns": 0,
+        "created_at": time.time(),
+    })
+    _stats.incr("created")
+    return {"session_id": session_id, "rut": rut, "ttl_seconds": SESSION_TTL_SECONDS}
+
+async def cerrar_sesion(session_id: str) -> bool:
+    borradas = await get_async_redis_client().delete(get_session_key(session_id))
+    if borradas:
+        _stats.incr("closed")
+    return bool(borradas)
+
+async def _turno_ollama(session: Dict, contexto: str, pregunta: str) -> Dict:
+    reutiliza = bool(session["context"]) and len(session["context"]) <= SESSION_MAX_CONTEXT_TOKENS
+    # Con contexto previo sólo se envía la pregunta: el prefijo ya está evaluado
+    prompt = generar_pregunta_iva(pregunta) if reutiliza else contexto + generar_pregunta_iva(pregunta)
+    try:
+        data, host = await get_llm_router().generate_with_context(
+            prompt,
+            context=session["context"] if reutiliza else None,
+            preferred_host=session["host"],
+            keep_alive=SESSION_OLLAMA_KEEP_ALIVE,
+        )
+    except NoEndpointError:
+        return {"respuesta": ERROR_SIN_HOSTS}
+    session["context"] = data.get("context") or []
+    session["host"] = host
+    return {
+        "respuesta": data.get("response", ""),
+        "prefix_reused": reutiliza,
+        "prompt_eval_count": data.get("prompt_eval_count"),
+        "prompt_eval_ms": round(data["prompt_eval_duration"] / 1e6, 1) if data.get("prompt_eval_duration") else None,
+    }
+
+async def _turno_openai(session: Dict, contexto: str, pregunta: str) -> Dict:
+    reutiliza = bool(session["messages"])
+    historial: List[Dict] = session["messages"][-2 * SESSION_MAX_TURNS:]
+    pregunta_msg = {"role": "user", "content": generar_pregunta_iva(pregunta).strip()}
+    # system fijo primero: el prefijo de mensajes es idéntico entre turnos
+    respuesta = await consultar_openai_mensajes_async(
+        [{"role": "system", "content": contexto.strip()}] + historial + [pregunta_msg]
+    )
+    session["messages"] = historial + [pregunta_msg, {"role": "assistant", "content": respuesta}]
+    return {"respuesta": respuesta, "prefix_reused": reutiliza}
+
+async def preguntar_en_sesion(session_id: str, pregunta: str, priority: int) -> Optional[Dict]:
+    """
+    Responde una pregunta dentro de una sesión. Devuelve None si la sesión no existe
+    (o expiró). Si los datos mensuales del RUT cambiaron desde el turno anterior,
+    la conversación se reinicia con el contexto nuevo.
+    Lanza LLMSaturatedError si el scheduler del backend está saturado.
+    """
+    raw = await get_async_redis_client().get(get_session_key(session_id))
+    if raw is None:
+        _stats.incr("not_found")
+        return None
+    session = json.loads(raw)
+    rut = session["rut"]
+
+    datos = await get_monthly_data_cliente_async(rut)
+    data_hash = data_fingerprint(datos.compras, datos.ventas)
+    if session["data_hash"] not in (None, data_hash):
+        _stats.incr("rebuilt")
+        session.update({"context": [], "messages": [], "host": None})
+    session["data_hash"] = data_hash
+    contexto = generar_contexto_iva(rut, datos.compras, datos.ventas, datos.frame)
+
+    async with get_llm_scheduler(session["backend"]).slot(priority):
+        if session["backend"] == "openai":
+            resultado = await _turno_openai(session, contexto, pregunta)
+        else:
+            resultado = await _turno_ollama(session, contexto, pregunta)
+
+    session["turns"] += 1
+    _stats.incr("turns")
+    if resultado.get("prefix_reused"):
+        _stats.incr("prefix_reused")
+    await _guardar(session_id, session)
+    return {"session_id": session_id, "rut": rut, "pregunta": pregunta, "turn": session["turns"], **resultado}
+
+def get_session_stats() -> Dict:
+    stats = _stats.snapshot()
+    stats["ttl_seconds"] = SESSION_TTL_SECONDS
+    return stats
@@ -0,0 +1,37 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from .metrics import Counters
+
+class AsyncSingleFlight:
+    """
+    Coalesce llamadas concurrentes con la misma clave: sólo la primera ejecuta
+    la función y las demás esperan su resultado (o su excepción).
+    La función corre en su propia task, así que si quien la inició se cancela
+    (p.ej. el cliente HTTP se desconectó) los demás siguen recibiendo el resultado.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = Counters("calls", "coalesced")
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Ejecuta fn() una sola vez por clave entre todas las llamadas concurrentes."""
+        self.stats.incr("calls")
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats.incr("coalesced")
+        return await asyncio.shield(task)
+
+    def snapshot(self) -> Dict[str, int]:
+        stats = self.stats.snapshot()
+        stats["in_flight"] = len(self._inflight)
+        return stats
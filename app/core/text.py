@@ -0,0 +1,19 @@
+# Normalización de texto de las preguntas, compartida por la caché de respuestas
+# (clave exacta), el clasificador de prompts y el camino rápido sin LLM.
+import re
+import unicodedata
+
+_PUNTUACION = re.compile(r"[^\w\s]")
+_ESPACIOS = re.compile(r"\s+")
+
+def normalize_question(pregunta: str) -> str:
+    """
+    Minúsculas, sin tildes, sin signos de puntuación y con espacios colapsados.
+    Valores que no son texto (el body JSON puede traer números o listas) se convierten con str().
+    """
+    if not isinstance(pregunta, str):
+        pregunta = "" if pregunta is None else str(pregunta)
+    texto = unicodedata.normalize("NFKD", pregunta).lower()
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = _PUNTUACION.sub(" ", texto)
+    return _ESPACIOS.sub(" ", texto).strip()
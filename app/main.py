@@ -1,6 +1,10 @@
 from fastapi import FastAPI, Request, BackgroundTasks
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 import os
+import re
+import json
+import uuid
 from pathlib import Path
 
 # --- Cargar .env PRIMERO ---
@@ -13,13 +17,23 @@ print(f"BUSINESS_INVOICES_TOKEN loaded: {os.getenv('BUSINESS_INVOICES_TOKEN') is
 # --- Fin Carga .env ---
 
 # --- Importar módulos de la app DESPUÉS de cargar .env ---
-from app.core.ollama import consultar_llm
-from app.core.openai_client import consultar_openai
-from app.services.compras import get_compras_cliente
-from app.services.ventas import get_ventas_cliente
-from app.core.prompts import generar_prompt_iva
-from app.core.kafka_consumer import start_kafka_consumer, stop_kafka_consumer
-from app.core.cache_updater import update_business_data, update_all_businesses
+from app.core.ollama import MODEL_NAME as OLLAMA_MODEL_NAME
+from app.core.llm_router import get_llm_router
+from app.core.openai_client import consultar_openai_async, consultar_openai_stream
+from app.core.http_client import init_http_clients, close_http_clients
+from app.core.redis_client import close_redis_clients, get_pool_stats
+from app.core.monthly_cache import get_monthly_cache_stats, start_invalidation_listener, stop_invalidation_listener
+from app.services.monthly_data import get_monthly_data_cliente_async, get_monthly_data_stats
+from app.services.facturas import get_facturas_stats
+from app.core.prompts import generar_prompt_iva, get_prompt_stats
+from app.core.kafka_consumer import start_kafka_consumer, stop_kafka_consumer, get_kafka_consumer_metrics
+from app.core.cache_updater import update_business_data, update_all_businesses_async
+from app.core.business_registry import register_business_async, get_registry_size_async
+from app.core.llm_scheduler import LLMSaturatedError, get_llm_scheduler, get_llm_scheduler_stats, parse_priority
+from app.core.batch_questions import create_batch_job, get_batch_job
+from app.core.answer_cache import build_answer_key, get_cached_answer, set_cached_answer, get_answer_cache_stats
+from app.core.fast_answers import try_fast_answer, get_fast_answer_stats
+from app.core.sessions import crear_sesion, preguntar_en_sesion, cerrar_sesion, get_session_stats
 # --- Fin Importaciones ---
 
 app = FastAPI()
@@ -27,24 +41,39 @@ app = FastAPI()
 # --- Leer configuración del servicio LLM ---
 LLM_SERVICE = os.getenv("LLM_SERVICE", "ollama").lower() # Default a ollama si no está definida
 print(f"Using LLM service: {LLM_SERVICE}") # Debug
+# Consumidor de Kafka embebido; desactivarlo cuando se usa el proceso dedicado (python -m app.consumer_main)
+KAFKA_CONSUMER_ENABLED = os.getenv("KAFKA_CONSUMER_ENABLED", "true").lower() in ("1", "true", "yes")
 # --- Fin Configuración ---
 
 # --- Eventos de inicio y parada de la aplicación ---
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     """Se ejecuta al iniciar la aplicación FastAPI"""
     print("Iniciando la aplicación...")
+
+    # Crear los clientes HTTP compartidos (pools keep-alive hacia Ollama y las APIs)
+    init_http_clients()
     
     # Iniciar el consumidor de Kafka
-    try:
-        print("Iniciando consumidor de Kafka...")
-        start_kafka_consumer()
-        print("Consumidor de Kafka iniciado con éxito.")
-    except Exception as e:
-        print(f"Error al iniciar el consumidor de Kafka: {e}")
+    if not KAFKA_CONSUMER_ENABLED:
+        print("Consumidor de Kafka embebido desactivado (KAFKA_CONSUMER_ENABLED=false).")
+    else:
+        try:
+            print("Iniciando consumidor de Kafka...")
+            start_kafka_consumer()
+            print("Consumidor de Kafka iniciado con éxito.")
+        except Exception as e:
+            print(f"Error al iniciar el consumidor de Kafka: {e}")
+
+    # Escuchar invalidaciones de la caché L1 de datos mensuales
+    start_invalidation_listener()
+
+    # Health checks de los hosts de Ollama del router (sólo si se usa Ollama)
+    if LLM_SERVICE == "ollama":
+        get_llm_router().start_health_checks()
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     """Se ejecuta al detener la aplicación FastAPI"""
     print("Deteniendo la aplicación...")
     
@@ -55,40 +84,246 @@ def shutdown_event():
         print("Consumidor de Kafka detenido con éxito.")
     except Exception as e:
         print(f"Error al detener el consumidor de Kafka: {e}")
+
+    stop_invalidation_listener()
+    await get_llm_router().stop_health_checks()
+
+    # Cerrar los pools HTTP y Redis compartidos
+    await close_http_clients()
+    await close_redis_clients()
 # --- Fin Eventos ---
 
+def _modelo_actual() -> str:
+    """Nombre del modelo que responde con el servicio LLM configurado."""
+    if LLM_SERVICE == "openai":
+        return os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    return OLLAMA_MODEL_NAME
+
+def _elegir_backend() -> str | None:
+    """
+    Backend que atiende la generación: el configurado en LLM_SERVICE o, con Ollama,
+    OpenAI como desborde si no quedan hosts sanos o la cola local está muy cargada.
+    None si LLM_SERVICE no es válido.
+    """
+    if LLM_SERVICE == "openai":
+        return "openai"
+    if LLM_SERVICE == "ollama":
+        if get_llm_router().should_overflow(get_llm_scheduler("ollama").queue_depth):
+            print("Ollama saturado, desbordando a OpenAI...")
+            return "openai"
+        return "ollama"
+    return None
+
+def _respuesta_saturado(error: LLMSaturatedError) -> JSONResponse:
+    """429/503 con Retry-After cuando el scheduler del LLM no acepta más trabajo."""
+    print(f"{error} (Retry-After: {error.retry_after}s)")
+    return JSONResponse(
+        status_code=error.status_code,
+        content={"error": "Servicio LLM saturado, reintenta más tarde.", "retry_after": error.retry_after},
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 @app.post("/preguntar")
 async def preguntar(request: Request):
     body = await request.json()
     rut = body.get("rut")
     pregunta = body.get("pregunta")
 
-    # Obtener datos de microservicios
-    compras = get_compras_cliente(rut)
-    ventas = get_ventas_cliente(rut)
+    datos = await get_monthly_data_cliente_async(rut)
+
+    # Preguntas que se calculan con los datos mensuales se responden sin LLM
+    respuesta = try_fast_answer(datos.frame, pregunta)
+    if respuesta is not None:
+        return {
+            "rut": rut,
+            "pregunta": pregunta,
+            "respuesta": respuesta,
+            "cached": False,
+            "fast_path": True
+        }
+
+    # Preguntas repetidas sobre los mismos datos se responden desde la caché
+    answer_key = build_answer_key(rut, datos.compras, datos.ventas, f"{LLM_SERVICE}:{_modelo_actual()}", pregunta)
+    respuesta = await get_cached_answer(answer_key)
+    if respuesta is not None:
+        return {
+            "rut": rut,
+            "pregunta": pregunta,
+            "respuesta": respuesta,
+            "cached": True
+        }
 
-    # Generar prompt
-    prompt = generar_prompt_iva(rut, compras, ventas, pregunta)
+    prompt = generar_prompt_iva(rut, datos.compras, datos.ventas, pregunta, datos.frame)
 
     # --- Seleccionar y enviar al servicio LLM configurado ---
     respuesta = ""
-    if LLM_SERVICE == "openai":
-        print("Routing to OpenAI...")
-        respuesta = consultar_openai(prompt)
-    elif LLM_SERVICE == "ollama":
-        print("Routing to Ollama...")
-        respuesta = consultar_llm(prompt)
-    else:
-        print(f"Error: Servicio LLM desconocido: {LLM_SERVICE}")
-        respuesta = f"Error: Servicio LLM '{LLM_SERVICE}' no configurado correctamente."
+    backend = _elegir_backend()
+    try:
+        if backend == "openai":
+            print("Routing to OpenAI...")
+            async with get_llm_scheduler("openai").slot(parse_priority(body.get("prioridad"))):
+                respuesta = await consultar_openai_async(prompt)
+        elif backend == "ollama":
+            print("Routing to Ollama...")
+            # El router toma el cupo de Ollama (y el de OpenAI si se desborda)
+            respuesta, backend = await get_llm_router().generate(prompt, parse_priority(body.get("prioridad")))
+        else:
+            print(f"Error: Servicio LLM desconocido: {LLM_SERVICE}")
+            respuesta = f"Error: Servicio LLM '{LLM_SERVICE}' no configurado correctamente."
+    except LLMSaturatedError as e:
+        return _respuesta_saturado(e)
     # --- Fin Selección LLM ---
 
+    # Las respuestas de desborde vienen de otro modelo: no se guardan bajo la clave del configurado
+    if backend == LLM_SERVICE:
+        await set_cached_answer(answer_key, respuesta)
+
     return {
         "rut": rut,
         "pregunta": pregunta,
-        "respuesta": respuesta
+        "respuesta": respuesta,
+        "cached": False
     }
 
+def _evento_sse(data: dict, event: str | None = None) -> str:
+    """Serializa un evento Server-Sent Events."""
+    linea_evento = f"event: {event}\n" if event else ""
+    return f"{linea_evento}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class _StreamConCupo(StreamingResponse):
+    """
+    StreamingResponse que al terminar llama a `liberar` (cierra el stream del LLM y
+    devuelve el cupo del scheduler), aunque el cliente se haya desconectado antes de
+    que empezara la iteración y el generador de eventos nunca haya corrido.
+    """
+
+    def __init__(self, content, liberar, **kwargs):
+        super().__init__(content, **kwargs)
+        self.liberar = liberar
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.liberar()
+
+@app.post("/preguntar/stream")
+async def preguntar_stream(request: Request):
+    """
+    Variante de /preguntar que entrega la respuesta como Server-Sent Events,
+    un evento por token a medida que el LLM los genera.
+    Si el cliente se desconecta se cierra el stream hacia el LLM, que deja de generar.
+    """
+    body = await request.json()
+    rut = body.get("rut")
+    pregunta = body.get("pregunta")
+
+    datos = await get_monthly_data_cliente_async(rut)
+
+    # Respuesta directa (sin LLM): se entrega como un único evento
+    respuesta = try_fast_answer(datos.frame, pregunta)
+    if respuesta is not None:
+        async def evento_directo():
+            yield _evento_sse({"token": respuesta})
+            yield _evento_sse({"rut": rut, "pregunta": pregunta, "fast_path": True}, "end")
+
+        return StreamingResponse(
+            evento_directo(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    prompt = generar_prompt_iva(rut, datos.compras, datos.ventas, pregunta, datos.frame)
+
+    backend = _elegir_backend()
+    if backend == "openai":
+        print("Routing stream to OpenAI...")
+        tokens = consultar_openai_stream(prompt)
+    elif backend == "ollama":
+        print("Routing stream to Ollama...")
+        tokens = get_llm_router().stream(prompt)
+    else:
+        print(f"Error: Servicio LLM desconocido: {LLM_SERVICE}")
+        tokens = None
+
+    # El cupo del scheduler se toma antes de responder (para poder devolver 429/503)
+    # y se libera cuando termina el stream
+    if tokens is not None:
+        scheduler = get_llm_scheduler(backend)
+        try:
+            started_at = await scheduler.acquire(parse_priority(body.get("prioridad")))
+        except LLMSaturatedError as e:
+            return _respuesta_saturado(e)
+
+    liberado = tokens is None
+
+    async def liberar():
+        """
+        Cierra el stream hacia el LLM y devuelve el cupo, una sola vez: lo llaman el
+        final de eventos() y el cierre de la respuesta, haya empezado o no la iteración.
+        """
+        nonlocal liberado
+        if liberado:
+            return
+        liberado = True
+        try:
+            # Cerrar el generador cierra la conexión con el LLM y cancela la generación
+            await tokens.aclose()
+        finally:
+            scheduler.release(started_at)
+
+    async def eventos():
+        if tokens is None:
+            yield _evento_sse({"error": f"Servicio LLM '{LLM_SERVICE}' no configurado correctamente."}, "error")
+            return
+        try:
+            async for token in tokens:
+                if await request.is_disconnected():
+                    print(f"[Stream] Cliente desconectado, cancelando generación para RUT {rut}")
+                    return
+                yield _evento_sse({"token": token})
+            yield _evento_sse({"rut": rut, "pregunta": pregunta}, "end")
+        finally:
+            await liberar()
+
+    return _StreamConCupo(
+        eventos(),
+        liberar,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/sesiones")
+async def sesiones_crear(request: Request):
+    """
+    Abre una sesión de preguntas sobre un RUT. El contexto tributario se envía al LLM
+    una sola vez; las preguntas siguientes de la sesión reutilizan el prefijo procesado.
+    """
+    body = await request.json()
+    rut = body.get("rut")
+    if not rut:
+        return JSONResponse(status_code=400, content={"error": "Proporciona 'rut'."})
+    if LLM_SERVICE not in ("openai", "ollama"):
+        return JSONResponse(status_code=500, content={"error": f"Servicio LLM '{LLM_SERVICE}' no configurado correctamente."})
+    return await crear_sesion(rut, LLM_SERVICE)
+
+@app.post("/sesiones/{session_id}/preguntar")
+async def sesiones_preguntar(session_id: str, request: Request):
+    body = await request.json()
+    try:
+        resultado = await preguntar_en_sesion(session_id, body.get("pregunta"), parse_priority(body.get("prioridad")))
+    except LLMSaturatedError as e:
+        return _respuesta_saturado(e)
+    if resultado is None:
+        return JSONResponse(status_code=404, content={"error": f"Sesión {session_id} no encontrada o expirada."})
+    return resultado
+
+@app.delete("/sesiones/{session_id}")
+async def sesiones_cerrar(session_id: str):
+    if not await cerrar_sesion(session_id):
+        return JSONResponse(status_code=404, content={"error": f"Sesión {session_id} no encontrada o expirada."})
+    return {"session_id": session_id, "closed": True}
+
 @app.post("/admin/update-cache")
 async def admin_update_cache(request: Request, background_tasks: BackgroundTasks):
     """Endpoint administrativo para actualizar la caché manualmente (en background)."""
@@ -96,12 +331,76 @@ async def admin_update_cache(request: Request, background_tasks: BackgroundTasks
     
     if "rut" in data:
         rut = data["rut"]
+        await register_business_async(rut)
         # Actualizar un solo RUT en background
         background_tasks.add_task(update_business_data, rut)
         return {"message": f"Actualizando caché para RUT {rut} en background."}
     elif data.get("all") is True:
         # Actualizar todos los RUTs en background
-        background_tasks.add_task(update_all_businesses)
+        background_tasks.add_task(update_all_businesses_async)
         return {"message": "Actualizando caché para todos los negocios en background."}
     else:
-        return {"error": "Formato incorrecto. Proporciona 'rut' para actualizar un negocio o 'all': true para actualizar todos."}
\ No newline at end of file
+        return {"error": "Formato incorrecto. Proporciona 'rut' para actualizar un negocio o 'all': true para actualizar todos."}
+
+def _texto_no_vacio(valor) -> bool:
+    return isinstance(valor, str) and bool(valor.strip())
+
+@app.post("/admin/batch-preguntas")
+async def admin_batch_preguntas(request: Request, background_tasks: BackgroundTasks):
+    """
+    Lanza un job de preguntas por lotes en background. Acepta 'items' (lista de
+    {rut, pregunta}) o 'ruts' + 'preguntas' (todas las preguntas para cada RUT).
+    Con un 'job_id' ya usado, el job se retoma desde su archivo de salida.
+    """
+    data = await request.json()
+    job_id = data.get("job_id") or uuid.uuid4().hex[:12]
+    if not isinstance(job_id, str) or not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", job_id):
+        return JSONResponse(status_code=400, content={"error": "job_id inválido (letras, números, '-' o '_')."})
+
+    if "items" in data:
+        if not isinstance(data["items"], list) or not all(
+            isinstance(item, dict) and _texto_no_vacio(item.get("rut")) and _texto_no_vacio(item.get("pregunta"))
+            for item in data["items"]
+        ):
+            return JSONResponse(status_code=400, content={"error": "Cada item debe tener 'rut' y 'pregunta'."})
+        items = [(item["rut"], item["pregunta"]) for item in data["items"]]
+    elif "ruts" in data and "preguntas" in data:
+        if not all(isinstance(data[campo], list) and all(map(_texto_no_vacio, data[campo]))
+                   for campo in ("ruts", "preguntas")):
+            return JSONResponse(status_code=400, content={"error": "'ruts' y 'preguntas' deben ser listas de textos."})
+        items = [(rut, pregunta) for rut in data["ruts"] for pregunta in data["preguntas"]]
+    else:
+        return JSONResponse(status_code=400, content={"error": "Proporciona 'items' o 'ruts' y 'preguntas'."})
+
+    job = get_batch_job(job_id)
+    if job is not None and job.running:
+        return JSONResponse(status_code=409, content={"error": f"El job {job_id} ya está corriendo."})
+    job = create_batch_job(job_id)
+    background_tasks.add_task(job.run, items)
+    return {"job_id": job_id, "output_path": job.output_path, "items": len(items)}
+
+@app.get("/admin/batch-preguntas/{job_id}")
+async def admin_batch_preguntas_estado(job_id: str):
+    """Avance de un job de preguntas por lotes lanzado en este proceso."""
+    job = get_batch_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job {job_id} no encontrado."})
+    return job.snapshot()
+
+@app.get("/admin/metrics")
+async def admin_metrics():
+    """Endpoint administrativo con métricas internas del proceso."""
+    return {
+        "redis_pool": get_pool_stats(),
+        "monthly_cache": get_monthly_cache_stats(),
+        "monthly_data": get_monthly_data_stats(),
+        "facturas": get_facturas_stats(),
+        "business_registry": {"size": await get_registry_size_async()},
+        "answer_cache": get_answer_cache_stats(),
+        "prompts": get_prompt_stats(),
+        "fast_answers": get_fast_answer_stats(),
+        "llm_scheduler": get_llm_scheduler_stats(),
+        "llm_router": get_llm_router().snapshot(),
+        "sessions": get_session_stats(),
+        "kafka_consumer": get_kafka_consumer_metrics()
+    }
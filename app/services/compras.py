@@ -2,6 +2,7 @@ import requests
 import os
 import json # Importar json para formatear la salida
 from typing import Dict, List, Optional
+from ..core.http_client import get_http_session, HTTP_TIMEOUT_SECONDS
 from .monthly_data import get_cached_monthly_data
 
 # Comentamos las definiciones a nivel de módulo que dependen de .env
@@ -32,7 +33,7 @@ def _get_monthly_data(rut: str):
         url = f"{api_url}/business/{rut}/monthly_sales"
         print(f"[Compras/Ventas] URL: {url}")
         print(f"[Compras/Ventas] HEADERS: {headers}")
-        r = requests.get(url, headers=headers)
+        r = get_http_session().get(url, headers=headers, timeout=HTTP_TIMEOUT_SECONDS)
         r.raise_for_status() # Lanza una excepción para errores HTTP (4xx o 5xx)
         data = r.json()
         if data.get("status") == "ok" and "total_last_months" in data:
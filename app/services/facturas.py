@@ -1,15 +1,87 @@
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional, Tuple
+from datetime import datetime
 import os
 import json
+import time
+import asyncio
 import httpx
-from redis import Redis
 
-from ..core.cache_updater import get_redis_client
+from ..core.http_client import get_async_http_client
+from ..core.redis_client import get_async_redis_client
+from ..core.metrics import Counters
+from ..core.local_cache import LocalTTLCache
+from ..core.singleflight import AsyncSingleFlight
+from ..core.daily_aggregates import DailyAggregates
 
 # Configuración del servicio de facturas
 FACTURAS_API_URL = os.getenv("FACTURAS_API_URL", "http://localhost:5000")
 FACTURAS_API_KEY = os.getenv("FACTURAS_API_KEY", "")
+FACTURAS_PAGE_TTL_SECONDS = int(os.getenv("FACTURAS_PAGE_TTL_SECONDS", str(5 * 60)))
+FACTURAS_RESUMEN_TTL_SECONDS = int(os.getenv("FACTURAS_RESUMEN_TTL_SECONDS", str(15 * 60)))
+# El contador de versión debe vivir más que cualquier entrada cacheada
+FACTURAS_VERSION_TTL_SECONDS = int(os.getenv("FACTURAS_VERSION_TTL_SECONDS", str(24 * 60 * 60)))
+# Páginas que iter_facturas_cliente descarga por adelantado
+FACTURAS_PREFETCH_PAGES = int(os.getenv("FACTURAS_PREFETCH_PAGES", "2"))
+# Resúmenes calculados localmente desde agregados diarios (facturas:agg:{rut})
+FACTURAS_AGG_ENABLED = os.getenv("FACTURAS_AGG_ENABLED", "true").lower() in ("1", "true", "yes")
+FACTURAS_AGG_TTL_SECONDS = int(os.getenv("FACTURAS_AGG_TTL_SECONDS", str(24 * 60 * 60)))
+FACTURAS_AGG_L1_TTL_SECONDS = float(os.getenv("FACTURAS_AGG_L1_TTL_SECONDS", "60"))
+FACTURAS_AGG_L1_MAX_ENTRIES = int(os.getenv("FACTURAS_AGG_L1_MAX_ENTRIES", "256"))
+# Campos de cada factura que alimentan los agregados
+FACTURAS_CAMPO_FECHA = os.getenv("FACTURAS_CAMPO_FECHA", "fecha")
+FACTURAS_CAMPO_MONTO = os.getenv("FACTURAS_CAMPO_MONTO", "monto")
+
+_stats = Counters("hits", "misses", "invalidations", "redis_errors",
+                  "agg_hits", "agg_misses", "agg_builds", "agg_build_errors")
+
+# (rut, versión) -> DailyAggregates ya indexados; la versión cambia al invalidar
+_agregados_l1 = LocalTTLCache(FACTURAS_AGG_L1_MAX_ENTRIES, FACTURAS_AGG_L1_TTL_SECONDS)
+_agg_singleflight = AsyncSingleFlight("facturas_agg")
+_agg_builds = set()
+
+# Cada entrada cacheada de un RUT guarda la versión del RUT (facturas:ver:{rut}) con
+# la que se armó. Invalidar es un INCR de la versión: las entradas anteriores dejan de
+# valer sin recorrer el keyspace con KEYS/SCAN, y se pisan o expiran por TTL.
+def get_facturas_version_key(rut: str) -> str:
+    return f"facturas:ver:{rut}"
+
+async def _get_version(redis_client, rut: str) -> int:
+    version = await redis_client.get(get_facturas_version_key(rut))
+    return int(version) if version else 0
+
+async def _get_cached(redis_client, rut: str, suffix: str, prefix: str = "facturas"):
+    """
+    Devuelve (clave, versión vigente del RUT, datos cacheados o None). La versión y la
+    entrada se leen en un mismo pipeline (un round trip); la entrada sólo vale si se
+    guardó con la versión vigente. Con Redis caído, (None, None, None).
+    """
+    cache_key = f"{prefix}:{rut}{suffix}"
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(get_facturas_version_key(rut))
+        pipe.get(cache_key)
+        version, cached_data = await pipe.execute()
+    except Exception as e:
+        print(f"[Facturas] Error al leer caché de RUT {rut}: {e}")
+        _stats.incr("redis_errors")
+        return None, None, None
+    version = int(version) if version else 0
+    if cached_data:
+        entrada = json.loads(cached_data)
+        if entrada.get("v") == version:
+            _stats.incr("hits")
+            return cache_key, version, entrada["data"]
+    _stats.incr("misses")
+    return cache_key, version, None
+
+async def _set_cached(redis_client, cache_key: Optional[str], version: Optional[int], data: Dict, ttl_seconds: int) -> None:
+    if cache_key is None:
+        return
+    try:
+        await redis_client.set(cache_key, json.dumps({"v": version, "data": data}), ex=ttl_seconds)
+    except Exception as e:
+        print(f"[Facturas] Error al guardar {cache_key}: {e}")
+        _stats.incr("redis_errors")
 
 async def get_facturas_cliente(
     rut: str,
@@ -31,18 +103,46 @@ async def get_facturas_cliente(
     Returns:
         Dict con las facturas y metadata de paginación
     """
-    # Construir key para caché
-    cache_key = f"facturas:{rut}:p{page}:pp{per_page}"
+    try:
+        return await _get_pagina_facturas(rut, page, per_page, start_date, end_date)
+    except httpx.HTTPError as e:
+        print(f"Error al obtener facturas desde la API: {e}")
+        return {
+            "facturas": [],
+            "metadata": {
+                "page": page,
+                "per_page": per_page,
+                "total_docs": 0,
+                "total_pages": 0
+            }
+        }
+
+async def _get_pagina_facturas(
+    rut: str,
+    page: int,
+    per_page: int,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    cache: bool = True
+) -> Dict:
+    """
+    Una página de facturas (caché o API). Con cache=False se pide directo a la API y
+    no se guarda (recorridos completos del historial). Lanza httpx.HTTPError si la API falla.
+    """
+    # Construir sufijo de la key para caché
+    suffix = f":p{page}:pp{per_page}"
     if start_date:
-        cache_key += f":sd{start_date.strftime('%Y%m%d')}"
+        suffix += f":sd{start_date.strftime('%Y%m%d')}"
     if end_date:
-        cache_key += f":ed{end_date.strftime('%Y%m%d')}"
+        suffix += f":ed{end_date.strftime('%Y%m%d')}"
     
     # Intentar obtener de caché
-    redis_client = get_redis_client()
-    cached_data = redis_client.get(cache_key)
-    if cached_data:
-        return json.loads(cached_data)
+    redis_client = get_async_redis_client()
+    cache_key = version = None
+    if cache:
+        cache_key, version, cached_data = await _get_cached(redis_client, rut, suffix)
+        if cached_data is not None:
+            return cached_data
     
     # Preparar parámetros para la API
     params = {
@@ -62,37 +162,86 @@ async def get_facturas_cliente(
         "Content-Type": "application/json"
     }
     
+    # Hacer request a la API de facturas (cliente compartido, con keep-alive)
+    response = await get_async_http_client().get(
+        f"{FACTURAS_API_URL}/api/facturas",
+        params=params,
+        headers=headers
+    )
+    response.raise_for_status()
+    data = response.json()
+    
+    # Guardar en caché (5 minutos por defecto)
+    await _set_cached(redis_client, cache_key, version, data, FACTURAS_PAGE_TTL_SECONDS)
+    
+    return data
+
+def _parse_cursor(cursor: Optional[str]) -> Tuple[int, int]:
+    """Cursor 'página:índice' -> (página, índice dentro de la página). Sin cursor: (1, 0)."""
+    if not cursor:
+        return 1, 0
     try:
-        # Hacer request a la API de facturas
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{FACTURAS_API_URL}/api/facturas",
-                params=params,
-                headers=headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Guardar en caché por 5 minutos
-            redis_client.setex(
-                cache_key,
-                timedelta(minutes=5),
-                json.dumps(data)
-            )
-            
-            return data
-            
-    except httpx.HTTPError as e:
-        print(f"Error al obtener facturas desde la API: {e}")
-        return {
-            "facturas": [],
-            "metadata": {
-                "page": page,
-                "per_page": per_page,
-                "total_docs": 0,
-                "total_pages": 0
-            }
-        }
+        page, index = (int(parte) for parte in cursor.split(":"))
+    except ValueError:
+        raise ValueError(f"Cursor de facturas inválido: {cursor!r}")
+    if page < 1 or index < 0:
+        raise ValueError(f"Cursor de facturas inválido: {cursor!r}")
+    return page, index
+
+async def iter_facturas_cliente(
+    rut: str,
+    per_page: int = 100,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    prefetch: int = FACTURAS_PREFETCH_PAGES,
+    cache: bool = True
+) -> AsyncIterator[Tuple[Dict, str]]:
+    """
+    Recorre todo el historial de facturas de un cliente, página por página.
+
+    Entrega tuplas (factura, cursor): el cursor permite retomar el recorrido justo
+    después de esa factura (pasarlo como `cursor` con los mismos filtros y per_page).
+    Mientras se consume una página se descargan hasta `prefetch` páginas siguientes,
+    así que la memoria usada no depende del largo del historial. Con cache=False las
+    páginas no se leen ni se guardan en la caché de páginas.
+
+    A diferencia de get_facturas_cliente, un error de la API no se confunde con el
+    fin de los datos: se lanza httpx.HTTPError y el recorrido se retoma con el último cursor.
+    """
+    page, skip = _parse_cursor(cursor)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(prefetch, 1))
+
+    async def descargar() -> None:
+        numero = page
+        try:
+            while True:
+                data = await _get_pagina_facturas(rut, numero, per_page, start_date, end_date, cache)
+                facturas = data.get("facturas") or []
+                await queue.put((numero, facturas))
+                total_pages = (data.get("metadata") or {}).get("total_pages")
+                ultima = numero >= total_pages if total_pages is not None else len(facturas) < per_page
+                if not facturas or ultima:
+                    await queue.put(None)
+                    return
+                numero += 1
+        except Exception as e:
+            await queue.put(e)
+
+    productor = asyncio.create_task(descargar())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            numero, facturas = item
+            inicio = skip if numero == page else 0
+            for index in range(inicio, len(facturas)):
+                yield facturas[index], f"{numero}:{index + 1}"
+    finally:
+        productor.cancel()
 
 async def get_resumen_facturas(
     rut: str,
@@ -110,18 +259,30 @@ async def get_resumen_facturas(
     Returns:
         Dict con estadísticas agregadas
     """
-    # Construir key para caché
-    cache_key = f"facturas:resumen:{rut}"
+    # Con los agregados diarios del RUT cualquier rango se responde sin llamar a la API
+    if FACTURAS_AGG_ENABLED:
+        agregados = await _get_agregados(rut)
+        if agregados is not None:
+            _stats.incr("agg_hits")
+            return agregados.summary(
+                start_date.strftime("%Y-%m-%d") if start_date else None,
+                end_date.strftime("%Y-%m-%d") if end_date else None,
+            )
+        _stats.incr("agg_misses")
+        _construir_agregados_en_background(rut)
+
+    # Construir sufijo de la key para caché
+    suffix = ""
     if start_date:
-        cache_key += f":sd{start_date.strftime('%Y%m%d')}"
+        suffix += f":sd{start_date.strftime('%Y%m%d')}"
     if end_date:
-        cache_key += f":ed{end_date.strftime('%Y%m%d')}"
+        suffix += f":ed{end_date.strftime('%Y%m%d')}"
     
     # Intentar obtener de caché
-    redis_client = get_redis_client()
-    cached_data = redis_client.get(cache_key)
-    if cached_data:
-        return json.loads(cached_data)
+    redis_client = get_async_redis_client()
+    cache_key, version, cached_data = await _get_cached(redis_client, rut, suffix, prefix="facturas:resumen")
+    if cached_data is not None:
+        return cached_data
     
     # Preparar parámetros para la API
     params = {"rut": rut}
@@ -137,25 +298,20 @@ async def get_resumen_facturas(
     }
     
     try:
-        # Hacer request a la API de facturas
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{FACTURAS_API_URL}/api/facturas/resumen",
-                params=params,
-                headers=headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Guardar en caché por 15 minutos
-            redis_client.setex(
-                cache_key,
-                timedelta(minutes=15),
-                json.dumps(data)
-            )
-            
-            return data
-            
+        # Hacer request a la API de facturas (cliente compartido, con keep-alive)
+        response = await get_async_http_client().get(
+            f"{FACTURAS_API_URL}/api/facturas/resumen",
+            params=params,
+            headers=headers
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        # Guardar en caché (15 minutos por defecto)
+        await _set_cached(redis_client, cache_key, version, data, FACTURAS_RESUMEN_TTL_SECONDS)
+        
+        return data
+        
     except httpx.HTTPError as e:
         print(f"Error al obtener resumen de facturas desde la API: {e}")
         return {
@@ -167,21 +323,100 @@ async def get_resumen_facturas(
             "facturas_por_mes": []
         }
 
+def get_facturas_agg_key(rut: str) -> str:
+    return f"facturas:agg:{rut}"
+
+async def _get_agregados(rut: str) -> Optional[DailyAggregates]:
+    """Agregados diarios del RUT si existen y corresponden a su versión actual."""
+    try:
+        redis_client = get_async_redis_client()
+        version = await _get_version(redis_client, rut)
+        agregados = _agregados_l1.get((rut, version))
+        if agregados is not None:
+            return agregados
+        data = await redis_client.hgetall(get_facturas_agg_key(rut))
+    except Exception as e:
+        print(f"[Facturas] Error al leer agregados de RUT {rut}: {e}")
+        _stats.incr("redis_errors")
+        return None
+    if not data or data.get("_version") != str(version):
+        return None
+    agregados = DailyAggregates.from_hash(data)
+    _agregados_l1.set((rut, version), agregados)
+    return agregados
+
+async def construir_agregados_facturas(rut: str) -> DailyAggregates:
+    """
+    Recorre todo el historial de facturas del RUT (página por página, sin pasar por la
+    caché de páginas: ninguna se vuelve a leer) y guarda sus agregados diarios en Redis,
+    marcados con la versión vigente del RUT.
+    """
+    redis_client = get_async_redis_client()
+    version = await _get_version(redis_client, rut)
+    agregados = DailyAggregates()
+    async for factura, _ in iter_facturas_cliente(rut, cache=False):
+        fecha = factura.get(FACTURAS_CAMPO_FECHA)
+        if fecha:
+            agregados.add(str(fecha), float(factura.get(FACTURAS_CAMPO_MONTO) or 0))
+
+    key = get_facturas_agg_key(rut)
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.hset(key, mapping={**agregados.to_hash(), "_version": version, "_built_at": time.time()})
+    pipe.expire(key, FACTURAS_AGG_TTL_SECONDS)
+    await pipe.execute()
+    _agregados_l1.set((rut, version), agregados)
+    _stats.incr("agg_builds")
+    print(f"[Facturas] Agregados de RUT {rut} construidos: {len(agregados)} días")
+    return agregados
+
+async def _construir_agregados_seguro(rut: str) -> None:
+    try:
+        await construir_agregados_facturas(rut)
+    except Exception as e:
+        print(f"[Facturas] Error al construir agregados de RUT {rut}: {e}")
+        _stats.incr("agg_build_errors")
+
+def _construir_agregados_en_background(rut: str) -> None:
+    """Lanza la construcción de los agregados del RUT, salvo que ya haya una en curso."""
+    if _agg_singleflight.in_flight(rut):
+        return
+    task = asyncio.ensure_future(_agg_singleflight.do(rut, lambda: _construir_agregados_seguro(rut)))
+    _agg_builds.add(task)
+    task.add_done_callback(_agg_builds.discard)
+
+async def invalidar_cache_facturas(rut: str) -> int:
+    """
+    Invalida todas las páginas y resúmenes cacheados de un RUT en O(1): sube su
+    versión, con lo que las claves anteriores ya no se leen y expiran por TTL.
+
+    Returns:
+        La nueva versión del RUT
+    """
+    redis_client = get_async_redis_client()
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.incr(get_facturas_version_key(rut))
+    pipe.expire(get_facturas_version_key(rut), FACTURAS_VERSION_TTL_SECONDS)
+    version, _ = await pipe.execute()
+    _stats.incr("invalidations")
+    return version
+
 async def actualizar_cache_facturas(rut: str) -> None:
     """
     Actualiza la caché de facturas para un cliente específico.
     """
-    # Limpiar todas las claves de caché relacionadas con este RUT
-    redis_client = get_redis_client()
-    pattern = f"facturas:{rut}:*"
-    
-    # Obtener todas las claves que coinciden con el patrón
-    keys = redis_client.keys(pattern)
+    # Descartar todas las claves de caché relacionadas con este RUT (páginas y resúmenes)
+    await invalidar_cache_facturas(rut)
     
-    # Eliminar todas las claves encontradas
-    if keys:
-        redis_client.delete(*keys)
-    
-    # Pre-cachear la primera página y el resumen
+    # Pre-cachear la primera página y el resumen (con agregados, reconstruyéndolos)
     await get_facturas_cliente(rut, page=1)
-    await get_resumen_facturas(rut) 
\ No newline at end of file
+    if FACTURAS_AGG_ENABLED:
+        await _agg_singleflight.do(rut, lambda: _construir_agregados_seguro(rut))
+    else:
+        await get_resumen_facturas(rut)
+
+def get_facturas_stats() -> Dict:
+    stats = _stats.snapshot()
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
@@ -1,28 +1,54 @@
 import os
-import json
+from functools import cached_property
 from typing import Dict, Optional, List
-from datetime import datetime, timedelta
+import time
+import asyncio
 import requests
-from redis import Redis
+import httpx
+from redis.exceptions import LockError
+
+from ..core.http_client import get_async_http_client, get_http_session, HTTP_TIMEOUT_SECONDS
+from ..core.redis_client import get_async_redis_client
+from ..core.metrics import Counters
+from ..core.singleflight import AsyncSingleFlight
+from ..core.monthly_frame import MonthlyFrame, CAMPOS_COMPRAS, CAMPOS_VENTAS
+from ..core.monthly_cache import (
+    get_monthly_cache_entry, set_monthly_cache,
+    get_monthly_cache_entry_async, get_monthly_cache_entries_async, set_monthly_cache_async,
+    get_monthly_lock_key
+)
 
 # Configuración
 API_URL = os.getenv("MONTHLY_SALES_API_URL", "http://localhost:5001")
 API_TOKEN = os.getenv("BUSINESS_INVOICES_TOKEN")
+# Lock distribuido para que un solo worker llame a la API por RUT
+MONTHLY_LOCK_TIMEOUT_SECONDS = float(os.getenv("MONTHLY_LOCK_TIMEOUT_SECONDS", "30"))
+MONTHLY_LOCK_POLL_SECONDS = float(os.getenv("MONTHLY_LOCK_POLL_SECONDS", "0.1"))
+
+# Una sola llamada a la API por RUT dentro del proceso
+_singleflight = AsyncSingleFlight("monthly_data")
+# Referencias a los refrescos en background (evita que el GC los recolecte)
+_background_refreshes = set()
+_stats = Counters("stale_served", "background_refreshes", "lock_waits", "lock_wait_timeouts")
 
-def get_redis_client() -> Redis:
+class MonthlyData:
     """
-    Obtiene una instancia del cliente Redis.
+    Datos mensuales de un cliente como MonthlyFrame (lo usan el camino rápido y los
+    indicadores del prompt). Las filas de compras y ventas se arman desde las columnas
+    del frame sólo si alguien las pide (tablas del prompt, clave de la caché de
+    respuestas). frame es None si no se pudieron obtener los datos.
     """
-    redis_host = os.getenv("REDIS_HOST", "localhost")
-    redis_port = int(os.getenv("REDIS_PORT", "6379"))
-    redis_db = int(os.getenv("REDIS_DB", "0"))
-    
-    return Redis(
-        host=redis_host,
-        port=redis_port,
-        db=redis_db,
-        decode_responses=True
-    )
+
+    def __init__(self, frame: Optional[MonthlyFrame]):
+        self.frame = frame
+
+    @cached_property
+    def compras(self) -> Optional[List[Dict]]:
+        return self.frame.records(CAMPOS_COMPRAS) if self.frame is not None else None
+
+    @cached_property
+    def ventas(self) -> Optional[List[Dict]]:
+        return self.frame.records(CAMPOS_VENTAS) if self.frame is not None else None
 
 def _get_monthly_data_from_api(rut: str) -> Optional[List[Dict]]:
     """
@@ -46,7 +72,7 @@ def _get_monthly_data_from_api(rut: str) -> Optional[List[Dict]]:
     try:
         url = f"{API_URL}/business/{rut}/monthly_sales"
         print(f"[Monthly Data] URL: {url}")
-        r = requests.get(url, headers=headers)
+        r = get_http_session().get(url, headers=headers, timeout=HTTP_TIMEOUT_SECONDS)
         r.raise_for_status()
         data = r.json()
         
@@ -63,6 +89,48 @@ def _get_monthly_data_from_api(rut: str) -> Optional[List[Dict]]:
         print(f"[Monthly Data] Error inesperado: {e}")
         return None
 
+async def fetch_monthly_sales_async(rut: str) -> Optional[List[Dict]]:
+    """
+    Pide los datos mensuales de un RUT a la API con el cliente httpx compartido.
+    Los errores de red y HTTP se propagan (httpx.TransportError / httpx.HTTPStatusError)
+    para que quien llama decida si reintentar; una respuesta sin datos devuelve None.
+    """
+    headers = {
+        "Authorization": f"Token {API_TOKEN}",
+        "Content-Type": "application/json"
+    }
+    r = await get_async_http_client().get(f"{API_URL}/business/{rut}/monthly_sales", headers=headers)
+    r.raise_for_status()
+    data = r.json()
+    if data.get("status") == "ok" and "total_last_months" in data:
+        return data["total_last_months"]
+    print(f"[Monthly Data] Respuesta inesperada de la API para RUT {rut}: {data}")
+    return None
+
+async def _get_monthly_data_from_api_async(rut: str) -> Optional[List[Dict]]:
+    """
+    Versión asíncrona de _get_monthly_data_from_api usando el cliente httpx compartido.
+    
+    Args:
+        rut: RUT del cliente
+    
+    Returns:
+        Lista de diccionarios con datos mensuales o None si hay error
+    """
+    if not API_TOKEN:
+        print("[Monthly Data] Error: La variable de entorno BUSINESS_INVOICES_TOKEN no está definida.")
+        return None
+
+    try:
+        print(f"[Monthly Data] URL: {API_URL}/business/{rut}/monthly_sales")
+        return await fetch_monthly_sales_async(rut)
+    except httpx.HTTPError as e:
+        print(f"[Monthly Data] Error al conectar con la API: {e}")
+        return None
+    except Exception as e:
+        print(f"[Monthly Data] Error inesperado: {e}")
+        return None
+
 def get_business_data(rut: str) -> Optional[List[Dict]]:
     """
     Obtiene los datos del negocio, primero intentando desde la caché,
@@ -74,27 +142,114 @@ def get_business_data(rut: str) -> Optional[List[Dict]]:
     Returns:
         Lista de diccionarios con datos mensuales o None si hay error
     """
-    redis_client = get_redis_client()
-    cache_key = f"business:monthly:{rut}"
-    
-    # Intentar obtener de caché
-    cached_data = redis_client.get(cache_key)
-    if cached_data:
-        return json.loads(cached_data)
+    # Intentar obtener de caché (si el dato está vencido se vuelve a pedir a la API)
+    entry = get_monthly_cache_entry(rut)
+    if entry is not None and not entry.is_stale:
+        return entry.data
     
     # Si no está en caché, obtener de la API
     data = _get_monthly_data_from_api(rut)
     
     # Si obtuvimos datos, guardar en caché
     if data is not None:
-        redis_client.setex(
-            cache_key,
-            timedelta(minutes=15),
-            json.dumps(data)
-        )
+        set_monthly_cache(rut, data)
+    elif entry is not None:
+        # La API falló: mejor un dato vencido que ninguno
+        return entry.data
     
     return data
 
+async def get_monthly_frame_async(rut: str) -> Optional[MonthlyFrame]:
+    """
+    Versión asíncrona de get_business_data, que entrega los meses como MonthlyFrame:
+    no bloquea el event loop mientras espera a Redis o a la API, y en los hits del
+    L1 reutiliza el frame ya armado.
+    
+    - Si el dato está fresco se devuelve directamente.
+    - Si está vencido se devuelve igual y se lanza un único refresco en background
+      (stale-while-revalidate).
+    - Si no está, las llamadas concurrentes por el mismo RUT comparten una sola
+      llamada a la API (single-flight en el proceso + lock en Redis entre workers).
+    
+    Args:
+        rut: RUT del cliente
+    
+    Returns:
+        MonthlyFrame del RUT o None si hay error
+    """
+    # Intentar obtener de caché
+    entry = await get_monthly_cache_entry_async(rut)
+    if entry is not None:
+        if entry.is_stale:
+            _stats.incr("stale_served")
+            _refrescar_en_background(rut)
+        return entry.frame
+    
+    # Si no está en caché, obtener de la API (una sola vez por RUT)
+    return await _singleflight.do(rut, lambda: _cargar_desde_api(rut))
+
+async def _cargar_desde_api(rut: str) -> Optional[MonthlyFrame]:
+    """
+    Obtiene los datos de la API y los guarda en caché, coordinando con los demás
+    workers mediante un lock en Redis. Si otro worker tiene el lock, espera a que
+    deje el dato en caché en lugar de repetir la llamada. El frame se arma una vez y
+    lo comparten todos los que esperaban el single-flight.
+    """
+    redis_client = get_async_redis_client()
+    lock = redis_client.lock(get_monthly_lock_key(rut), timeout=MONTHLY_LOCK_TIMEOUT_SECONDS, blocking=False)
+    
+    try:
+        acquired = await lock.acquire()
+    except Exception as e:
+        print(f"[Monthly Data] No se pudo tomar el lock para RUT {rut}: {e}")
+        acquired = False
+    else:
+        if not acquired:
+            frame = await _esperar_otro_worker(rut)
+            if frame is not None:
+                return frame
+    
+    try:
+        data = await _get_monthly_data_from_api_async(rut)
+        if data is None:
+            return None
+        await set_monthly_cache_async(rut, data)
+        return MonthlyFrame.from_api(data)
+    finally:
+        if acquired:
+            try:
+                await lock.release()
+            except LockError:
+                # El lock expiró antes de terminar; otro worker ya pudo tomarlo
+                pass
+
+async def _esperar_otro_worker(rut: str) -> Optional[MonthlyFrame]:
+    """Espera (hasta el timeout del lock) a que otro worker deje datos frescos en caché."""
+    _stats.incr("lock_waits")
+    deadline = time.monotonic() + MONTHLY_LOCK_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(MONTHLY_LOCK_POLL_SECONDS)
+        entry = await get_monthly_cache_entry_async(rut)
+        if entry is not None and not entry.is_stale:
+            return entry.frame
+    _stats.incr("lock_wait_timeouts")
+    return None
+
+def _refrescar_en_background(rut: str) -> None:
+    """Lanza un refresco del RUT en background, salvo que ya haya uno en curso."""
+    if _singleflight.in_flight(rut):
+        return
+    _stats.incr("background_refreshes")
+    task = asyncio.ensure_future(_singleflight.do(rut, lambda: _cargar_desde_api(rut)))
+    _background_refreshes.add(task)
+    task.add_done_callback(_background_refreshes.discard)
+
+def get_monthly_data_stats() -> Dict:
+    """Métricas de coalescing y stale-while-revalidate de los datos mensuales."""
+    stats = _stats.snapshot()
+    stats["singleflight"] = _singleflight.snapshot()
+    return stats
+
 def get_cached_monthly_data(rut: str, data_type: str) -> Dict:
     """
     Obtiene y procesa los datos mensuales específicos (compras o ventas).
@@ -117,35 +272,62 @@ def get_cached_monthly_data(rut: str, data_type: str) -> Dict:
         print(f"[Monthly Data] No se pudieron obtener datos para RUT {rut}")
         return None
     
-    # Procesar datos según el tipo
-    result_data = []
-    for month in monthly_data:
-        if data_type == 'compras':
-            info = {
-                "period": month.get("period"),
-                "total_purchases": month.get("total_purchases"),
-                "total_purchases_discount_document": month.get("total_purchases_discount_document"),
-                "total_purchases_exempt": month.get("total_purchases_exempt"),
-                "total_purchases_iva": month.get("total_purchases_iva"),
-                "total_purchases_net_with_exempt_purchases": month.get("total_purchases_net_with_exempt_purchases"),
-                "total_purchases_neto": month.get("total_purchases_neto"),
-                "total_purchases_tax_common_use": month.get("total_purchases_tax_common_use"),
-                "total_purchases_tax_no_recoverable": month.get("total_purchases_tax_no_recoverable"),
-                "total_purchases_tax_recoverable": month.get("total_purchases_tax_recoverable"),
-            }
-        else:  # ventas
-            info = {
-                "period": month.get("period"),
-                "total_sales": month.get("total_sales"),
-                "total_sales_discount_document": month.get("total_sales_discount_document"),
-                "total_sales_exempt": month.get("total_sales_exempt"),
-                "total_sales_iva": month.get("total_sales_iva"),
-                "total_sales_net_with_exempt_sales": month.get("total_sales_net_with_exempt_sales"),
-                "total_sales_neto": month.get("total_sales_neto"),
-                "total_sales_tax_common_use": month.get("total_sales_tax_common_use"),
-                "total_sales_tax_no_recoverable": month.get("total_sales_tax_no_recoverable"),
-                "total_sales_tax_recoverable": month.get("total_sales_tax_recoverable"),
-            }
-        result_data.append(info)
-    
-    return result_data 
\ No newline at end of file
+    return MonthlyFrame.from_api(monthly_data).records(CAMPOS_COMPRAS if data_type == 'compras' else CAMPOS_VENTAS)
+
+async def get_monthly_data_cliente_async(rut: str) -> MonthlyData:
+    """
+    Compras, ventas y MonthlyFrame de un cliente con una sola lectura de los datos
+    mensuales (L1, Redis o la API si no están en caché).
+    
+    Args:
+        rut: RUT del cliente
+    
+    Returns:
+        MonthlyData (frame y filas de compras y ventas); frame None si no se pudieron obtener los datos
+    """
+    frame = await get_monthly_frame_async(rut)
+    
+    if frame is None:
+        print(f"[Monthly Data] No se pudieron obtener datos para RUT {rut}")
+    
+    return MonthlyData(frame)
+
+async def get_monthly_data_clientes_async(
+    ruts: List[str],
+    concurrency: int = 16
+) -> Dict[str, MonthlyData]:
+    """
+    Versión por lotes de get_monthly_data_cliente_async: lee todos los RUTs de la
+    caché con un MGET y completa los que faltan desde la API, `concurrency` a la vez.
+    
+    Args:
+        ruts: RUTs de los clientes
+        concurrency: Llamadas simultáneas a la API para los RUTs que no están en caché
+    
+    Returns:
+        Diccionario RUT -> MonthlyData; frame None si no se pudieron obtener
+    """
+    entries = await get_monthly_cache_entries_async(ruts)
+    frames: Dict[str, Optional[MonthlyFrame]] = {}
+    faltantes = []
+    for rut, entry in entries.items():
+        if entry is None:
+            faltantes.append(rut)
+            continue
+        if entry.is_stale:
+            _stats.incr("stale_served")
+            _refrescar_en_background(rut)
+        frames[rut] = entry.frame
+
+    semaforo = asyncio.Semaphore(concurrency)
+
+    async def completar(rut: str) -> None:
+        async with semaforo:
+            frames[rut] = await _singleflight.do(rut, lambda: _cargar_desde_api(rut))
+
+    await asyncio.gather(*(completar(rut) for rut in faltantes))
+
+    for rut, frame in frames.items():
+        if frame is None:
+            print(f"[Monthly Data] No se pudieron obtener datos para RUT {rut}")
+    return {rut: MonthlyData(frame) for rut, frame in frames.items()}
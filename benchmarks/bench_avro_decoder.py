@@ -0,0 +1,100 @@
+"""
+Benchmark de decodificación de eventos businesses.fct.Update.
+
+Compara la decodificación completa con VALUE_SCHEMA (lo que hace AvroDeserializer)
+con BusinessEventDecoder en modo proyección. Usa payloads grabados (un mensaje
+por línea, en hex, con el encabezado de Confluent) o, si no se pasan, genera
+payloads sintéticos con muchos users/messagePreferences/settings.
+
+Uso:
+    python -m benchmarks.bench_avro_decoder --messages 5000 --users 20
+    python -m benchmarks.bench_avro_decoder --payloads grabados.hex
+"""
+import argparse
+import io
+import json
+import time
+
+from fastavro import parse_schema, schemaless_reader, schemaless_writer
+
+from app.core.avro_decoder import BusinessEventDecoder, WIRE_HEADER, MAGIC_BYTE
+from app.core.kafka_consumer import VALUE_SCHEMA
+
+SCHEMA_ID = 1
+
+def evento(business_id: int, users: int, settings: int) -> dict:
+    return {
+        "businessId": business_id, "actionType": "update", "rut": f"{76000000 + business_id}-1",
+        "mobileDefaultChannel": "whatsapp", "name": "Negocio", "team": None, "fantasyName": "Fantasía",
+        "legalName": "Negocio SpA", "phone": "+56900000000", "email": "a@b.cl", "address": "Calle 1",
+        "commune": "Santiago", "economicActivity": "Comercio", "status": 1, "adminUserId": 1,
+        "clientDocumentDayExpiration": 30, "providerDocumentDayExpiration": 30, "deletedAt": None,
+        "adminUser": {"adminUserId": 1, "name": "Admin", "email": "admin@b.cl"},
+        "subscriptions": [{"subscriptionId": 1, "active": True, "planId": 2, "deletedAt": None}],
+        "users": [{
+            "userId": u, "rut": None, "role": "admin", "uid": f"uid-{u}", "name": f"Usuario {u}",
+            "email": f"u{u}@b.cl", "phone": None,
+            "messagePreferences": [{
+                "userId": u, "channels": ["email", "whatsapp"], "subscribed": True,
+                "messagesEventId": e, "eventName": f"evento-{e}"
+            } for e in range(5)]
+        } for u in range(users)],
+        "settings": [{
+            "settingId": s, "active": True, "key": f"k{s}", "name": f"setting {s}",
+            "value": s, "visualized": False, "businessId": business_id
+        } for s in range(settings)],
+    }
+
+def generar(messages: int, users: int, settings: int) -> list:
+    schema = parse_schema(json.loads(VALUE_SCHEMA))
+    payloads = []
+    for i in range(messages):
+        buf = io.BytesIO()
+        buf.write(WIRE_HEADER.pack(MAGIC_BYTE, SCHEMA_ID))
+        schemaless_writer(buf, schema, evento(i, users, settings))
+        payloads.append(buf.getvalue())
+    return payloads
+
+class RegistryFijo:
+    """Schema Registry falso que siempre devuelve VALUE_SCHEMA."""
+    class _Schema:
+        schema_str = VALUE_SCHEMA
+
+    def get_schema(self, schema_id):
+        return self._Schema()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payloads", help="archivo con un payload en hex por línea")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--settings", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.payloads:
+        with open(args.payloads) as f:
+            payloads = [bytes.fromhex(line.strip()) for line in f if line.strip()]
+    else:
+        payloads = generar(args.messages, args.users, args.settings)
+    print(f"{len(payloads)} payloads, {sum(map(len, payloads)) / len(payloads):.0f} bytes promedio")
+
+    writer = parse_schema(json.loads(VALUE_SCHEMA))
+    start = time.perf_counter()
+    for value in payloads:
+        buf = io.BytesIO(value)
+        buf.seek(WIRE_HEADER.size)
+        schemaless_reader(buf, writer)
+    completo = time.perf_counter() - start
+
+    decoder = BusinessEventDecoder(RegistryFijo(), fallback_writer_schema=VALUE_SCHEMA)
+    start = time.perf_counter()
+    for value in payloads:
+        decoder.decode("businesses.fct.update.0", value)
+    proyeccion = time.perf_counter() - start
+
+    print(f"completo:   {1e6 * completo / len(payloads):8.1f} us/msg")
+    print(f"proyección: {1e6 * proyeccion / len(payloads):8.1f} us/msg  (x{completo / proyeccion:.1f})")
+    print(f"estadísticas del decodificador: {decoder.stats.snapshot()}")
+
+if __name__ == "__main__":
+    main()
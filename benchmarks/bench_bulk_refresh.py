@@ -0,0 +1,54 @@
+"""
+Benchmark del refresco masivo de caché contra una API monthly_sales stub.
+
+Compara el recorrido secuencial anterior (update_business_data por RUT, con
+requests bloqueante) con BulkRefresher (concurrente, token bucket y escrituras
+en pipeline) y reporta RUTs/s.
+
+Requiere un Redis local (docker compose up redis).
+
+Uso:
+    python -m benchmarks.bench_bulk_refresh --ruts 500 --concurrency 32 --rate 0
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stubs import StubServer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ruts", type=int, default=500)
+    parser.add_argument("--sequential-ruts", type=int, default=50, help="RUTs para el recorrido secuencial")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=0, help="llamadas/s a la API (0 = sin límite)")
+    parser.add_argument("--api-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    stub = StubServer(api_delay=args.api_delay).start()
+    os.environ["MONTHLY_SALES_API_URL"] = stub.url
+    os.environ.setdefault("BUSINESS_INVOICES_TOKEN", "bench")
+
+    from app.core.cache_updater import update_business_data
+    from app.core.bulk_refresh import BulkRefresher
+
+    ruts = [f"{76000000 + i}-{i % 10}" for i in range(args.ruts)]
+    try:
+        start = time.perf_counter()
+        for rut in ruts[:args.sequential_ruts]:
+            update_business_data(rut)
+        secuencial = args.sequential_ruts / (time.perf_counter() - start)
+
+        refresher = BulkRefresher(concurrency=args.concurrency, rate=args.rate, progress_seconds=2)
+        results = asyncio.run(refresher.run(ruts))
+    finally:
+        stub.stop()
+
+    print(f"secuencial: {secuencial:.1f} RUTs/s")
+    print(f"concurrente (concurrency={args.concurrency}, rate={args.rate or 'sin límite'}): "
+          f"{results['ruts_per_second']:.1f} RUTs/s, éxitos={results['succeeded']}, fallos={len(results['failed'])}")
+    print(f"conexiones TCP abiertas contra el stub: {stub.connections}")
+
+if __name__ == "__main__":
+    main()
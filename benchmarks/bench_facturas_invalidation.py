@@ -0,0 +1,95 @@
+"""
+Benchmark del costo de invalidar la caché de facturas de un RUT a medida que
+crece el keyspace de Redis.
+
+Compara tres estrategias sobre un RUT con `--pages` claves cacheadas, rodeado
+de N claves de otros RUTs:
+  - KEYS facturas:{rut}:* + DEL   (implementación anterior, O(N) bloqueante)
+  - SCAN MATCH incremental + UNLINK por lotes (O(N), pero sin bloquear Redis)
+  - INCR de la versión del RUT    (actual, O(1))
+
+Requiere un Redis local (docker compose up redis). Usa la base REDIS_DB y borra
+las claves bench:* que crea.
+
+Uso:
+    python -m benchmarks.bench_facturas_invalidation --sizes 10000 100000 500000
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.redis_client import get_redis_client, close_redis_clients
+from app.services import facturas
+
+RUT = "76000000-1"
+PREFIX = "bench:facturas"
+
+def poblar(client, size: int, pages: int) -> None:
+    """Keyspace con `size` claves de otros RUTs y `pages` claves del RUT a invalidar."""
+    pipe = client.pipeline(transaction=False)
+    for i in range(size):
+        pipe.set(f"{PREFIX}:{70000000 + i}-1:p1:pp100", "x", ex=600)
+        if i % 10_000 == 0:
+            pipe.execute()
+    for page in range(1, pages + 1):
+        pipe.set(f"{PREFIX}:{RUT}:p{page}:pp100", "x", ex=600)
+    pipe.execute()
+
+def invalidar_keys(client) -> None:
+    keys = client.keys(f"{PREFIX}:{RUT}:*")
+    if keys:
+        client.delete(*keys)
+
+def invalidar_scan(client, batch: int = 500) -> None:
+    lote = []
+    for key in client.scan_iter(match=f"{PREFIX}:{RUT}:*", count=1000):
+        lote.append(key)
+        if len(lote) >= batch:
+            client.unlink(*lote)
+            lote = []
+    if lote:
+        client.unlink(*lote)
+
+def limpiar(client) -> None:
+    for key in client.scan_iter(match=f"{PREFIX}:*", count=10_000):
+        client.unlink(key)
+    client.delete(facturas.get_facturas_version_key(RUT))
+
+def medir(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return 1000 * (time.perf_counter() - start) / repeat
+
+async def medir_version(repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await facturas.invalidar_cache_facturas(RUT)
+    return 1000 * (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000],
+                        help="claves de otros RUTs en el keyspace")
+    parser.add_argument("--pages", type=int, default=20, help="claves cacheadas del RUT invalidado")
+    parser.add_argument("--repeat", type=int, default=5, help="invalidaciones por medición")
+    args = parser.parse_args()
+
+    client = get_redis_client()
+    print(f"{'claves':>8} {'KEYS+DEL ms':>12} {'SCAN+UNLINK ms':>15} {'INCR versión ms':>16}")
+    try:
+        for size in args.sizes:
+            limpiar(client)
+            poblar(client, size, args.pages)
+            keys_ms = medir(lambda: (invalidar_keys(client), poblar(client, 0, args.pages)), args.repeat)
+            scan_ms = medir(lambda: (invalidar_scan(client), poblar(client, 0, args.pages)), args.repeat)
+            # El repoblado de las páginas se incluye en las dos primeras; se descuenta aparte
+            repoblar_ms = medir(lambda: poblar(client, 0, args.pages), args.repeat)
+            version_ms = asyncio.run(medir_version(args.repeat))
+            print(f"{size:>8} {keys_ms - repoblar_ms:>12.2f} {scan_ms - repoblar_ms:>15.2f} {version_ms:>16.2f}")
+    finally:
+        limpiar(client)
+        asyncio.run(close_redis_clients())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark del costo de conexión HTTP por llamada contra los stubs de
+monthly_sales y Ollama.
+
+Compara, en serie:
+  - requests.get/post sueltos (una conexión TCP nueva por llamada) con la
+    sesión compartida de app.core.http_client.get_http_session();
+  - un httpx.AsyncClient nuevo por llamada (lo que hacía facturas) con el
+    cliente asíncrono compartido.
+
+Reporta la latencia media por llamada y las conexiones TCP que abrió el stub.
+
+Uso:
+    python -m benchmarks.bench_http_clients --calls 500 --api-delay 0
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import requests
+
+from benchmarks.stubs import StubServer
+from app.core.http_client import get_http_session, get_async_http_client, close_http_clients
+
+def medir(stub: StubServer, nombre: str, calls: int, fn) -> None:
+    conexiones = stub.connections
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{nombre:<34} {1000 * elapsed / calls:7.2f} ms/llamada, "
+          f"conexiones nuevas: {stub.connections - conexiones}")
+
+async def medir_async(stub: StubServer, nombre: str, calls: int, fn) -> None:
+    conexiones = stub.connections
+    start = time.perf_counter()
+    for _ in range(calls):
+        await fn()
+    elapsed = time.perf_counter() - start
+    print(f"{nombre:<34} {1000 * elapsed / calls:7.2f} ms/llamada, "
+          f"conexiones nuevas: {stub.connections - conexiones}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--api-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = StubServer(api_delay=args.api_delay, llm_delay=args.api_delay).start()
+    monthly_url = f"{stub.url}/business/76000000-0/monthly_sales"
+    generate_url = f"{stub.url}/api/generate"
+    body = {"model": "bench", "prompt": "hola", "stream": False}
+
+    try:
+        medir(stub, "monthly_sales requests.get", args.calls, lambda: requests.get(monthly_url, timeout=30).json())
+        medir(stub, "monthly_sales sesión compartida", args.calls,
+              lambda: get_http_session().get(monthly_url, timeout=30).json())
+        medir(stub, "ollama requests.post", args.calls, lambda: requests.post(generate_url, json=body, timeout=30).json())
+        medir(stub, "ollama sesión compartida", args.calls,
+              lambda: get_http_session().post(generate_url, json=body, timeout=30).json())
+
+        async def cliente_por_llamada():
+            async with httpx.AsyncClient() as client:
+                (await client.get(monthly_url)).json()
+
+        async def cliente_compartido():
+            (await get_async_http_client().get(monthly_url)).json()
+
+        async def async_main():
+            await medir_async(stub, "httpx.AsyncClient por llamada", args.calls, cliente_por_llamada)
+            await medir_async(stub, "httpx.AsyncClient compartido", args.calls, cliente_compartido)
+            await close_http_clients()
+
+        asyncio.run(async_main())
+    finally:
+        stub.stop()
+
+if __name__ == "__main__":
+    main()
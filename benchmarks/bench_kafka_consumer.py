@@ -0,0 +1,73 @@
+"""
+Benchmark de throughput del consumidor de Kafka contra un broker en memoria.
+
+Compara el modo mensaje a mensaje (lotes de 1, un worker, equivalente al loop
+anterior con poll()) con el modo por lotes con pool de workers y compactación
+por RUT. Con --ruts menor que --messages se simulan operaciones masivas de
+admin (varios eventos por negocio que sólo cambian users). Los refrescos van
+contra la API monthly_sales stub y un Redis local (docker compose up redis).
+
+Uso:
+    python -m benchmarks.bench_kafka_consumer --messages 400 --workers 16 --batch-size 100
+"""
+import argparse
+import os
+import time
+
+from benchmarks.stubs import StubServer
+from benchmarks.kafka_stub import FakeConsumer, json_business_event
+
+def run(kafka_consumer, module, payloads, batch_size: int, workers: int) -> float:
+    module.KAFKA_BATCH_SIZE = batch_size
+    module.KAFKA_WORKERS = workers
+    module.KAFKA_BATCH_TIMEOUT_SECONDS = 0.05
+    module.KAFKA_COMPACTION_WINDOW_SECONDS = 0.05 if batch_size == 1 else 0.5
+    module.KAFKA_COMPACTION_MAX_MESSAGES = batch_size
+    consumer = kafka_consumer.KafkaBusinessConsumer()
+    fake = FakeConsumer(module.TOPIC, payloads)
+    consumer.consumer = fake
+
+    start = time.perf_counter()
+    consumer.start()
+    while not fake.done():
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    consumer.stop()
+    print(f"  métricas: {consumer.get_metrics()}")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--ruts", type=int, default=0, help="RUTs distintos (0 = uno por mensaje)")
+    parser.add_argument("--sequential-messages", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--api-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    stub = StubServer(api_delay=args.api_delay).start()
+    os.environ["MONTHLY_SALES_API_URL"] = stub.url
+    os.environ.setdefault("BUSINESS_INVOICES_TOKEN", "bench")
+
+    import app.core.kafka_consumer as kafka_consumer
+
+    ruts = args.ruts or args.messages
+    payloads = [
+        json_business_event(i % ruts, f"{76000000 + i % ruts}-{i % ruts % 10}", users=i // ruts)
+        for i in range(args.messages)
+    ]
+    try:
+        secuencial = run(kafka_consumer, kafka_consumer, payloads[:args.sequential_messages], 1, 1)
+        lotes = run(kafka_consumer, kafka_consumer, payloads, args.batch_size, args.workers)
+    finally:
+        stub.stop()
+
+    seq_rate = args.sequential_messages / secuencial
+    batch_rate = args.messages / lotes
+    print(f"mensaje a mensaje: {seq_rate:.1f} msg/s")
+    print(f"por lotes (batch={args.batch_size}, workers={args.workers}): {batch_rate:.1f} msg/s (x{batch_rate / seq_rate:.1f})")
+    print(f"llamadas a monthly_sales: {stub.requests}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark de las proyecciones mensuales y los indicadores derivados.
+
+Compara, para muchos RUTs con historias de distinto largo:
+  - el camino con dicts (el anterior): una copia por mes de los campos de compras
+    y otra de los de ventas, más los mismos indicadores calculados con loops de
+    Python, en cada request;
+  - MonthlyFrame armado: una matriz NumPy en una sola pasada sobre los meses de la
+    API y los indicadores calculados en bloque (lectura desde Redis o la API);
+  - MonthlyFrame en L1: el frame ya armado que guarda la entrada del L1, con los
+    indicadores ya calculados (hit del L1: no se rearma nada).
+
+Con historias cortas (~12 meses) armar el frame cuesta más que el camino con
+dicts; por eso el frame se arma una vez al leer de Redis y queda en el L1, y las
+filas de compras y ventas sólo se derivan si el prompt las necesita.
+
+No usa red ni Redis: los meses se generan con benchmarks.stubs.monthly_payload.
+
+Uso:
+    python -m benchmarks.bench_monthly_frame --months 12 60 240 --ruts 1000
+"""
+import argparse
+import time
+
+from benchmarks.stubs import monthly_payload
+from app.core.monthly_frame import MonthlyFrame
+from app.core.monthly_frame import CAMPOS_COMPRAS, CAMPOS_VENTAS
+
+def _var(actual, anterior):
+    return 100.0 * (actual - anterior) / anterior if actual is not None and anterior else None
+
+def indicadores_python(compras, ventas):
+    """Mismos indicadores que MonthlyFrame.indicators(), mes a mes sobre los dicts."""
+    filas = []
+    for i, (c, v) in enumerate(zip(compras, ventas)):
+        debito = v.get("total_sales_iva")
+        recuperable, uso_comun = c.get("total_purchases_tax_recoverable"), c.get("total_purchases_tax_common_use")
+        if recuperable is None and uso_comun is None:
+            credito = c.get("total_purchases_iva")
+        else:
+            credito = (recuperable or 0) + (uso_comun or 0)
+        ventana = [m.get("total_sales") for m in ventas[max(i - 2, 0):i + 1] if m.get("total_sales") is not None]
+        ventana_c = [m.get("total_purchases") for m in compras[max(i - 2, 0):i + 1] if m.get("total_purchases") is not None]
+        filas.append({
+            "iva_debito": debito,
+            "iva_credito": credito,
+            "iva_neto": debito - credito if debito is not None and credito is not None else None,
+            "ventas_var_mensual": _var(v.get("total_sales"), ventas[i - 1].get("total_sales")) if i >= 1 else None,
+            "compras_var_mensual": _var(c.get("total_purchases"), compras[i - 1].get("total_purchases")) if i >= 1 else None,
+            "ventas_var_anual": _var(v.get("total_sales"), ventas[i - 12].get("total_sales")) if i >= 12 else None,
+            "ventas_media_3m": sum(ventana) / len(ventana) if i >= 2 and ventana else None,
+            "compras_media_3m": sum(ventana_c) / len(ventana_c) if i >= 2 and ventana_c else None,
+        })
+    return filas
+
+def camino_dicts(meses):
+    compras = [{"period": m.get("period"), **{campo: m.get(campo) for campo in CAMPOS_COMPRAS}} for m in meses]
+    ventas = [{"period": m.get("period"), **{campo: m.get(campo) for campo in CAMPOS_VENTAS}} for m in meses]
+    return indicadores_python(compras, ventas)
+
+def camino_frame(meses):
+    return MonthlyFrame.from_api(meses).indicators()
+
+def camino_l1(frame):
+    return frame.indicators()
+
+def medir(fn, historias) -> float:
+    start = time.perf_counter()
+    for meses in historias:
+        fn(meses)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months", type=int, nargs="+", default=[12, 60, 240], help="largo de la historia")
+    parser.add_argument("--ruts", type=int, default=1000, help="RUTs procesados por medición")
+    args = parser.parse_args()
+
+    print(f"{'meses':>5} {'RUTs':>6} {'dicts ms/RUT':>13} {'frame ms/RUT':>13} {'L1 ms/RUT':>10} {'speedup':>8}")
+    for months in args.months:
+        # Listas distintas por RUT, como llegarían de Redis
+        historias = [monthly_payload(months)["total_last_months"] for _ in range(args.ruts)]
+        dicts_s = medir(camino_dicts, historias)
+        frame_s = medir(camino_frame, historias)
+        # Frames como quedan en el L1 después del primer request del RUT
+        frames = [MonthlyFrame.from_api(meses) for meses in historias]
+        for frame in frames:
+            frame.indicators()
+        l1_s = medir(camino_l1, frames)
+        print(f"{months:>5} {args.ruts:>6} {1000 * dicts_s / args.ruts:>13.3f} "
+              f"{1000 * frame_s / args.ruts:>13.3f} {1000 * l1_s / args.ruts:>10.4f} {dicts_s / frame_s:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark de concurrencia de /preguntar contra servidores stub locales.
+
+Compara el camino bloqueante anterior (requests + Redis sync dentro de un
+handler async) con el camino asíncrono actual, disparando N preguntas
+concurrentes en un único event loop (equivalente a un worker de uvicorn).
+
+Requiere un Redis local (docker compose up redis).
+
+Uso:
+    python -m benchmarks.bench_preguntar_concurrency --requests 200 --llm-delay 0.5
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stubs import StubServer
+
+async def run_blocking(n: int) -> float:
+    """Camino anterior: funciones sync llamadas desde corrutinas."""
+    from app.services.compras import get_compras_cliente
+    from app.services.ventas import get_ventas_cliente
+    from app.core.prompts import generar_prompt_iva
+    from app.core.ollama import consultar_llm
+
+    async def handler(i: int):
+        rut = f"7600000{i % 10}-1"
+        compras = get_compras_cliente(rut)
+        ventas = get_ventas_cliente(rut)
+        return consultar_llm(generar_prompt_iva(rut, compras, ventas, "¿Cuánto IVA debo pagar?"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(n)))
+    return time.perf_counter() - start
+
+async def run_async(n: int) -> float:
+    """Camino actual: endpoint /preguntar real servido vía ASGI."""
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client.post("/preguntar", json={"rut": f"7600000{i % 10}-1", "pregunta": "¿Cuánto IVA debo pagar?"})
+            for i in range(n)
+        ))
+        return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="preguntas concurrentes en modo async")
+    parser.add_argument("--blocking-requests", type=int, default=20, help="preguntas en modo bloqueante")
+    parser.add_argument("--llm-delay", type=float, default=0.5, help="latencia simulada de Ollama (s)")
+    parser.add_argument("--api-delay", type=float, default=0.05, help="latencia simulada de monthly_sales (s)")
+    args = parser.parse_args()
+
+    stub = StubServer(api_delay=args.api_delay, llm_delay=args.llm_delay).start()
+    os.environ["MONTHLY_SALES_API_URL"] = stub.url
+    os.environ["OLLAMA_HOST"] = stub.url
+    os.environ["LLM_SERVICE"] = "ollama"
+    os.environ.setdefault("BUSINESS_INVOICES_TOKEN", "bench")
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    try:
+        blocking = asyncio.run(run_blocking(args.blocking_requests))
+        concurrent = asyncio.run(run_async(args.requests))
+    finally:
+        stub.stop()
+
+    blocking_rps = args.blocking_requests / blocking
+    async_rps = args.requests / concurrent
+    print(f"bloqueante: {args.blocking_requests} preguntas en {blocking:.2f}s ({blocking_rps:.1f} req/s)")
+    print(f"async:      {args.requests} preguntas en {concurrent:.2f}s ({async_rps:.1f} req/s)")
+    print(f"mejora de throughput: x{async_rps / blocking_rps:.1f}")
+
+if __name__ == "__main__":
+    main()
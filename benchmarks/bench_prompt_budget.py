@@ -0,0 +1,89 @@
+"""
+Benchmark del tamaño del prompt según meses de historia: formato anterior (una
+línea por mes con Total e IVA) contra el formato compacto con presupuesto de tokens.
+
+Sin --ollama-host sólo compara tamaños (caracteres y tokens estimados). Con un
+Ollama real además mide la latencia de generación de cada prompt y reporta los
+tokens que el modelo realmente evaluó (prompt_eval_count), útil para calibrar
+PROMPT_CHARS_PER_TOKEN.
+
+Uso:
+    python -m benchmarks.bench_prompt_budget --months 12 36 60 --budget 800
+    python -m benchmarks.bench_prompt_budget --ollama-host http://localhost:11434 --repeat 3
+"""
+import argparse
+import os
+import time
+
+import httpx
+
+from benchmarks.stubs import monthly_payload
+from app.core import prompts
+from app.core.monthly_frame import MonthlyFrame
+from app.core.ollama import MODEL_NAME
+
+PREGUNTAS = [
+    "¿Cuánto IVA debo pagar este mes?",
+    "¿Cómo han evolucionado mis ventas?",
+]
+
+def prompt_anterior(rut, data, pregunta):
+    return f"""
+Contexto tributario para RUT {rut} (últimos meses disponibles):
+
+**Resumen Compras:**
+{prompts.formatear(data, "compras")}
+
+**Resumen Ventas:**
+{prompts.formatear(data, "ventas")}
+
+Considerando la información anterior, responde la siguiente pregunta como un asesor tributario experto:
+""" + prompts.generar_pregunta_iva(pregunta)
+
+def generar(host: str, prompt: str, num_predict: int) -> dict:
+    start = time.perf_counter()
+    response = httpx.post(f"{host}/api/generate", timeout=600, json={
+        "model": MODEL_NAME,
+        "prompt": prompt,
+        "stream": False,
+        "options": {"num_predict": num_predict},
+    })
+    response.raise_for_status()
+    data = response.json()
+    data["latency_ms"] = 1000 * (time.perf_counter() - start)
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months", type=int, nargs="+", default=[12, 36, 60], help="meses de historia")
+    parser.add_argument("--budget", type=int, default=prompts.PROMPT_TOKEN_BUDGET, help="presupuesto de tokens")
+    parser.add_argument("--ollama-host", default=os.getenv("BENCH_OLLAMA_HOST"), help="Ollama real para medir latencia")
+    parser.add_argument("--num-predict", type=int, default=64, help="tokens generados por respuesta")
+    parser.add_argument("--repeat", type=int, default=3, help="generaciones por prompt (se reporta la media)")
+    args = parser.parse_args()
+
+    print(f"{'meses':>5} {'pregunta':<36} {'formato':<9} {'chars':>6} {'tok est.':>8} {'nivel':>5}"
+          + (f" {'tok reales':>10} {'eval ms':>8} {'total ms':>9}" if args.ollama_host else ""))
+    for months in args.months:
+        data = monthly_payload(months)["total_last_months"]
+        for pregunta in PREGUNTAS:
+            compacto = prompts.construir_prompt_iva(
+                "76000000-1", data, data, pregunta, MonthlyFrame.from_api(data), token_budget=args.budget
+            )
+            variantes = [
+                ("anterior", prompt_anterior("76000000-1", data, pregunta), "-"),
+                ("compacto", compacto.prompt, str(compacto.nivel)),
+            ]
+            for nombre, prompt, nivel in variantes:
+                linea = (f"{months:>5} {pregunta[:36]:<36} {nombre:<9} {len(prompt):>6} "
+                         f"{prompts.estimar_tokens(prompt):>8} {nivel:>5}")
+                if args.ollama_host:
+                    # Sin `context` ni caché de prefijo entre variantes: cada generación evalúa el prompt completo
+                    runs = [generar(args.ollama_host, prompt, args.num_predict) for _ in range(args.repeat)]
+                    eval_ms = sum(r.get("prompt_eval_duration", 0) for r in runs) / len(runs) / 1e6
+                    total_ms = sum(r["latency_ms"] for r in runs) / len(runs)
+                    linea += f" {runs[0].get('prompt_eval_count', 0):>10} {eval_ms:>8.1f} {total_ms:>9.1f}"
+                print(linea)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark del costo de conexión a Redis por request.
+
+Compara el patrón anterior (un Redis(...) nuevo, con su propio pool, en cada
+lookup) con el cliente compartido de app.core.redis_client, en serie y con
+varios threads concurrentes, e imprime las métricas de espera del pool.
+
+Requiere un Redis local (docker compose up redis).
+
+Uso:
+    python -m benchmarks.bench_redis_pool --lookups 2000 --threads 16
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from redis import Redis
+
+from app.core.redis_client import get_redis_client, get_pool_stats
+
+KEY = "bench:redis_pool"
+
+def redis_por_llamada() -> Redis:
+    """Replica el antiguo monthly_data.get_redis_client()."""
+    return Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=int(os.getenv("REDIS_DB", "0")),
+        decode_responses=True
+    )
+
+def lookup_por_llamada() -> None:
+    client = redis_por_llamada()
+    client.get(KEY)
+    client.close()
+
+def lookup_compartido() -> None:
+    get_redis_client().get(KEY)
+
+def medir(fn, lookups: int, threads: int) -> float:
+    start = time.perf_counter()
+    if threads == 1:
+        for _ in range(lookups):
+            fn()
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(lambda _: fn(), range(lookups)))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    get_redis_client().set(KEY, "x" * 4096)
+
+    for threads in (1, args.threads):
+        antes = medir(lookup_por_llamada, args.lookups, threads)
+        ahora = medir(lookup_compartido, args.lookups, threads)
+        print(f"threads={threads:>3}  por llamada: {1e6 * antes / args.lookups:8.1f} us/lookup   "
+              f"pool compartido: {1e6 * ahora / args.lookups:8.1f} us/lookup   (x{antes / ahora:.1f})")
+
+    print(f"métricas del pool: {get_pool_stats()}")
+    get_redis_client().delete(KEY)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Stand-in en memoria de un broker Kafka para benchmarks del consumidor.
+
+FakeConsumer implementa la parte de la API de confluent_kafka.Consumer que usa
+KafkaBusinessConsumer (subscribe, consume, poll, commit, seek, position,
+assignment, get_watermark_offsets, close) sobre mensajes pregenerados.
+"""
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+class FakeMessage:
+    def __init__(self, topic: str, partition: int, offset: int, value: bytes, key: Optional[bytes] = None):
+        self._topic, self._partition, self._offset = topic, partition, offset
+        self._value, self._key = value, key
+
+    def error(self):
+        return None
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def value(self):
+        return self._value
+
+    def key(self):
+        return self._key
+
+class FakeTopicPartition:
+    def __init__(self, topic: str, partition: int, offset: int = -1001):
+        self.topic, self.partition, self.offset = topic, partition, offset
+
+def json_business_event(business_id: int, rut: str, action_type: str = "update", users: int = 0) -> bytes:
+    """Evento de negocio serializado como JSON (formato alternativo al Avro del tópico)."""
+    return json.dumps({
+        "businessId": business_id,
+        "actionType": action_type,
+        "rut": rut,
+        "deletedAt": None,
+        "users": [{"userId": i, "messagePreferences": []} for i in range(users)],
+        "settings": [],
+    }).encode()
+
+class FakeConsumer:
+    """Reparte `payloads` en `partitions` particiones y los entrega en orden por partición."""
+
+    def __init__(self, topic: str, payloads: List[bytes], partitions: int = 4):
+        self.topic = topic
+        self.partitions: Dict[int, List[FakeMessage]] = {p: [] for p in range(partitions)}
+        for i, payload in enumerate(payloads):
+            p = i % partitions
+            self.partitions[p].append(FakeMessage(topic, p, len(self.partitions[p]), payload))
+        self.positions = {p: 0 for p in self.partitions}
+        self.committed = {p: 0 for p in self.partitions}
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return sum(len(m) for m in self.partitions.values())
+
+    def done(self) -> bool:
+        return all(self.committed[p] >= len(m) for p, m in self.partitions.items())
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None, on_lost=None):
+        if on_assign:
+            on_assign(self, [FakeTopicPartition(self.topic, p) for p in self.partitions])
+
+    def consume(self, num_messages: int = 1, timeout: float = -1):
+        with self._lock:
+            batch = []
+            for p, msgs in self.partitions.items():
+                while self.positions[p] < len(msgs) and len(batch) < num_messages:
+                    batch.append(msgs[self.positions[p]])
+                    self.positions[p] += 1
+        if not batch and timeout > 0:
+            time.sleep(min(timeout, 0.05))
+        return batch
+
+    def poll(self, timeout: float = -1):
+        batch = self.consume(1, timeout)
+        return batch[0] if batch else None
+
+    def commit(self, offsets=None, asynchronous: bool = True):
+        with self._lock:
+            for tp in offsets or []:
+                self.committed[tp.partition] = max(self.committed[tp.partition], tp.offset)
+
+    def seek(self, tp):
+        with self._lock:
+            self.positions[tp.partition] = tp.offset
+
+    def assignment(self):
+        return [FakeTopicPartition(self.topic, p) for p in self.partitions]
+
+    def position(self, partitions):
+        return [FakeTopicPartition(self.topic, tp.partition, self.positions[tp.partition]) for tp in partitions]
+
+    def get_watermark_offsets(self, tp, timeout=None, cached=False):
+        return 0, len(self.partitions[tp.partition])
+
+    def close(self):
+        pass
@@ -0,0 +1,155 @@
+"""
+Servidores HTTP mínimos para benchmarks locales.
+
+Levantan en un thread propio un servidor asyncio que imita la API de
+monthly_sales y la API de Ollama, con latencia configurable. No dependen
+de nada fuera de la librería estándar.
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import Optional
+
+def monthly_payload(months: int = 12) -> dict:
+    """Construye una respuesta de /business/{rut}/monthly_sales con `months` meses."""
+    data = []
+    for i in range(months):
+        year, month = 2020 + (i // 12), (i % 12) + 1
+        data.append({
+            "period": f"{year}-{month:02d}",
+            "total_purchases": 1_000_000 + i * 1000,
+            "total_purchases_discount_document": 0,
+            "total_purchases_exempt": 50_000,
+            "total_purchases_iva": 190_000 + i * 190,
+            "total_purchases_net_with_exempt_purchases": 1_050_000,
+            "total_purchases_neto": 1_000_000,
+            "total_purchases_tax_common_use": 0,
+            "total_purchases_tax_no_recoverable": 0,
+            "total_purchases_tax_recoverable": 190_000,
+            "total_sales": 2_000_000 + i * 2000,
+            "total_sales_discount_document": 0,
+            "total_sales_exempt": 0,
+            "total_sales_iva": 380_000 + i * 380,
+            "total_sales_net_with_exempt_sales": 2_000_000,
+            "total_sales_neto": 2_000_000,
+            "total_sales_tax_common_use": 0,
+            "total_sales_tax_no_recoverable": 0,
+            "total_sales_tax_recoverable": 0,
+        })
+    return {"status": "ok", "total_last_months": data}
+
+class StubServer:
+    """
+    Servidor HTTP/1.1 con keep-alive que responde:
+      GET  /business/{rut}/monthly_sales -> payload mensual (tras `api_delay` s)
+      POST /api/generate                 -> respuesta de Ollama (tras `llm_delay` s),
+                                            en NDJSON si el body pide "stream": true
+    Cuenta conexiones TCP aceptadas y requests atendidos.
+    """
+
+    def __init__(self, api_delay: float = 0.05, llm_delay: float = 0.5,
+                 months: int = 12, tokens: int = 20):
+        self.api_delay = api_delay
+        self.llm_delay = llm_delay
+        self.tokens = tokens
+        self.payload = json.dumps(monthly_payload(months)).encode()
+        self.connections = 0
+        self.requests = 0
+        self.port: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=2048)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = b""
+                if "content-length" in headers:
+                    body = await reader.readexactly(int(headers["content-length"]))
+                self.requests += 1
+                await self._route(method, path, body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        if path.startswith("/business/") and path.endswith("/monthly_sales"):
+            await asyncio.sleep(self.api_delay)
+            self._write(writer, 200, self.payload)
+        elif path.startswith("/api/generate"):
+            request = json.loads(body or b"{}")
+            if request.get("stream"):
+                await self._stream_generate(writer)
+            else:
+                await asyncio.sleep(self.llm_delay)
+                answer = " ".join(["token"] * self.tokens)
+                self._write(writer, 200, json.dumps({"response": answer, "done": True}).encode())
+        else:
+            self._write(writer, 404, b'{"error": "not found"}')
+        await writer.drain()
+
+    async def _stream_generate(self, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        per_token = self.llm_delay / max(self.tokens, 1)
+        for i in range(self.tokens):
+            await asyncio.sleep(per_token)
+            line = json.dumps({"response": "token ", "done": False}).encode() + b"\n"
+            writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            await writer.drain()
+        line = json.dumps({"response": "", "done": True}).encode() + b"\n"
+        writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n0\r\n\r\n")
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, status: int, payload: bytes) -> None:
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+        )
+
+def timed(fn, *args, **kwargs):
+    """Ejecuta fn y devuelve (resultado, segundos)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
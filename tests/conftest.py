@@ -0,0 +1,4 @@
+import os
+
+# openai_client crea sus clientes al importarse y exige una API key, aunque los tests no llamen a OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "test")
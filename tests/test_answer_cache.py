@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app.core import answer_cache
+from app.core.answer_cache import build_answer_key, get_answer_cache_key, get_cached_answer, set_cached_answer
+from app.core.llm_router import LLMRouter
+from app.core.text import normalize_question
+
+COMPRAS = [{"period": "2024-03", "total_purchases": 100}]
+VENTAS = [{"period": "2024-03", "total_sales": 200}]
+
+def test_normalize_question():
+    assert normalize_question("  ¿Cuánto IVA   pagué en MARZO? ") == "cuanto iva pague en marzo"
+    assert normalize_question(None) == ""
+
+def test_la_clave_depende_de_datos_modelo_y_pregunta_normalizada():
+    key = build_answer_key("1-9", COMPRAS, VENTAS, "ollama", "¿Cuánto vendí?")
+    assert key == build_answer_key("1-9", COMPRAS, VENTAS, "ollama", "cuanto vendi")
+    assert key.field != build_answer_key("1-9", COMPRAS, VENTAS, "openai", "cuanto vendi").field
+    otras_ventas = [{"period": "2024-03", "total_sales": 201}]
+    assert key.data_hash != build_answer_key("1-9", COMPRAS, otras_ventas, "ollama", "cuanto vendi").data_hash
+
+def test_el_hash_por_rut_no_pasa_del_maximo(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(answer_cache, "get_async_redis_client", lambda: client)
+    monkeypatch.setattr(answer_cache, "ANSWER_CACHE_MAX_PER_RUT", 3)
+
+    async def run():
+        for i in range(5):
+            key = build_answer_key("1-9", COMPRAS, VENTAS, "ollama", f"pregunta {i}")
+            assert await set_cached_answer(key, f"respuesta {i}")
+        # Reescribir una respuesta existente no desaloja a otra
+        assert await set_cached_answer(key, "respuesta 4 bis")
+        assert await get_cached_answer(key) == "respuesta 4 bis"
+        return await client.hlen(get_answer_cache_key("1-9"))
+
+    assert asyncio.run(run()) == 3
+
+class _ClienteQueFalla:
+    async def post(self, url, **kwargs):
+        raise AssertionError(f"no debería llamar a {url}")
+
+def test_sin_hosts_sanos_no_calcula_embeddings(monkeypatch):
+    router = LLMRouter(["http://ollama-1"])
+    for _ in range(router.endpoints[0].breaker.failure_threshold):
+        router.endpoints[0].breaker.record_failure()
+    monkeypatch.setattr(answer_cache, "get_llm_router", lambda: router)
+    monkeypatch.setattr(answer_cache, "get_async_http_client", lambda: _ClienteQueFalla())
+
+    assert asyncio.run(answer_cache._embed("pregunta sin host")) is None
+
+def test_el_embedding_usa_el_host_que_elige_el_router(monkeypatch):
+    urls = []
+
+    class _Respuesta:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"embedding": [1.0, 0.0]}
+
+    class _Cliente:
+        async def post(self, url, **kwargs):
+            urls.append(url)
+            return _Respuesta()
+
+    monkeypatch.setattr(answer_cache, "get_llm_router", lambda: LLMRouter(["http://ollama-2"]))
+    monkeypatch.setattr(answer_cache, "get_async_http_client", lambda: _Cliente())
+
+    assert asyncio.run(answer_cache._embed("pregunta con host")) == [1.0, 0.0]
+    assert urls == ["http://ollama-2/api/embeddings"]
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.core import business_registry
+from app.core.business_registry import REGISTRY_KEY, iter_stale_businesses
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(business_registry, "get_async_redis_client", lambda: client)
+    return client
+
+def _recorrer(batch_size, cutoff, al_entregar=None):
+    async def run():
+        vistos = []
+        async for rut in iter_stale_businesses(batch_size=batch_size, refreshed_before=cutoff):
+            vistos.append(rut)
+            if al_entregar:
+                await al_entregar(rut)
+        return vistos
+    return asyncio.run(run())
+
+def test_recorre_por_score_y_rut_en_lotes(redis):
+    asyncio.run(redis.zadd(REGISTRY_KEY, {"c": 0, "a": 0, "b": 0, "z": 5, "y": 3, "fresco": 100}))
+    assert _recorrer(2, 50) == ["a", "b", "c", "y", "z"]
+
+def test_empates_que_fallan_no_se_repiten(redis):
+    # Todos con score 0 y ninguno se refresca: cada RUT sale una sola vez
+    ruts = {f"rut-{i:04d}": 0 for i in range(250)}
+    asyncio.run(redis.zadd(REGISTRY_KEY, ruts))
+    assert _recorrer(7, 50) == sorted(ruts)
+
+def test_descarta_los_refrescados_durante_el_recorrido(redis):
+    asyncio.run(redis.zadd(REGISTRY_KEY, {f"r{i}": i for i in range(10)}))
+
+    async def refrescar_siguiente(rut):
+        # Otro proceso refresca un RUT que todavía no se entregó y elimina otro
+        if rut == "r1":
+            await redis.zadd(REGISTRY_KEY, {"r5": 1000})
+            await redis.zrem(REGISTRY_KEY, "r6")
+
+    assert _recorrer(3, 50, refrescar_siguiente) == ["r0", "r1", "r2", "r3", "r4", "r7", "r8", "r9"]
+
+def test_borra_la_foto_al_terminar(redis):
+    asyncio.run(redis.zadd(REGISTRY_KEY, {"a": 0, "b": 0}))
+    _recorrer(1, 50)
+    assert asyncio.run(redis.keys(f"{REGISTRY_KEY}:scan:*")) == []
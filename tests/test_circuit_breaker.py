@@ -0,0 +1,96 @@
+import asyncio
+
+from app.core import llm_router
+from app.core.llm_router import CircuitBreaker, LLMRouter, ERROR_SIN_HOSTS
+from app.core.llm_scheduler import get_llm_scheduler
+
+def test_abre_tras_fallos_consecutivos():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allows_request()
+
+def test_un_exito_reinicia_el_conteo():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_medio_abierto_tras_el_reset():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    breaker.opened_at -= 31
+    assert breaker.state == "half_open"
+    assert breaker.allows_request()
+
+def test_medio_abierto_vuelve_a_abrir_con_un_fallo():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.opened_at -= 31
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_medio_abierto_cierra_con_un_exito():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    breaker.opened_at -= 31
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+class _RespuestaOk:
+    def raise_for_status(self):
+        pass
+
+class _ClienteOk:
+    async def get(self, url, timeout=None):
+        return _RespuestaOk()
+
+def test_health_check_no_borra_fallos_con_el_circuito_cerrado(monkeypatch):
+    monkeypatch.setattr(llm_router, "get_async_http_client", lambda: _ClienteOk())
+    router = LLMRouter(["http://ollama-1"])
+    endpoint = router.endpoints[0]
+    endpoint.breaker.record_failure()
+    endpoint.breaker.record_failure()
+
+    asyncio.run(router._check(endpoint))
+    assert endpoint.breaker.failures == 2
+    assert endpoint.breaker.state == "closed"
+
+def test_health_check_cierra_un_circuito_medio_abierto(monkeypatch):
+    monkeypatch.setattr(llm_router, "get_async_http_client", lambda: _ClienteOk())
+    router = LLMRouter(["http://ollama-1"])
+    endpoint = router.endpoints[0]
+    for _ in range(endpoint.breaker.failure_threshold):
+        endpoint.breaker.record_failure()
+    endpoint.breaker.opened_at -= endpoint.breaker.reset_seconds + 1
+
+    asyncio.run(router._check(endpoint))
+    assert endpoint.breaker.state == "closed"
+    assert endpoint.breaker.failures == 0
+
+def test_generate_informa_el_desborde_a_openai(monkeypatch):
+    async def openai(prompt):
+        return "respuesta de openai"
+
+    monkeypatch.setattr(llm_router, "consultar_openai_async", openai)
+    assert asyncio.run(LLMRouter([], overflow_openai=True).generate("p")) == ("respuesta de openai", "openai")
+    assert asyncio.run(LLMRouter([], overflow_openai=False).generate("p")) == (ERROR_SIN_HOSTS, "ollama")
+
+def test_el_desborde_devuelve_el_cupo_de_ollama_antes_de_llamar_a_openai(monkeypatch):
+    cupos = {}
+
+    async def openai(prompt):
+        cupos["ollama"] = get_llm_scheduler("ollama").in_flight
+        cupos["openai"] = get_llm_scheduler("openai").in_flight
+        return "respuesta de openai"
+
+    monkeypatch.setattr(llm_router, "consultar_openai_async", openai)
+    asyncio.run(LLMRouter([], overflow_openai=True).generate("p"))
+    assert cupos == {"ollama": 0, "openai": 1}
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.core.daily_aggregates import DailyAggregates
+from app.services import facturas
+
+def test_resumen_por_rango_desde_agregados_diarios():
+    agg = DailyAggregates()
+    for dia, monto in [("2024-01-05", 100), ("2024-01-05", 300), ("2024-01-20T10:00:00", 50),
+                       ("2024-02-01", 1000), ("2024-03-15", 10)]:
+        agg.add(dia, monto)
+
+    resumen = agg.summary("2024-01-05", "2024-02-01")
+    assert resumen["total_facturas"] == 4
+    assert resumen["monto_total"] == 1450
+    assert (resumen["min_monto"], resumen["max_monto"]) == (50, 1000)
+    assert resumen["facturas_por_mes"] == [
+        {"mes": "2024-01", "cantidad": 3, "monto": 450},
+        {"mes": "2024-02", "cantidad": 1, "monto": 1000},
+    ]
+    assert agg.summary("2024-04-01", None)["total_facturas"] == 0
+    assert agg.summary()["total_facturas"] == 5
+
+def test_agregados_ida_y_vuelta_por_hash():
+    agg = DailyAggregates()
+    agg.add("2024-01-05", 100.5)
+    agg.add("2024-01-06", 200)
+    copia = DailyAggregates.from_hash({**agg.to_hash(), "_version": "3"})
+    assert copia.summary() == agg.summary()
+
+class _Respuesta:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+class _ApiFacturas:
+    """Dos páginas de facturas; cuenta las llamadas por página."""
+
+    def __init__(self):
+        self.llamadas = []
+
+    async def get(self, url, params=None, headers=None):
+        page = params["page"]
+        self.llamadas.append(page)
+        facturas_pagina = [{"fecha": f"2024-0{page}-1{i}", "monto": 10 * page} for i in range(2)]
+        return _Respuesta({"facturas": facturas_pagina, "metadata": {"total_pages": 2}})
+
+@pytest.fixture
+def entorno(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    api = _ApiFacturas()
+    monkeypatch.setattr(facturas, "get_async_redis_client", lambda: client)
+    monkeypatch.setattr(facturas, "get_async_http_client", lambda: api)
+    return client, api
+
+def test_la_invalidacion_descarta_las_paginas_cacheadas(entorno):
+    client, api = entorno
+
+    async def run():
+        await facturas.get_facturas_cliente("1-9", page=1)
+        await facturas.get_facturas_cliente("1-9", page=1)
+        assert api.llamadas == [1]
+        await facturas.invalidar_cache_facturas("1-9")
+        await facturas.get_facturas_cliente("1-9", page=1)
+        assert api.llamadas == [1, 1]
+
+    asyncio.run(run())
+
+def test_construir_agregados_no_pasa_por_la_cache_de_paginas(entorno):
+    client, api = entorno
+
+    async def run():
+        agregados = await facturas.construir_agregados_facturas("1-9")
+        assert agregados.summary()["total_facturas"] == 4
+        assert api.llamadas == [1, 2]
+        assert await client.keys("facturas:1-9:p*") == []
+
+    asyncio.run(run())
@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+
+from app.core.fast_answers import classify_question, try_fast_answer
+from app.core.monthly_frame import MonthlyFrame
+from app.core.text import normalize_question
+
+DISPONIBLES = [f"{anio}-{mes:02d}" for anio in (2023, 2024) for mes in range(1, 13)] + [
+    f"2025-{mes:02d}" for mes in range(1, 7)
+]
+HOY = date(2025, 7, 10)
+
+@pytest.mark.parametrize("pregunta, esperado", [
+    ("¿Cuánto IVA pagué en marzo?", ("iva_neto", "suma", ["2025-03"])),
+    ("cuanto iva pague por mis compras en marzo", ("iva_credito", "suma", ["2025-03"])),
+    ("¿Cuál es el débito fiscal de abril 2024?", ("iva_debito", "suma", ["2024-04"])),
+    ("¿Cuánto vendí en el año 2023?", ("total_sales", "suma", DISPONIBLES[:12])),
+    ("promedio de ventas en 2024", ("total_sales", "promedio", DISPONIBLES[12:24])),
+    ("total de compras del primer trimestre de 2024", ("total_purchases", "suma", DISPONIBLES[12:15])),
+    ("total de compras del primer semestre de 2024", ("total_purchases", "suma", DISPONIBLES[12:18])),
+    ("¿Cuánto vendí en los últimos 3 meses?", ("total_sales", "suma", DISPONIBLES[-3:])),
+    ("¿Cuánto vendí el mes pasado?", ("total_sales", "suma", ["2025-06"])),
+    ("¿Cuánto vendí el último mes?", ("total_sales", "suma", ["2025-06"])),
+    # Comparaciones y variaciones
+    ("¿Cuánto vendí en marzo comparado con febrero?", None),
+    ("¿Cuánto vendí el último año comparado con el anterior?", None),
+    ("¿Cuánto crecieron mis ventas en 2024?", None),
+    ("¿Cuánto vendí en marzo vs abril?", None),
+    # Más de un mes, métrica o año
+    ("¿Cuánto vendí en marzo y febrero?", None),
+    ("¿Cuánto vendí en 2023 y 2024?", None),
+    ("¿Cuánto IVA pagué y cuánto vendí en marzo?", None),
+    # Modificadores que no se calculan
+    ("¿Cuál fue la venta máxima de 2024?", None),
+    ("¿Cuánto vendí por mes en 2024?", None),
+    ("¿Cuánto vendí el 15 de marzo?", None),
+    ("total de ventas netas de 2024", None),
+    # Periodos inválidos o ambiguos
+    ("total de ventas de los últimos 0 meses", None),
+    ("total de ventas de los últimos 48 meses", None),
+    ("¿Cuánto vendí en el último trimestre de 2023?", None),
+    ("¿Me conviene declarar mis compras de marzo?", None),
+    ("¿Cómo van mis ventas?", None),
+])
+def test_clasifica_preguntas(pregunta, esperado):
+    intent = classify_question(pregunta, DISPONIBLES, hoy=HOY)
+    if esperado is None:
+        assert intent is None
+    else:
+        assert (intent.metric, intent.aggregation, intent.periods) == esperado
+
+def test_mes_pasado_es_el_mes_calendario_anterior():
+    intent = classify_question("¿Cuánto vendí el mes pasado?", DISPONIBLES, hoy=date(2025, 9, 3))
+    # Agosto todavía no tiene datos: no se responde con el último mes disponible
+    assert intent.periods == []
+
+def frame():
+    return MonthlyFrame.from_api([
+        {
+            "period": periodo,
+            "total_purchases": 1_000_000,
+            "total_purchases_iva": 190_000,
+            "total_sales": 2_000_000,
+            "total_sales_iva": 380_000,
+        }
+        for periodo in DISPONIBLES
+    ])
+
+def test_responde_credito_fiscal():
+    respuesta = try_fast_answer(frame(), "cuanto iva pague por mis compras en marzo")
+    assert "crédito fiscal" in respuesta
+    assert "$190,000" in respuesta
+
+def test_sin_datos_del_mes_responde_el_llm():
+    assert try_fast_answer(frame(), "¿Cuánto vendí en marzo de 2022?") is None
+    assert try_fast_answer(None, "¿Cuánto vendí en marzo?") is None
+
+@pytest.mark.parametrize("pregunta", [42, ["cuanto vendi en marzo"], None, {"pregunta": "x"}])
+def test_pregunta_que_no_es_texto_va_al_llm(pregunta):
+    assert try_fast_answer(frame(), pregunta) is None
+    # La caché de respuestas normaliza la misma pregunta después del camino rápido
+    assert isinstance(normalize_question(pregunta), str)
@@ -0,0 +1,41 @@
+import io
+import json
+
+from fastavro import parse_schema, schemaless_writer
+
+from app.core.avro_decoder import BusinessEventDecoder, MAGIC_BYTE, WIRE_HEADER
+from app.core.kafka_consumer import VALUE_SCHEMA, event_fingerprint
+from benchmarks.bench_avro_decoder import evento as evento_completo
+
+def evento(**cambios):
+    data = {
+        "businessId": 7, "actionType": "update", "rut": "76000007-1", "name": "Negocio",
+        "status": 1, "deletedAt": None, "adminUserId": 1,
+        "users": [{"userId": 1, "messagePreferences": [{"subscribed": True}]}],
+        "settings": [{"settingId": 1, "value": 1}],
+        "subscriptions": [{"subscriptionId": 1, "active": True}],
+    }
+    data.update(cambios)
+    return data
+
+def test_cambios_que_no_afectan_los_totales_no_cambian_la_huella():
+    base = event_fingerprint(evento())
+    assert event_fingerprint(evento(subscriptions=[{"subscriptionId": 1, "active": False}])) == base
+    assert event_fingerprint(evento(users=[], settings=[], adminUserId=2)) == base
+    assert event_fingerprint(evento(name="Otro nombre", actionType="settings_update")) == base
+
+def test_cambios_de_estado_cambian_la_huella():
+    base = event_fingerprint(evento())
+    assert event_fingerprint(evento(status=0)) != base
+    assert event_fingerprint(evento(deletedAt=1700000000000)) != base
+
+def test_json_y_avro_dan_la_misma_huella():
+    data = evento_completo(7, users=2, settings=2)
+    buf = io.BytesIO()
+    buf.write(WIRE_HEADER.pack(MAGIC_BYTE, 1))
+    schemaless_writer(buf, parse_schema(json.loads(VALUE_SCHEMA)), data)
+
+    decoder = BusinessEventDecoder(fallback_writer_schema=VALUE_SCHEMA)
+    desde_avro = decoder.decode("avro", buf.getvalue())
+    desde_json = decoder.decode("json", json.dumps(data).encode())
+    assert event_fingerprint(desde_avro) == event_fingerprint(desde_json)
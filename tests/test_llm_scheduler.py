@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from app.core.llm_scheduler import (
+    LLMScheduler, LLMSaturatedError, PRIORITY_BATCH, PRIORITY_INTERACTIVE, parse_priority
+)
+
+def test_admite_hasta_max_in_flight_y_encola_el_resto():
+    async def run():
+        scheduler = LLMScheduler("test", max_in_flight=2, max_queue=4, queue_timeout=1)
+        a = await scheduler.acquire()
+        b = await scheduler.acquire()
+        esperando = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+        assert scheduler.in_flight == 2
+        assert scheduler.queue_depth == 1
+        assert not esperando.done()
+
+        scheduler.release(a)
+        c = await asyncio.wait_for(esperando, 1)
+        # El cupo se transfiere al que esperaba: in_flight no baja
+        assert scheduler.in_flight == 2
+        assert scheduler.queue_depth == 0
+        scheduler.release(b)
+        scheduler.release(c)
+        assert scheduler.in_flight == 0
+
+    asyncio.run(run())
+
+def test_rechaza_con_cola_llena():
+    async def run():
+        scheduler = LLMScheduler("test", max_in_flight=1, max_queue=1, queue_timeout=1)
+        await scheduler.acquire()
+        esperando = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(LLMSaturatedError) as error:
+            await scheduler.acquire()
+        assert error.value.status_code == 503
+        assert error.value.retry_after >= 1
+        esperando.cancel()
+
+    asyncio.run(run())
+
+def test_batch_tiene_su_propia_cuota_de_cola():
+    async def run():
+        scheduler = LLMScheduler("test", max_in_flight=1, max_queue=4, batch_queue_share=0.25, queue_timeout=1)
+        await scheduler.acquire()
+        en_cola = [asyncio.ensure_future(scheduler.acquire(PRIORITY_BATCH))]
+        await asyncio.sleep(0)
+        with pytest.raises(LLMSaturatedError) as error:
+            await scheduler.acquire(PRIORITY_BATCH)
+        assert error.value.status_code == 429
+        # Los interactivos todavía entran a la cola
+        en_cola.append(asyncio.ensure_future(scheduler.acquire(PRIORITY_INTERACTIVE)))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 2
+        for tarea in en_cola:
+            tarea.cancel()
+
+    asyncio.run(run())
+
+def test_interactivos_pasan_antes_que_batch():
+    async def run():
+        scheduler = LLMScheduler("test", max_in_flight=1, max_queue=4, queue_timeout=1)
+        orden = []
+        inicial = await scheduler.acquire()
+
+        async def pedir(nombre, prioridad):
+            started_at = await scheduler.acquire(prioridad)
+            orden.append(nombre)
+            scheduler.release(started_at)
+
+        tareas = [asyncio.ensure_future(pedir("batch", PRIORITY_BATCH)),
+                  asyncio.ensure_future(pedir("interactivo", PRIORITY_INTERACTIVE))]
+        await asyncio.sleep(0)
+        scheduler.release(inicial)
+        await asyncio.gather(*tareas)
+        assert orden == ["interactivo", "batch"]
+        assert scheduler.in_flight == 0
+
+    asyncio.run(run())
+
+def test_timeout_en_cola_libera_el_lugar():
+    async def run():
+        scheduler = LLMScheduler("test", max_in_flight=1, max_queue=2, queue_timeout=0.05)
+        started_at = await scheduler.acquire()
+        with pytest.raises(LLMSaturatedError):
+            await scheduler.acquire()
+        assert scheduler.queue_depth == 0
+        scheduler.release(started_at)
+        assert scheduler.in_flight == 0
+        assert scheduler.snapshot()["timeouts"] == 1
+
+    asyncio.run(run())
+
+def test_slot_devuelve_el_cupo_ante_errores():
+    async def run():
+        scheduler = LLMScheduler("test", max_in_flight=1)
+        with pytest.raises(RuntimeError):
+            async with scheduler.slot():
+                raise RuntimeError("falla")
+        assert scheduler.in_flight == 0
+
+    asyncio.run(run())
+
+def test_parse_priority():
+    assert parse_priority("batch") == PRIORITY_BATCH
+    assert parse_priority("BATCH") == PRIORITY_BATCH
+    assert parse_priority("interactive") == PRIORITY_INTERACTIVE
+    assert parse_priority(None) == PRIORITY_INTERACTIVE
+    assert parse_priority("otra") == PRIORITY_INTERACTIVE
+    assert parse_priority(1) == PRIORITY_INTERACTIVE
+    assert parse_priority(["batch"]) == PRIORITY_INTERACTIVE
+    assert parse_priority({"batch": True}) == PRIORITY_INTERACTIVE
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.core import monthly_cache
+from app.core.monthly_cache import set_monthly_cache_async
+from app.core.monthly_frame import CAMPOS_VENTAS
+from app.services.monthly_data import get_monthly_data_cliente_async
+
+MESES = [
+    {"period": "2024-02", "total_purchases": 1000, "total_purchases_iva": 190, "total_sales": 3000, "total_sales_iva": 570},
+    {"period": "2024-01", "total_purchases": 2000, "total_purchases_iva": 380, "total_sales": None},
+]
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(monthly_cache, "get_async_redis_client", lambda: client)
+    monthly_cache._l1.clear()
+    yield client
+    monthly_cache._l1.clear()
+
+def test_los_hits_del_l1_reutilizan_el_frame(redis):
+    async def run():
+        await set_monthly_cache_async("76000000-1", MESES)
+        primero = await get_monthly_data_cliente_async("76000000-1")
+        segundo = await get_monthly_data_cliente_async("76000000-1")
+        return primero, segundo
+
+    primero, segundo = asyncio.run(run())
+    assert primero.frame is segundo.frame
+    assert primero.frame.periods == ["2024-01", "2024-02"]
+
+def test_compras_y_ventas_salen_de_las_columnas_del_frame(redis):
+    async def run():
+        await set_monthly_cache_async("76000000-1", MESES)
+        return await get_monthly_data_cliente_async("76000000-1")
+
+    datos = asyncio.run(run())
+    assert datos.compras[1]["total_purchases"] == 1000
+    assert datos.compras[0]["total_purchases_exempt"] is None
+    assert datos.ventas[0] == {"period": "2024-01", **dict.fromkeys(CAMPOS_VENTAS)}
+    assert datos.ventas[1]["total_sales"] == 3000
@@ -0,0 +1,62 @@
+import pytest
+
+from app.core import prompts
+from app.core.monthly_frame import MonthlyFrame
+from app.core.prompts import construir_prompt_iva, estimar_tokens, formatear_compacto, generar_prompt_iva
+
+PREGUNTAS = [
+    "¿Cuánto IVA debo pagar este mes?",
+    "¿Cómo han evolucionado mis ventas?",
+    "¿Tengo ventas exentas?",
+    "Hola, ¿qué me recomiendas?",
+]
+
+def meses(cantidad):
+    data = []
+    for i in range(cantidad):
+        data.append({
+            "period": f"{2020 + i // 12}-{i % 12 + 1:02d}",
+            "total_purchases": 1_000_000 + i * 1000,
+            "total_purchases_exempt": 50_000,
+            "total_purchases_iva": 190_000 + i * 190,
+            "total_purchases_neto": 1_000_000,
+            "total_purchases_tax_recoverable": 190_000,
+            "total_sales": 2_000_000 + i * 2000,
+            "total_sales_iva": 380_000 + i * 380,
+            "total_sales_neto": 2_000_000,
+        })
+    return data
+
+def prompt_anterior(data, pregunta, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(prompts, "PROMPT_COMPACT", False)
+        return generar_prompt_iva("76000000-1", data, data, pregunta)
+
+@pytest.mark.parametrize("cantidad", [12, 24])
+@pytest.mark.parametrize("pregunta", PREGUNTAS)
+def test_el_formato_compacto_usa_menos_tokens_que_el_anterior(cantidad, pregunta, monkeypatch):
+    data = meses(cantidad)
+    compacto = construir_prompt_iva("76000000-1", data, data, pregunta, MonthlyFrame.from_api(data))
+    assert compacto.tokens_estimados < estimar_tokens(prompt_anterior(data, pregunta, monkeypatch))
+
+def test_el_formato_anterior_incluye_los_indicadores_si_hay_frame(monkeypatch):
+    data = meses(13)
+    monkeypatch.setattr(prompts, "PROMPT_COMPACT", False)
+    prompt = generar_prompt_iva("76000000-1", data, data, PREGUNTAS[0], MonthlyFrame.from_api(data))
+    assert "**Indicadores calculados:**" in prompt
+    assert "vs mismo mes del año anterior" in prompt
+    assert "**Indicadores calculados:**" not in generar_prompt_iva("76000000-1", data, data, PREGUNTAS[0])
+
+def test_respeta_el_presupuesto_con_historias_largas():
+    data = meses(60)
+    resultado = construir_prompt_iva(
+        "76000000-1", data, data, PREGUNTAS[0], MonthlyFrame.from_api(data), token_budget=500
+    )
+    assert resultado.tokens_estimados <= 500
+    assert resultado.nivel > 0
+
+def test_cero_meses_recientes_agrupa_todo(monkeypatch):
+    monkeypatch.setattr(prompts, "_NIVELES", [(0, "trimestre", None)])
+    tabla = formatear_compacto(meses(12), "ventas", "general", 0)
+    periodos = [fila.split(" | ")[0] for fila in tabla.splitlines()[1:] if " | " in fila]
+    assert periodos == ["2020-T1 (3m)", "2020-T2 (3m)", "2020-T3 (3m)", "2020-T4 (3m)"]